@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for MagicMirror² Face Recognition
+Measures the detection and recognition hot path with simulated camera and GPIO
+backends, and writes the results as JSON so runs can be compared between commits
+"""
+
+import itertools
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import lbph
+from camera_manager import ArrayFrameSource, CameraManager, FileFrameSource, FramePool
+from face_pipeline import FaceSizeModel, FaceTracker, FrameBuffers, recognize_faces
+from face_store import FaceStore
+from metrics import AllocationTracker
+from model_bundle import LoadedModel, ModelBundle
+from training_data import StageStats, load_training_faces
+from ultrasonic import SimulatedGPIOBackend
+
+DEFAULT_CASCADE = "/home/andii/haarcascades/haarcascade_frontalface_default.xml"
+DETECTION_RESOLUTIONS = ((320, 240), (640, 480), (1280, 960))
+GALLERY_SIZES = (40, 160, 640)
+SECTIONS = ("detection", "predict", "training", "model_load", "allocations", "end_to_end")
+BACKGROUND = 0  # synthetic frames put the face on a flat background
+
+
+def find_cascade(path=None):
+    """The cascade to benchmark with: the given path, the Pi path, or OpenCV's bundled copy"""
+    candidates = [path, DEFAULT_CASCADE]
+    if hasattr(cv2, "data"):
+        candidates.append(os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate) and not cv2.CascadeClassifier(candidate).empty():
+            return candidate
+    return None
+
+
+class SimulatedDetector:
+    """Stands in for the Haar cascade on synthetic frames: the face is whatever is not background"""
+
+    def detectMultiScale(self, gray, *args, **kwargs):
+        ys, xs = np.nonzero(gray != BACKGROUND)
+        if len(xs) == 0:
+            return []
+        x, y = int(xs.min()), int(ys.min())
+        return [(x, y, int(xs.max()) - x + 1, int(ys.max()) - y + 1)]
+
+
+def timings_ms(func, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(int(len(samples) * 0.95), len(samples) - 1)],
+    }
+
+
+def synthetic_frame(face, size=(320, 240), box=(110, 70)):
+    """A BGR frame with one face pasted onto a flat background"""
+    frame = np.full((size[1], size[0]), BACKGROUND, dtype=np.uint8)
+    x, y = box
+    frame[y:y + face.shape[0], x:x + face.shape[1]] = np.maximum(face, 1)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def load_frames(path):
+    source = FileFrameSource(path, loop=False)
+    source.open()
+    frames = []
+    try:
+        while True:
+            frame = source.read()
+            if frame is None:
+                break
+            frames.append(frame)
+    finally:
+        source.close()
+    return frames
+
+
+def bench_detection(cascade_path, frames=None, repeats=20, distance=20):
+    """Cascade time per frame at each resolution, full-frame and pruned to the face size at distance"""
+    if cascade_path is None:
+        return {"skipped": "no face cascade found"}
+    cascade = cv2.CascadeClassifier(cascade_path)
+    if frames:
+        grays = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames]
+    else:
+        faces, _ = lbph._synthetic_gallery(1, 4)
+        grays = [cv2.cvtColor(synthetic_frame(f), cv2.COLOR_BGR2GRAY) for f in faces]
+
+    # Calibrated so a face spans 100px of a 320px-wide frame at distance, like the synthetic frames
+    size_model = FaceSizeModel(path=None)
+    size_model.k, size_model.frame_width = 100 * distance, 320
+
+    results = []
+    for width, height in DETECTION_RESOLUTIONS:
+        scaled = itertools.cycle([cv2.resize(g, (width, height)) for g in grays])
+        row = timings_ms(lambda: cascade.detectMultiScale(next(scaled), 1.3, 5), repeats)
+        (x0, x1), min_size, max_size = size_model.search(distance, (height, width))
+        row["pruned"] = timings_ms(lambda: cascade.detectMultiScale(
+            next(scaled)[:, x0:x1], 1.3, 5, minSize=min_size, maxSize=max_size), repeats)
+        row["pruned"].update(min_size=min_size[0], max_size=max_size[0])
+        results.append(dict(row, width=width, height=height))
+    return {"frames": "recorded" if frames else "synthetic", "distance_cm": distance,
+            "resolutions": results}
+
+
+def bench_predict(sizes=GALLERY_SIZES):
+    return {"galleries": lbph.benchmark(sizes)}
+
+
+def write_dataset(image_base, people, photos_per_person):
+    faces, labels = lbph._synthetic_gallery(people, photos_per_person)
+    for i, (face, label) in enumerate(zip(faces, labels)):
+        person_path = os.path.join(image_base, f"person{label}")
+        os.makedirs(person_path, exist_ok=True)
+        cv2.imwrite(os.path.join(person_path, f"photo_{i:03d}.png"), face)
+
+
+def bench_training(workdir, cascade_path, people=5, photos_per_person=40):
+    """Preprocess (cold and cached), face store load and train throughput on a synthetic dataset"""
+    image_base = os.path.join(workdir, "Images")
+    cache_path = os.path.join(workdir, "training_cache.npz")
+    write_dataset(image_base, people, photos_per_person)
+
+    results = {}
+    for run in ("cold", "cached"):
+        stats = StageStats()
+        faces, labels, _ = load_training_faces(image_base, cascade_path, cache_path, stats=stats)
+        results[run] = {stage: {"images": n, "seconds": sec, "images_per_s": n / sec if sec else None}
+                        for stage, (n, sec) in stats.stages.items()}
+
+    # The same faces from the packed store: one mmap, no decoding
+    store = FaceStore.open(os.path.join(workdir, "face_dataset"), create=True)
+    for face, label in zip(faces, labels):
+        store.append(f"person{label}", face)
+    store.close()
+    start = time.perf_counter()
+    store = FaceStore.open(store.path)
+    store_faces, _, _ = store.training_set()
+    seconds = time.perf_counter() - start
+    results["store"] = {"images": len(store_faces), "seconds": seconds,
+                        "images_per_s": len(store_faces) / seconds if seconds else None}
+
+    start = time.perf_counter()
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, np.array(labels))
+    seconds = time.perf_counter() - start
+    results["train"] = {"images": len(faces), "seconds": seconds, "images_per_s": len(faces) / seconds}
+    return results
+
+
+def bench_model_load(workdir, samples=320, samples_per_person=40, repeats=5):
+    """Bundle load, first-predict index build and legacy YAML load for one model"""
+    faces, labels = lbph._synthetic_gallery(samples // samples_per_person, samples_per_person)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    names = [f"person{i}" for i in range(labels.max() + 1)]
+
+    bundle_path = os.path.join(workdir, "face_model.bin")
+    yaml_path = os.path.join(workdir, "trainer.yml")
+    ModelBundle.from_recognizer(recognizer, names).save(bundle_path)
+    recognizer.write(yaml_path)
+
+    def load_yaml():
+        cv2.face.LBPHFaceRecognizer_create().read(yaml_path)
+
+    return {
+        "samples": len(faces),
+        "bundle_bytes": os.path.getsize(bundle_path),
+        "yaml_bytes": os.path.getsize(yaml_path),
+        "bundle_load": timings_ms(lambda: ModelBundle.load(bundle_path), repeats),
+        "index_build": timings_ms(lambda: ModelBundle.load(bundle_path).recognizer().index, repeats),
+        "yaml_load": timings_ms(load_yaml, repeats),
+    }
+
+
+class CopyingFrameSource(ArrayFrameSource):
+    """Hands out a new copy of each frame like capture_array(), or writes it into out"""
+
+    def read(self, out=None):
+        frame = super().read()
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return out
+        return frame.copy()
+
+
+def bench_allocations(frames=200):
+    """tracemalloc bytes per frame for capture, gray conversion, detection and predict
+
+    "reused" runs the recognition stage's path (pooled frames, FrameBuffers); "fresh"
+    allocates the frame, gray image, crops and LBPH arrays anew every time, as it used to. Detection
+    uses the simulated detector, so only the other stages reflect the real pipeline.
+    """
+    faces, labels = lbph._synthetic_gallery(3, 20)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    model = LoadedModel(ModelBundle.from_recognizer(recognizer, ["alice", "bob", "carol"]).recognizer(),
+                        ["alice", "bob", "carol"], None)
+    model.recognizer.index
+    source_frames = [synthetic_frame(face) for face in faces[:5]]
+
+    results = {}
+    for mode in ("fresh", "reused"):
+        camera = CameraManager(CopyingFrameSource(source_frames))
+        tracker = FaceTracker(SimulatedDetector())
+        frame_pool = FramePool(2)
+        buffers = FrameBuffers()
+        allocations = AllocationTracker(window=frames)
+        allocations.start()
+        try:
+            for _ in range(frames):
+                reuse = mode == "reused"
+                with allocations.frame("capture"):
+                    buffer = frame_pool.acquire() if reuse else None
+                    frame = camera.capture(buffer)
+                with allocations.frame("cvtColor"):
+                    gray = buffers.gray(frame) if reuse else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                with allocations.frame("detect"):
+                    boxes = tracker.detect(gray)
+                with allocations.frame("predict"):
+                    recognize_faces(gray, boxes, model, buffers if reuse else None)
+                if reuse:
+                    frame_pool.release(frame)
+            results[mode] = allocations.summary()
+        finally:
+            allocations.stop()
+            camera.close()
+    return results
+
+
+class StatusWatcher:
+    """Subscribes to the status socket and notes when "recognized" first arrives"""
+
+    def __init__(self, path):
+        self.path = path
+        self.recognized_at = None
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _read_loop(self):
+        deadline = time.monotonic() + 5
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        while True:
+            try:
+                client.connect(self.path)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    return
+                time.sleep(0.01)
+        with client, client.makefile("r") as lines:
+            for line in lines:
+                if json.loads(line).get("status") == "recognized":
+                    self.recognized_at = time.time()
+                    return
+
+
+def bench_end_to_end(workdir, trials=3, frames=None, model_path=None, cascade_path=None,
+                     timeout=10.0):
+    """Time from the control loop seeing distance below PROXIMITY_THRESHOLD to "recognized" pushed"""
+    import face_recognition_system as frs
+
+    simulated = frames is None
+    if simulated:
+        faces, labels = lbph._synthetic_gallery(3, 20)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(faces, labels)
+        model_path = os.path.join(workdir, "e2e_model.bin")
+        ModelBundle.from_recognizer(recognizer, ["alice", "bob", "carol"]).save(model_path)
+        frames = [synthetic_frame(face) for face in faces[:5]]
+    elif model_path is None or cascade_path is None:
+        return {"skipped": "recorded frames need --model and a face cascade"}
+
+    results = []
+    for trial in range(trials):
+        status_file = os.path.join(workdir, f"status{trial}.json")
+        status_socket = os.path.join(workdir, f"status{trial}.sock")
+        # Far for about half a second, then someone steps up and stays
+        ranger = SimulatedGPIOBackend.from_distances([120] * 8 + [15] * 2000, loop=False)
+        system = frs.FaceRecognitionSystem(ArrayFrameSource(frames, fps=30), ranger,
+                                           cascade_path=cascade_path, model_path=model_path,
+                                           status_file=status_file, status_socket=status_socket,
+                                           metrics_file=os.path.join(workdir, f"metrics{trial}.prom"))
+        if simulated:
+            system.face_cascade = SimulatedDetector()
+            system.tracker.cascade = system.face_cascade
+
+        watcher = StatusWatcher(status_socket)
+        watcher.start()
+        runner = threading.Thread(target=system.run, daemon=True)
+        runner.start()
+        deadline = time.monotonic() + timeout
+        while watcher.recognized_at is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        system.stop()
+        runner.join(timeout=5)
+
+        if watcher.recognized_at is None or system.last_detection_time is None:
+            results.append({"trial": trial, "recognized": False})
+        else:
+            results.append({
+                "trial": trial,
+                "recognized": True,
+                "seconds": watcher.recognized_at - system.last_detection_time,
+                "camera_open_s": system.camera.last_open_seconds,
+                "burst_frames": system.last_burst_frames,
+            })
+    return {"detector": "simulated" if simulated else "cascade", "trials": results}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a.b": 1}, numbers only; list items are keyed by position"""
+    flat = {}
+    items = results.items() if isinstance(results, dict) else enumerate(results)
+    for key, value in items:
+        name = f"{prefix}{key}"
+        if isinstance(value, (dict, list)):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, current):
+    """Print every timing (and per-frame allocation) that moved by more than 5% against a baseline run"""
+    old, new = flatten(baseline), flatten(current)
+    print(f"Comparing against {baseline.get('meta', {}).get('commit')}:")
+    for name in sorted(set(old) & set(new)):
+        if not name.endswith(("_ms", "seconds", "_per_s", "_kb")) or not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        if abs(change) >= 0.05:
+            better = change < 0 if not name.endswith("_per_s") else change > 0
+            print(f"   {'✅' if better else '⚠️ '} {name}: {old[name]:.3f} -> {new[name]:.3f} ({change:+.0%})")
+
+
+def run(sections=SECTIONS, cascade=None, frames_path=None, model_path=None, trials=3):
+    cascade_path = find_cascade(cascade)
+    frames = load_frames(frames_path) if frames_path else None
+    results = {"meta": metadata()}
+    results["meta"]["cascade"] = cascade_path
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for section in sections:
+            print(f"⏱️  {section}...", file=sys.stderr)
+            if section == "detection":
+                results[section] = bench_detection(cascade_path, frames)
+            elif section == "predict":
+                results[section] = bench_predict()
+            elif section == "training":
+                results[section] = bench_training(workdir, cascade_path)
+            elif section == "model_load":
+                results[section] = bench_model_load(workdir)
+            elif section == "allocations":
+                results[section] = bench_allocations()
+            elif section == "end_to_end":
+                results[section] = bench_end_to_end(workdir, trials, frames, model_path, cascade_path)
+            if "skipped" in results[section]:
+                print(f"   ⏭️  {section} skipped: {results[section]['skipped']}", file=sys.stderr)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    from contextlib import redirect_stdout
+
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition hot path without hardware")
+    parser.add_argument("--only", help=f"Comma-separated sections to run ({', '.join(SECTIONS)})")
+    parser.add_argument("--cascade", help="Haar cascade XML (default: Pi path, then OpenCV's copy)")
+    parser.add_argument("--frames", help="Image folder or video of recorded frames instead of synthetic ones")
+    parser.add_argument("--model", help="Model bundle to use with --frames for the end-to-end run")
+    parser.add_argument("--trials", type=int, default=3, help="End-to-end trials")
+    parser.add_argument("--output", help="Write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    sections = tuple(args.only.split(",")) if args.only else SECTIONS
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    # The pipeline's own progress output goes to stderr so stdout stays valid JSON
+    with redirect_stdout(sys.stderr):
+        results = run(sections, args.cascade, args.frames, args.model, args.trials)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            with redirect_stdout(sys.stderr):
+                compare(json.load(f), results)
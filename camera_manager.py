@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Camera Manager for MagicMirror² Face Recognition
+Keeps one warm camera session open instead of reopening Picamera2 on every attempt
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+# Camera settings
+CAMERA_SIZE = (320, 240)  # the stream faces are detected on
+CROP_SIZE = (640, 480)  # main stream faces are cropped from in "dual" mode
+CAMERA_WARMUP = 1.0  # seconds to let the sensor settle after start
+CAMERA_IDLE_TIMEOUT = 30  # seconds without use before the camera is powered down
+
+# How frames are taken from the Pi camera:
+#   "bgr"  - BGR stream, converted to grayscale on every frame
+#   "gray" - the luma (Y) plane of a YUV420 stream, already grayscale
+#   "dual" - luma of a CAMERA_SIZE lores stream to detect on, plus luma of a
+#            CROP_SIZE main stream to crop the faces from
+CAPTURE_MODES = ("bgr", "gray", "dual")
+CAPTURE_MODE = "gray"
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FrameLayout:
+    """Where the image to detect on and the image to crop from are in a frame
+
+    Usually both are the whole frame. A dual-stream frame holds the main stream's luma
+    with the lores stream's luma stacked below it, like the planes of a YUV420 buffer,
+    so it is still one array for the frame pool, the shared-memory ring and recordings.
+    """
+
+    def __init__(self, lores_size=None):
+        self.lores_size = tuple(lores_size) if lores_size else None
+
+    @property
+    def dual(self):
+        return self.lores_size is not None
+
+    def shape(self, main_size):
+        """Array shape of a grayscale frame whose main image is main_size (width, height)"""
+        width, height = main_size
+        if not self.dual:
+            return height, width
+        return height + self.lores_size[1], width
+
+    def split(self, frame):
+        """(detect, crop) images of a frame; the same array twice unless it is dual"""
+        if not self.dual:
+            return frame, frame
+        width, height = self.lores_size
+        rows = frame.shape[0] - height
+        return frame[rows:, :width], frame[:rows]
+
+
+def copy_luma(array, size, out=None):
+    """Copy the Y plane of a mapped YUV420 buffer (rows may be padded to the stride)"""
+    width, height = size
+    luma = array[:height, :width]
+    if out is None or out.shape != luma.shape:
+        return luma.copy()
+    np.copyto(out, luma)
+    return out
+
+
+class FrameSource:
+    """Interface for anything that can deliver frames to the recognizer"""
+
+    layout = FrameLayout()  # where to detect and crop; one image unless overridden
+
+    def open(self):
+        """Start delivering frames"""
+        raise NotImplementedError
+
+    def read(self, out=None):
+        """Return the next frame as a numpy array, or None if there is none
+
+        Sources that can write into out do so when it has the frame's shape and return
+        it; otherwise (and when out is None) they return a frame of their own.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release the underlying device or file"""
+        raise NotImplementedError
+
+
+class PiCameraSource(FrameSource):
+    """Frame source backed by Picamera2, in one of the CAPTURE_MODES
+
+    size is the stream faces are detected on; in "dual" mode crop_size is the larger
+    main stream the faces are cropped from.
+    """
+
+    def __init__(self, size=CAMERA_SIZE, warmup=CAMERA_WARMUP, mode=CAPTURE_MODE, crop_size=CROP_SIZE):
+        if mode not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode {mode!r}, expected one of {CAPTURE_MODES}")
+        if mode == "dual" and (crop_size[0] < size[0] or crop_size[1] < size[1]):
+            raise ValueError(f"Crop stream {crop_size} is smaller than the detection stream {size}")
+        self.size = size
+        self.warmup = warmup
+        self.mode = mode
+        self.crop_size = crop_size
+        self.layout = FrameLayout(size if mode == "dual" else None)
+        self.picam2 = None
+
+    def configuration(self, picam2):
+        if self.mode == "bgr":
+            # Picamera2's RGB888 is B, G, R in memory: the order OpenCV expects
+            return picam2.create_preview_configuration(main={"size": self.size, "format": "RGB888"})
+        if self.mode == "gray":
+            return picam2.create_preview_configuration(main={"size": self.size, "format": "YUV420"})
+        return picam2.create_preview_configuration(main={"size": self.crop_size, "format": "YUV420"},
+                                                   lores={"size": self.size, "format": "YUV420"})
+
+    def open(self):
+        from picamera2 import Picamera2
+
+        picam2 = Picamera2()
+        try:
+            picam2.configure(self.configuration(picam2))
+            picam2.start()
+        except Exception:
+            picam2.close()
+            raise
+        self.picam2 = picam2
+        time.sleep(self.warmup)  # only paid once per session now
+
+    def read(self, out=None):
+        if self.mode == "bgr" and out is None:
+            return self.picam2.capture_array()
+        from picamera2 import MappedArray
+
+        # Copy straight out of the camera's buffers instead of allocating a new frame
+        with self.picam2.captured_request() as request:
+            if self.mode == "bgr":
+                with MappedArray(request, "main") as mapped:
+                    if mapped.array.shape != out.shape:
+                        return mapped.array.copy()
+                    np.copyto(out, mapped.array)
+                return out
+            if self.mode == "gray":
+                with MappedArray(request, "main") as mapped:
+                    return copy_luma(mapped.array, self.size, out)
+
+            # Both streams come from the same request, so they show the same instant
+            shape = self.layout.shape(self.crop_size)
+            if out is None or out.shape != shape:
+                out = np.empty(shape, dtype=np.uint8)
+            detect, crop = self.layout.split(out)
+            with MappedArray(request, "main") as mapped:
+                copy_luma(mapped.array, self.crop_size, crop)
+            with MappedArray(request, "lores") as mapped:
+                copy_luma(mapped.array, self.size, detect)
+        return out
+
+    def close(self):
+        if self.picam2 is not None:
+            try:
+                self.picam2.close()
+            finally:
+                self.picam2 = None
+
+
+class FileFrameSource(FrameSource):
+    """Frame source that plays back an image folder or a video file (for off-device testing)"""
+
+    def __init__(self, path, loop=True):
+        self.path = path
+        self.loop = loop
+        self.image_files = []
+        self.index = 0
+        self.video = None
+
+    def open(self):
+        if os.path.isdir(self.path):
+            self.image_files = sorted(
+                os.path.join(self.path, f) for f in os.listdir(self.path)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+            if not self.image_files:
+                raise RuntimeError(f"No images found in {self.path}")
+            self.index = 0
+        else:
+            self.video = cv2.VideoCapture(self.path)
+            if not self.video.isOpened():
+                self.video = None
+                raise RuntimeError(f"Could not open video {self.path}")
+
+    def read(self, out=None):
+        if self.video is not None:
+            ok, frame = self.video.read(out)
+            if not ok and self.loop:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.video.read(out)
+            return frame if ok else None
+
+        if self.index >= len(self.image_files):
+            if not self.loop:
+                return None
+            self.index = 0
+        frame = cv2.imread(self.image_files[self.index])
+        self.index += 1
+        return frame
+
+    def close(self):
+        if self.video is not None:
+            self.video.release()
+            self.video = None
+        self.image_files = []
+
+
+class ArrayFrameSource(FrameSource):
+    """Frame source that serves in-memory frames, optionally paced like a real camera"""
+
+    def __init__(self, frames, fps=None, loop=True):
+        self.frames = list(frames)
+        self.fps = fps
+        self.loop = loop
+        self.index = 0
+        self.next_time = None
+
+    def open(self):
+        if not self.frames:
+            raise RuntimeError("No frames to serve")
+        self.index = 0
+        self.next_time = time.monotonic()
+
+    def read(self, out=None):
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return None
+            self.index = 0
+        if self.fps:
+            # Block until the next frame would be ready, like capture_array()
+            delay = self.next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_time = max(self.next_time, time.monotonic() - 1.0 / self.fps) + 1.0 / self.fps
+        frame = self.frames[self.index]
+        self.index += 1
+        return frame
+
+    def close(self):
+        self.next_time = None
+
+
+class FramePool:
+    """Frame buffers reused from capture to capture instead of allocated for every frame
+
+    acquire() hands out a free buffer of the frame shape seen so far (None until the
+    first frame has been seen), release() takes it back once the frame is processed.
+    A frame that is not from the pool is ignored by release(), so callers need not
+    know whether the source wrote into the buffer or returned one of its own.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.shape = None
+        self.dtype = None
+        self.free = deque()
+        self.owned = set()  # ids of the buffers this pool allocated
+        self.lock = threading.Lock()
+        self.allocations = 0
+
+    def acquire(self):
+        with self.lock:
+            if self.shape is None:
+                return None
+            if self.free:
+                return self.free.popleft()
+            if len(self.owned) >= self.size:
+                return None  # every buffer is out; let the source allocate this one
+            buffer = np.empty(self.shape, dtype=self.dtype)
+            self.owned.add(id(buffer))
+            self.allocations += 1
+            return buffer
+
+    def release(self, frame):
+        """Return a frame to the pool; the first frame ever released sets the buffer shape"""
+        if frame is None:
+            return
+        with self.lock:
+            if self.shape is None:
+                self.shape, self.dtype = frame.shape, frame.dtype
+            if id(frame) in self.owned:
+                if frame.shape != self.shape:
+                    self.owned.discard(id(frame))
+                else:
+                    self.free.append(frame)
+            elif frame.shape != self.shape:
+                # The camera changed resolution: drop the old buffers, new ones follow
+                self.shape, self.dtype = frame.shape, frame.dtype
+                self.owned = set()
+                self.free.clear()
+
+
+class CameraManager:
+    """Owns one long-lived camera session and powers it down when idle"""
+
+    def __init__(self, source=None, idle_timeout=CAMERA_IDLE_TIMEOUT, metrics=None):
+        self.source = source if source is not None else PiCameraSource()
+        self.layout = self.source.layout
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics
+        self.is_open = False
+        self.last_used = None
+
+        # Latency bookkeeping so warm vs cold attempts can be compared
+        self.open_count = 0
+        self.last_open_seconds = 0.0
+        self.last_capture_seconds = 0.0
+
+    def open(self):
+        """Open the frame source if it is not already running"""
+        if self.is_open:
+            return
+        start = time.monotonic()
+        try:
+            self.source.open()
+        except Exception:
+            self.source.close()
+            raise
+        self.is_open = True
+        self.open_count += 1
+        self.last_open_seconds = time.monotonic() - start
+        self.last_used = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.observe("camera_open", self.last_open_seconds)
+        print(f"📷 Camera opened in {self.last_open_seconds:.2f}s")
+
+    def capture(self, out=None):
+        """Return one frame from the warm session, opening it on first use
+
+        With out, the frame is written into that buffer if the source supports it.
+        """
+        self.open()
+        start = time.monotonic()
+        try:
+            frame = self.source.read(out)
+        except Exception:
+            # A failed read usually means the device is wedged; start fresh next time
+            self.close()
+            raise
+        self.last_capture_seconds = time.monotonic() - start
+        self.last_used = time.monotonic()
+        if self.metrics is not None:
+            self.metrics.observe("capture", self.last_capture_seconds)
+        if frame is None:
+            raise RuntimeError("Frame source returned no frame")
+        return frame
+
+    def release_if_idle(self, keep_warm=False):
+        """Close the camera once it has not been used for idle_timeout seconds"""
+        if not self.is_open or keep_warm:
+            return False
+        if time.monotonic() - self.last_used < self.idle_timeout:
+            return False
+        print(f"💤 Camera idle for {self.idle_timeout}s - powering down")
+        self.close()
+        return True
+
+    def close(self):
+        """Close the session; safe to call more than once"""
+        try:
+            self.source.close()
+        except Exception as e:
+            print(f"⚠️  Error closing camera: {e}")
+        finally:
+            self.is_open = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -219,7 +219,6 @@ let config = {
 			position: "top_right",
 			header: "Personal Todo", // Will be overridden by face recognition
 			config: {
-				updateInterval: 1000, // Check for updates every 1 second
 				statusFile: "/tmp/magicmirror_face_status.json",
 				profilesFile: "user_profiles.json",
 				animationSpeed: 2000,
@@ -232,7 +231,6 @@ let config = {
 			position: "bottom_right",
 			header: "Personal Calendar", // Will be overridden by face recognition
 			config: {
-				updateInterval: 1000, // Check for updates every 1 second
 				statusFile: "/tmp/magicmirror_face_status.json",
 				profilesFile: "user_profiles.json",
 				animationSpeed: 2000,
@@ -202,7 +202,6 @@ let config = {
 			module: "facerecognition",
 			position: "top_center",
 			config: {
-				updateInterval: 1000, // Check for updates every 1 second
 				proximityThreshold: 20, // 20 cm threshold
 				timeoutDelay: 10000, // 10 seconds delay before shutdown
 				greetingDuration: 5000, // Show greeting for 5 seconds
@@ -226,7 +225,6 @@ let config = {
 			module: "facerecognitionoverlay",
 			position: "fullscreen_above",
 			config: {
-				updateInterval: 500, // Check for updates every 500ms
 				statusFile: "/tmp/magicmirror_face_status.json",
 				showFaceIcon: false,
 				showRecognitionStatus: true,
@@ -245,7 +243,6 @@ let config = {
 			module: "personaltodo",
 			position: "top_right",
 			config: {
-				updateInterval: 1000,
 				statusFile: "/tmp/magicmirror_face_status.json",
 				profilesFile: "user_profiles.json",
 				animationSpeed: 2000,
@@ -257,7 +254,6 @@ let config = {
 			module: "personalcalendar",
 			position: "bottom_right",
 			config: {
-				updateInterval: 1000,
 				statusFile: "/tmp/magicmirror_face_status.json",
 				profilesFile: "user_profiles.json",
 				animationSpeed: 2000,
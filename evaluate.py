@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Offline Evaluation for MagicMirror² Face Recognition
+Stratified k-fold accuracy, per-person precision/recall, confusion matrix and predict
+latency on the training set, plus a sweep of the unknown-rejection threshold
+"""
+
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from lbph import LBPHModel
+from face_store import load_dataset, FACE_STORE
+from model_bundle import ModelBundle, MODEL_BUNDLE
+from training_data import IMAGE_BASE, CASCADE_PATH
+
+EVAL_FOLDS = 5
+PRUNE_PEOPLE = 0  # people searched in full after the centroid pass; 0 searches everyone, like the daemon
+SWEEP_PERCENTILES = np.arange(0, 101, 2)  # candidate thresholds, from the observed distances
+UNKNOWN = "Unknown"
+
+# Set in each pool worker by _init_worker
+_worker_faces = None
+_worker_labels = None
+
+
+def _init_worker(faces, labels):
+    global _worker_faces, _worker_labels
+    import cv2
+    cv2.setNumThreads(1)  # the pool already uses every core
+    _worker_faces = faces
+    _worker_labels = labels
+
+
+def _histograms(indices):
+    model = LBPHModel(None, [])
+    return np.vstack([model.histogram(_worker_faces[i]) for i in indices])
+
+
+def _predict(histogram_path, train, test, prune_people):
+    """Train on the train rows and time a full predict() of every test face
+
+    With pruning, every face is also searched exhaustively (outside the timing) so
+    the pruned answers can be checked against the exact ones.
+    """
+    histograms = np.load(histogram_path, mmap_mode="r")
+    model = LBPHModel(histograms[train], _worker_labels[train], prune_people=prune_people)
+    model.index  # built before timing, as the daemon does on load
+    predicted = np.empty(len(test), dtype=np.int32)
+    distances = np.empty(len(test), dtype=np.float64)
+    seconds = np.empty(len(test), dtype=np.float64)
+    exact = np.empty(len(test), dtype=np.int32) if prune_people else predicted
+    for j, i in enumerate(test):
+        start = time.perf_counter()
+        predicted[j], distances[j] = model.predict(_worker_faces[i])
+        seconds[j] = time.perf_counter() - start
+        if prune_people:
+            exact[j] = model.index.search(model.histogram(_worker_faces[i]))[0]
+    return test, predicted, distances, seconds, exact
+
+
+def _run_fold(args):
+    histogram_path, fold, folds, prune_people = args
+    is_test = fold_of(_worker_labels, folds) == fold
+    return _predict(histogram_path, np.flatnonzero(~is_test), np.flatnonzero(is_test), prune_people)
+
+
+def _run_unknown(args):
+    """Leave one person out entirely; their faces are what an unknown visitor looks like"""
+    histogram_path, person, prune_people = args
+    is_person = _worker_labels == person
+    return _predict(histogram_path, np.flatnonzero(~is_person), np.flatnonzero(is_person), prune_people)
+
+
+def fold_of(labels, folds):
+    """Stratified fold number of every sample: each person's samples are dealt round-robin"""
+    fold = np.empty(len(labels), dtype=np.int32)
+    for person in np.unique(labels):
+        members = np.flatnonzero(labels == person)
+        fold[members] = np.arange(len(members)) % folds
+    return fold
+
+
+def sweep_thresholds(known, predicted, distances, unknown_distances, percentiles=SWEEP_PERCENTILES):
+    """Accept rates for candidate thresholds; a prediction is accepted if distance < threshold
+
+    correct: known faces accepted as the right person; wrong: known faces accepted as
+    someone else; unknown: faces of people not in the model accepted as anyone.
+    """
+    everything = np.concatenate([distances, unknown_distances])
+    candidates = np.unique(np.round(np.percentile(everything, percentiles), 1)) if len(everything) else []
+    rows = []
+    for threshold in candidates:
+        accepted = distances < threshold
+        rows.append({
+            "threshold": float(threshold),
+            "correct": float(np.mean(accepted & (predicted == known))) if len(known) else 0.0,
+            "wrong": float(np.mean(accepted & (predicted != known))) if len(known) else 0.0,
+            "unknown": float(np.mean(unknown_distances < threshold)) if len(unknown_distances) else 0.0,
+        })
+    return rows
+
+
+def best_threshold(rows):
+    """Threshold with the most correct accepts net of every false accept"""
+    if not rows:
+        return float("inf")
+    return max(rows, key=lambda r: r["correct"] - r["wrong"] - r["unknown"])["threshold"]
+
+
+def per_person_report(label_names, known, predicted, distances, unknown_predicted,
+                      unknown_distances, threshold):
+    """Confusion matrix and precision/recall at threshold; rejections count as Unknown"""
+    people = len(label_names)
+    columns = label_names + [UNKNOWN]
+    rows = label_names + ([UNKNOWN] if len(unknown_predicted) else [])
+    confusion = np.zeros((len(rows), len(columns)), dtype=np.int64)
+
+    def outcome(label, distance):
+        return label if label >= 0 and distance < threshold else people
+
+    for true, label, distance in zip(known, predicted, distances):
+        confusion[true, outcome(label, distance)] += 1
+    for label, distance in zip(unknown_predicted, unknown_distances):
+        confusion[people, outcome(label, distance)] += 1
+
+    report = {}
+    for i, name in enumerate(label_names):
+        hits = confusion[i, i]
+        claimed = confusion[:, i].sum()
+        actual = confusion[i].sum()
+        report[name] = {
+            "precision": float(hits / claimed) if claimed else None,
+            "recall": float(hits / actual) if actual else None,
+            "samples": int(actual),
+        }
+    return {"rows": rows, "columns": columns, "matrix": confusion.tolist()}, report
+
+
+def evaluate(faces, labels, label_names, folds=EVAL_FOLDS, workers=None, prune_people=PRUNE_PEOPLE,
+             threshold=None):
+    """Cross-validate on faces/labels across a process pool; returns a results dict"""
+    labels = np.asarray(labels, dtype=np.int32)
+    faces = np.stack(faces)
+    workers = workers or os.cpu_count() or 1
+    counts = np.bincount(labels, minlength=len(label_names))
+    if counts.min() < 2:
+        raise ValueError(f"Everyone needs at least 2 photos to cross-validate "
+                         f"({', '.join(n for n, c in zip(label_names, counts) if c < 2)} do not)")
+    folds = min(folds, int(counts.max()))
+
+    with tempfile.TemporaryDirectory() as workdir, \
+            ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(faces, labels)) as pool:
+        # Histograms once for every face, shared by all folds through an mmapped .npy
+        start = time.monotonic()
+        chunks = np.array_split(np.arange(len(faces)), workers * 4)
+        histograms = np.vstack(list(pool.map(_histograms, [c for c in chunks if len(c)])))
+        histogram_path = os.path.join(workdir, "histograms.npy")
+        np.save(histogram_path, histograms)
+        histogram_seconds = time.monotonic() - start
+
+        start = time.monotonic()
+        known = pool.map(_run_fold, [(histogram_path, f, folds, prune_people) for f in range(folds)])
+        unknown = []
+        if len(label_names) > 1:
+            unknown = pool.map(_run_unknown, [(histogram_path, p, prune_people)
+                                              for p in range(len(label_names))])
+        known, unknown = list(known), list(unknown)
+        predict_seconds = time.monotonic() - start
+
+    def gather(results):
+        if not results:
+            empty = np.zeros(0)
+            return empty.astype(np.int64), empty.astype(np.int32), empty, empty, empty.astype(np.int32)
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    test, predicted, distances, seconds, exact = gather(known)
+    _, unknown_predicted, unknown_distances, _, _ = gather(unknown)
+    truth = labels[test]
+
+    sweep = sweep_thresholds(truth, predicted, distances, unknown_distances)
+    chosen = best_threshold(sweep) if threshold is None else threshold
+    confusion, people = per_person_report(label_names, truth, predicted, distances,
+                                          unknown_predicted, unknown_distances, chosen)
+    ms = seconds * 1000
+    return {
+        "samples": int(len(labels)),
+        "people": len(label_names),
+        "folds": folds,
+        "prune_people": prune_people,
+        "pruned_agreement": float(np.mean(predicted == exact)) if prune_people else None,
+        "accuracy": float(np.mean(predicted == truth)),
+        "threshold": chosen,
+        "threshold_chosen_from_data": threshold is None,
+        "predict_ms": {"mean": float(ms.mean()), "p50": float(np.percentile(ms, 50)),
+                       "p95": float(np.percentile(ms, 95)), "max": float(ms.max())},
+        "seconds": {"histograms": histogram_seconds, "folds": predict_seconds},
+        "per_person": people,
+        "confusion": confusion,
+        "sweep": sweep,
+    }
+
+
+def print_report(results):
+    print(f"📊 {results['samples']} photos of {results['people']} people, {results['folds']}-fold, "
+          f"closed-set accuracy {results['accuracy']:.1%}")
+    latency = results["predict_ms"]
+    print(f"⏱️  Predict: mean {latency['mean']:.2f} ms, p50 {latency['p50']:.2f}, "
+          f"p95 {latency['p95']:.2f}, max {latency['max']:.2f} (per sample, pool running in parallel)")
+    if results["pruned_agreement"] is not None:
+        print(f"✂️  Pruned search ({results['prune_people']} people) found the same person as a full "
+              f"search for {results['pruned_agreement']:.1%} of photos")
+
+    print("\n🎚️  Threshold sweep (share of known faces accepted right/wrong, unknown faces accepted)")
+    print(f"{'threshold':>10} {'correct':>8} {'wrong':>7} {'unknown':>8}")
+    for row in results["sweep"]:
+        mark = "  ◀" if row["threshold"] == results["threshold"] else ""
+        print(f"{row['threshold']:>10.1f} {row['correct']:>8.1%} {row['wrong']:>7.1%} "
+              f"{row['unknown']:>8.1%}{mark}")
+
+    source = "chosen from the sweep" if results["threshold_chosen_from_data"] else "given"
+    print(f"\n👥 Per person at threshold {results['threshold']:.1f} ({source})")
+    print(f"{'person':<16} {'precision':>9} {'recall':>7} {'photos':>7}")
+    for name, row in results["per_person"].items():
+        precision = "-" if row["precision"] is None else f"{row['precision']:.1%}"
+        recall = "-" if row["recall"] is None else f"{row['recall']:.1%}"
+        print(f"{name:<16} {precision:>9} {recall:>7} {row['samples']:>7}")
+
+    confusion = results["confusion"]
+    width = max(len(name) for name in confusion["columns"] + confusion["rows"]) + 1
+    print("\n🔀 Confusion matrix (rows: true, columns: predicted)")
+    print(" " * width + "".join(f"{name:>{width}}" for name in confusion["columns"]))
+    for name, row in zip(confusion["rows"], confusion["matrix"]):
+        print(f"{name:<{width}}" + "".join(f"{count:>{width}}" for count in row))
+
+
+def apply_threshold(threshold, path=MODEL_BUNDLE):
+    """Store the rejection threshold in the model bundle; the daemon reloads it"""
+    if not os.path.exists(path):
+        print(f"❌ {path} not found - train a model first")
+        return False
+    bundle = ModelBundle.load(path)
+    bundle.params["threshold"] = float(threshold)
+    bundle.metadata["threshold_source"] = "evaluate.py"
+    bundle.save(path)
+    print(f"✅ Threshold {threshold:.1f} saved to {path}")
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cross-validate face recognition on the training set")
+    parser.add_argument("--store", default=FACE_STORE, help=f"Packed face store (default {FACE_STORE})")
+    parser.add_argument("--images", default=IMAGE_BASE,
+                        help=f"JPEG folders, used when there is no store (default {IMAGE_BASE})")
+    parser.add_argument("--cascade", default=CASCADE_PATH, help="Haar cascade for photos that are not face crops")
+    parser.add_argument("--folds", type=int, default=EVAL_FOLDS, help="Cross-validation folds")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--prune", type=int, default=PRUNE_PEOPLE,
+                        help="People searched in full after the centroid pass (0 searches everyone)")
+    parser.add_argument("--threshold", type=float, help="Report at this threshold instead of the swept best")
+    parser.add_argument("--output", help="Write the results as JSON here")
+    parser.add_argument("--apply", action="store_true",
+                        help=f"Save the threshold into {MODEL_BUNDLE} so the recognizer rejects unknowns")
+    args = parser.parse_args()
+
+    faces, labels, label_names = load_dataset(args.store, args.images, args.cascade, workers=args.workers)
+    if not faces:
+        parser.exit(1, f"❌ No usable photos found in {args.store} or {args.images}\n")
+    results = evaluate(faces, labels, label_names, args.folds, args.workers, args.prune or None,
+                       args.threshold)
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if args.apply:
+        apply_threshold(results["threshold"])
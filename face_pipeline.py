@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Face Pipeline Helpers for MagicMirror² Face Recognition
+Hardware-free building blocks used by the detection and recognition hot path
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from camera_manager import FrameLayout
+from lbph import HistogramIndex, LBPHScratch
+
+# Burst recognition settings
+BURST_FRAMES = 5  # frames captured back-to-back per recognition attempt
+BURST_AGREEMENT = 0.6  # weighted share of the vote a name needs to win
+BURST_MIN_VOTES = 2  # frames that must agree before the burst may stop early
+CONFIDENCE_SCALE = 50.0  # LBPH distance at which a prediction counts half
+
+# Subject selection settings
+FACE_SIZE = (100, 100)  # crops are resized to the training size before predicting
+SUBJECT_CENTER_WEIGHT = 0.3  # how much being off-centre counts against a face's size
+
+# Detection settings
+CASCADE_SCALE_FACTOR = 1.3
+CASCADE_MIN_NEIGHBORS = 5
+TRACK_PADDING = 0.5  # share of the last box added on every side of the search region
+TRACK_RESCAN_FRAMES = 10  # tracked frames before a full-frame scan looks for new faces
+TRACK_SIZE_RANGE = (0.7, 1.4)  # face size in the region relative to the last box
+
+# Distance-guided detection settings
+CALIBRATION_FILE = "face_size_calibration.json"
+CALIBRATION_SAMPLES = 20  # full-scan faces with a distance reading needed to calibrate
+CALIBRATION_MAX_DISTANCE = 150  # cm; readings beyond this are too noisy to calibrate with
+SIZE_TOLERANCE = (0.6, 1.6)  # expected face width range, relative to the prediction
+REGION_FACE_WIDTHS = 3.0  # width of the search band around the sensor axis, in face widths
+CASCADE_MIN_SIZE = 24  # px; the frontal-face cascade's window
+
+# Session verification settings
+VERIFY_INTERVAL = 2.0  # seconds between identity checks while someone is recognized
+VERIFY_MAX_DISTANCE = 70.0  # LBPH match distance for models saved without a threshold
+VERIFY_MISSES = 2  # consecutive mismatches before the identity counts as changed
+
+
+class BurstVote:
+    """Weighted vote over the predictions of a burst of frames"""
+
+    def __init__(self, agreement=BURST_AGREEMENT, min_votes=BURST_MIN_VOTES,
+                 confidence_scale=CONFIDENCE_SCALE):
+        self.agreement = agreement
+        self.min_votes = min_votes
+        self.confidence_scale = confidence_scale
+        self.weights = {}
+        self.counts = {}
+        self.total_weight = 0.0
+        self.frames = 0
+        self.faces_seen = 0
+
+    def weight(self, confidence):
+        """LBPH confidence is a distance, so closer matches weigh more"""
+        return 1.0 / (1.0 + max(confidence, 0.0) / self.confidence_scale)
+
+    def add_frame(self, predictions):
+        """Record one frame's (name, confidence) predictions; name is None when unknown"""
+        self.frames += 1
+        if not predictions:
+            return
+        self.faces_seen += len(predictions)
+
+        # One vote per frame, cast by the subject (predict_frame puts them first)
+        name, confidence = predictions[0]
+        weight = self.weight(confidence)
+        self.total_weight += weight
+        if name is None:
+            return
+        self.weights[name] = self.weights.get(name, 0.0) + weight
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def leader(self):
+        """Return (name, share) for the name currently ahead"""
+        if not self.weights or self.total_weight <= 0:
+            return None, 0.0
+        name = max(self.weights, key=self.weights.get)
+        return name, self.weights[name] / self.total_weight
+
+    def is_decided(self):
+        """True once enough frames agree that more frames cannot help"""
+        name, share = self.leader()
+        return name is not None and self.counts[name] >= self.min_votes and share >= self.agreement
+
+    def result(self):
+        """Winning name, or None if no name reached the agreement threshold"""
+        name, share = self.leader()
+        if name is None or share < self.agreement:
+            return None
+        return name
+
+
+def subject_order(boxes, frame_shape, center_weight=SUBJECT_CENTER_WEIGHT):
+    """Indices of boxes, the face nearest the sensor first
+
+    The mirror's sensor sits under the camera, so the nearest person has the largest
+    and most central face. Size is scaled down by up to center_weight the further
+    the face is from the centre of the frame.
+    """
+    rows, cols = frame_shape[:2]
+    half_diagonal = np.hypot(cols / 2, rows / 2)
+
+    def score(box):
+        x, y, w, h = box
+        offset = np.hypot(x + w / 2 - cols / 2, y + h / 2 - rows / 2) / half_diagonal
+        return w * h * (1.0 - center_weight * offset)
+
+    return sorted(range(len(boxes)), key=lambda i: score(boxes[i]), reverse=True)
+
+
+def normalize_faces(gray, boxes, size=FACE_SIZE, out=None):
+    """Crop every box out of gray and resize it to the training size, as one N x H x W array
+
+    The crops are written into out (N x H x W) when it is given.
+    """
+    batch = np.empty((len(boxes), size[1], size[0]), dtype=np.uint8) if out is None else out
+    for i, (x, y, w, h) in enumerate(boxes):
+        cv2.resize(gray[y:y+h, x:x+w], size, dst=batch[i])
+    return batch
+
+
+def scale_boxes(boxes, detect, crop):
+    """Face boxes found on the detect image, in the coordinates of the crop image"""
+    if detect is crop:
+        return boxes
+    sx = crop.shape[1] / detect.shape[1]
+    sy = crop.shape[0] / detect.shape[0]
+    return [(int(x * sx), int(y * sy), int(w * sx), int(h * sy)) for x, y, w, h in boxes]
+
+
+class FrameBuffers:
+    """Grayscale frame, face crop and LBPH arrays reused frame after frame by one thread
+
+    All are allocated on first use and again only when the frame size changes or a
+    frame has more faces than any before it, so the hot path does not churn memory.
+    layout (a camera_manager.FrameLayout) says where a frame's detect and crop images are.
+    """
+
+    def __init__(self, size=FACE_SIZE, layout=None):
+        self.size = size
+        self.layout = layout or FrameLayout()
+        self.gray_buffer = None
+        self.face_buffer = np.empty((0, size[1], size[0]), dtype=np.uint8)
+        self.scratch = LBPHScratch()  # LBP planes, histograms and search arrays for predict
+        self.allocations = 0
+
+    def gray(self, frame):
+        """frame as grayscale, converted into the reused buffer (a gray frame is returned as is)"""
+        if frame.ndim == 2:
+            return frame
+        if self.gray_buffer is None or self.gray_buffer.shape != frame.shape[:2]:
+            self.gray_buffer = np.empty(frame.shape[:2], dtype=np.uint8)
+            self.allocations += 1
+        code = cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(frame, code, dst=self.gray_buffer)
+
+    def planes(self, frame):
+        """(detect, crop) grayscale images of a frame; one image for both unless it is dual"""
+        detect, crop = self.layout.split(frame)
+        if detect is crop:
+            gray = self.gray(frame)
+            return gray, gray
+        return detect, crop
+
+    def faces(self, gray, boxes):
+        """normalize_faces() into the reused crop buffer; valid until the next call"""
+        if len(boxes) > len(self.face_buffer):
+            self.face_buffer = np.empty((len(boxes), self.size[1], self.size[0]), dtype=np.uint8)
+            self.allocations += 1
+        return normalize_faces(gray, boxes, self.size, out=self.face_buffer[:len(boxes)])
+
+
+def recognize_faces(gray, faces, model, buffers=None):
+    """Score every face box in gray against model (a LoadedModel) in one batch
+
+    Returns (predictions, candidates): (name, confidence) per face with the subject
+    first, name None if unknown, and the same faces as status-ready dicts. With
+    buffers (FrameBuffers), the crops and everything predict needs go into its reused arrays.
+    """
+    faces = [faces[i] for i in subject_order(faces, gray.shape)]
+    if buffers is None:
+        results = model.recognizer.predict_batch(normalize_faces(gray, faces))
+    else:
+        results = model.recognizer.predict_batch(buffers.faces(gray, faces), buffers.scratch)
+    predictions = [(model.label_map.get(label), confidence) for label, confidence in results]
+    candidates = [
+        {"name": name, "distance": round(float(confidence), 1), "box": list(box), "subject": i == 0}
+        for i, ((name, confidence), box) in enumerate(zip(predictions, faces))
+    ]
+    return predictions, candidates
+
+
+class FaceSizeModel:
+    """Expected face width in pixels from the ultrasonic distance (width ≈ k / distance)
+
+    k is fitted once from faces found by full-frame scans while the distance was known,
+    then saved, so later runs start calibrated. It is stored for a reference frame
+    width and scales with the resolution.
+    """
+
+    def __init__(self, path=CALIBRATION_FILE, samples=CALIBRATION_SAMPLES):
+        self.path = path
+        self.samples = samples
+        self.k = None
+        self.frame_width = None
+        self.observations = []
+
+    @property
+    def calibrated(self):
+        return self.k is not None
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+                self.k, self.frame_width = float(data["k"]), int(data["frame_width"])
+            except Exception as e:
+                print(f"⚠️  Ignoring unreadable face size calibration {self.path}: {e}")
+        return self
+
+    def save(self):
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump({"k": self.k, "frame_width": self.frame_width,
+                       "samples": len(self.observations)}, f)
+        os.replace(temp_file, self.path)
+
+    def observe(self, distance, face_width, frame_width):
+        """Record one face width seen at distance; fits and saves k once there are enough"""
+        if self.calibrated or distance is None or not 0 < distance <= CALIBRATION_MAX_DISTANCE:
+            return
+        self.observations.append(face_width * distance * 1.0 / frame_width)
+        if len(self.observations) >= self.samples:
+            self.k, self.frame_width = statistics.median(self.observations) * frame_width, frame_width
+            print(f"📐 Face size calibrated: {self.k / 100:.0f}px wide at 1m in a {frame_width}px frame")
+            if self.path:
+                try:
+                    self.save()
+                except OSError as e:
+                    print(f"⚠️  Could not save face size calibration: {e}")
+
+    def search(self, distance, frame_shape):
+        """(region as (x0, x1), min_size, max_size) to scan at distance, or None if unknown"""
+        if not self.calibrated or distance is None or distance <= 0:
+            return None
+        rows, cols = frame_shape[:2]
+        expected = self.k / distance * cols / self.frame_width
+        low, high = SIZE_TOLERANCE
+        max_side = min(int(expected * high), rows, cols)
+        min_side = min(max(int(expected * low), CASCADE_MIN_SIZE), max_side)
+        if max_side < CASCADE_MIN_SIZE:
+            return None  # too far away for the cascade to find the face at all
+
+        # The sensor measures the person on the camera axis, so their face is near the middle
+        half = int(expected * REGION_FACE_WIDTHS / 2)
+        x0, x1 = max(cols // 2 - half, 0), min(cols // 2 + half, cols)
+        if x1 - x0 < max_side:
+            x0, x1 = 0, cols
+        return (x0, x1), (min_side, min_side), (max_side, max_side)
+
+
+class DetectionStats:
+    """Frame count and time spent for one kind of cascade run"""
+
+    def __init__(self):
+        self.frames = 0
+        self.seconds = 0.0
+        self.last_seconds = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.seconds += seconds
+        self.last_seconds = seconds
+
+    def average_ms(self):
+        return self.seconds / self.frames * 1000 if self.frames else 0.0
+
+
+class FaceTracker:
+    """Runs the Haar cascade on a region around the last face instead of the whole frame
+
+    A full-frame scan happens when nothing is tracked, when the face is lost in its
+    region, and every rescan_frames frames so new faces are still noticed. With a
+    distance reading and a calibrated size model, that scan first tries only the face
+    sizes and band of the frame the distance allows, and falls back to the full scan
+    when this pruned search finds nothing.
+
+    detect() is search() followed by update(). Recognition workers run only search(),
+    from the state() of the tracker in the main process, and send the result back to
+    its update(), so tracking and calibration stay in one place.
+    """
+
+    def __init__(self, cascade, padding=TRACK_PADDING, rescan_frames=TRACK_RESCAN_FRAMES,
+                 scale_factor=CASCADE_SCALE_FACTOR, min_neighbors=CASCADE_MIN_NEIGHBORS,
+                 size_model=None):
+        self.cascade = cascade
+        self.padding = padding
+        self.rescan_frames = rescan_frames
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.size_model = size_model
+        self.box = None
+        self.tracked_frames = 0
+        self.scans = []  # (kind, seconds) of every cascade run by the last search()
+        self.stats = {"full": DetectionStats(), "roi": DetectionStats(), "pruned": DetectionStats()}
+
+    def reset(self):
+        """Forget the tracked face; the next frame gets a full-frame scan"""
+        self.box = None
+        self.tracked_frames = 0
+
+    def state(self):
+        """(box, tracked_frames, calibration) for a tracker in another process to search() with"""
+        size_model = self.size_model
+        calibration = None
+        if size_model is not None and size_model.calibrated:
+            calibration = (size_model.k, size_model.frame_width)
+        return self.box, self.tracked_frames, calibration
+
+    def restore(self, state):
+        """Search like the tracker whose state() this is; nothing is learned from it here"""
+        self.box, self.tracked_frames, calibration = state
+        if calibration is None:
+            self.size_model = None
+        else:
+            self.size_model = FaceSizeModel(path=None)
+            self.size_model.k, self.size_model.frame_width = calibration
+
+    def detect(self, gray, distance=None):
+        """Return face boxes (x, y, w, h) in frame coordinates; distance is the sensor reading in cm"""
+        faces, kind = self.search(gray, distance)
+        self.update(faces, kind, self.scans, distance, gray.shape[1])
+        return faces
+
+    def search(self, gray, distance=None):
+        """Run the cascade from the current state; returns (faces, kind of the scan that found them)"""
+        self.scans = []
+        if self.cascade is None:
+            return [], None
+        if self.box is not None and self.tracked_frames < self.rescan_frames:
+            faces = self._detect_roi(gray)
+            if len(faces) > 0:
+                return faces, "roi"
+            # Track lost: fall through to a full scan of this frame
+
+        faces = self._detect_pruned(gray, distance)
+        if faces:
+            return faces, "pruned"
+        return self._timed("full", gray), "full"
+
+    def update(self, faces, kind, scans, distance=None, frame_width=None):
+        """Move the track to the result of a search() and count its cascade runs"""
+        for scan, seconds in scans:
+            self.stats[scan].add(seconds)
+        if kind is None:
+            return
+        if kind == "roi":
+            self.tracked_frames += 1
+            self.box = tuple(max(faces, key=lambda f: f[2] * f[3]))
+            return
+        if kind == "full" and faces and self.size_model is not None:
+            largest = max(faces, key=lambda f: f[2] * f[3])
+            self.size_model.observe(distance, largest[2], frame_width)
+        self.tracked_frames = 0
+        self.box = tuple(max(faces, key=lambda f: f[2] * f[3])) if len(faces) > 0 else None
+
+    def _detect_pruned(self, gray, distance):
+        search = self.size_model.search(distance, gray.shape) if self.size_model is not None else None
+        if search is None:
+            return []
+        (x0, x1), min_size, max_size = search
+        faces = self._timed("pruned", gray[:, x0:x1], minSize=min_size, maxSize=max_size)
+        return [(fx + x0, fy, fw, fh) for (fx, fy, fw, fh) in faces]
+
+    def _detect_roi(self, gray):
+        x, y, w, h = self.box
+        pad_x, pad_y = int(w * self.padding), int(h * self.padding)
+        x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+        x1 = min(x + w + pad_x, gray.shape[1])
+        y1 = min(y + h + pad_y, gray.shape[0])
+
+        low, high = TRACK_SIZE_RANGE
+        min_size = (int(w * low), int(h * low))
+        max_size = (int(w * high), int(h * high))
+        faces = self._timed("roi", gray[y0:y1, x0:x1], minSize=min_size, maxSize=max_size)
+        return [(fx + x0, fy + y0, fw, fh) for (fx, fy, fw, fh) in faces]
+
+    def _timed(self, kind, gray, **kwargs):
+        start = time.perf_counter()
+        faces = self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors, **kwargs)
+        self.scans.append((kind, time.perf_counter() - start))
+        return [tuple(int(v) for v in face) for face in faces]
+
+    def summary(self):
+        """One line with frames and average detection time for full-frame and ROI runs"""
+        return ", ".join(f"{kind} {stats.frames} frames avg {stats.average_ms():.1f} ms"
+                         for kind, stats in self.stats.items())
+
+
+class SessionVerifier:
+    """Cheap 1:1 checks that the face in front of the mirror is still the recognized person
+
+    Keeps only that person's stored histograms, so a check costs one LBP extraction
+    and a comparison against a few dozen rows instead of the whole gallery.
+    """
+
+    def __init__(self, model, max_distance=None, misses=VERIFY_MISSES):
+        self.model = model
+        self.fixed_max_distance = max_distance
+        self.misses = misses
+        self.name = None
+        self.label = None
+        self.references = None
+        self.failures = 0
+        self.checks = 0
+        self.seconds = 0.0
+        self.last_distance = None
+
+    @property
+    def active(self):
+        return self.name is not None
+
+    @property
+    def max_distance(self):
+        """Distance up to which the live face still matches
+
+        The model's own threshold unless one was given, so verification accepts the
+        same faces predict() would. cv2 leaves the threshold at DBL_MAX until one is set
+        (evaluate.py --apply), and that counts as none: VERIFY_MAX_DISTANCE applies.
+        """
+        if self.fixed_max_distance is not None:
+            return self.fixed_max_distance
+        threshold = self.model.threshold
+        return threshold if threshold < sys.float_info.max else VERIFY_MAX_DISTANCE
+
+    def start(self, name, label):
+        """Begin verifying name using the stored histograms of label"""
+        self.name = name
+        self.label = label
+        chosen = self.model.labels == label
+        self.references = HistogramIndex(self.model.histograms[chosen], self.model.labels[chosen])
+        self.failures = 0
+        self.last_distance = None
+
+    def stop(self):
+        self.name = None
+        self.label = None
+        self.references = None
+        self.failures = 0
+
+    def check(self, face_img, scratch=None):
+        """Compare one face crop; returns True while it matches, False once identity changed
+
+        A single bad frame is tolerated; False is returned after `misses` in a row.
+        """
+        return self.judge(self.distance(face_img, scratch))
+
+    def distance(self, face_img, scratch=None):
+        """Closest distance from the face crop to the references, or None when not verifying"""
+        if not self.active or len(self.references) == 0:
+            return None
+        start = time.perf_counter()
+        histogram = self.model.histogram(face_img, scratch)
+        distance = self.references.search(histogram, scratch=scratch)[1]
+        self.seconds += time.perf_counter() - start
+        return distance
+
+    def judge(self, distance):
+        """check() for a distance measured elsewhere (e.g. in a worker process)"""
+        if distance is None:
+            return None
+        self.checks += 1
+        self.last_distance = distance
+
+        if distance <= self.max_distance:
+            self.failures = 0
+            return True
+        self.failures += 1
+        return self.failures < self.misses
+
+    def summary(self):
+        average = self.seconds / self.checks * 1000 if self.checks else 0.0
+        return f"{self.checks} checks avg {average:.1f} ms"
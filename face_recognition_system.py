@@ -6,156 +6,236 @@ Based on the working combined.py code
 """
 
 import cv2
-import json
 import time
-import os
-import sys
-import numpy as np
+import signal
+import threading
 from datetime import datetime
-import RPi.GPIO as GPIO
-from picamera2 import Picamera2
 
-# GPIO pins for ultrasonic sensor (matching your working code)
-TRIG_PIN = 23  # GPIO pin for TRIG
-ECHO_PIN = 24  # GPIO pin for ECHO
+from camera_manager import CameraManager, FileFrameSource, PiCameraSource, CAPTURE_MODE, CAPTURE_MODES
+from face_pipeline import (FaceSizeModel, FaceTracker, FrameBuffers, SessionVerifier,
+                           recognize_faces, scale_boxes, subject_order, VERIFY_INTERVAL)
+from metrics import AllocationTracker, Metrics, MetricsWriter, METRICS_FILE
+from model_bundle import LoadedModel, ModelWatcher, load_model, MODEL_BUNDLE
+from recognition_engine import RecognitionEngine
+from session_recording import (RecordingFrameSource, RecordingGPIOBackend, SessionRecorder,
+                               SessionRecording, SessionReplay)
+from status_publisher import StatusPublisher, StatusServer, STATUS_FILE, STATUS_SOCKET
+from ultrasonic import (GpiodBackend, SimulatedGPIOBackend, UltrasonicRanger,
+                        TRIG_PIN, ECHO_PIN, FAR_DISTANCE)
 
 # Face recognition settings
-STATUS_FILE = "/tmp/magicmirror_face_status.json"
 PROXIMITY_THRESHOLD = 20  # cm
 TIMEOUT_DELAY = 10  # seconds
+CONTROL_INTERVAL = 0.1  # seconds between proximity checks in the control loop
+CONTROL_IDLE_INTERVAL = 1.0  # longest wait between checks while the sensor reports an idle scene
+CAMERA_PREWARM_LEAD = 1.5  # seconds before the threshold is expected to be crossed to open the camera
+CAMERA_PREWARM_RETRY = 5.0  # seconds before another approach may trigger a prewarm
+PRUNE_PEOPLE = 0  # if set, only this many closest centroids are searched in full (check with evaluate.py --prune)
+RECOGNITION_WORKERS = 0  # detection/recognition processes; 0 runs them on a thread in this process
 
 # Face recognition paths (matching your working code)
 CASCADE_PATH = "/home/andii/haarcascades/haarcascade_frontalface_default.xml"
-TRAINER_PATH = "trainer.yml"  # Will check python_code/trainer.yml if not found
-IMAGE_BASE = "Images"
 
 class FaceRecognitionSystem:
-    def __init__(self):
+    def __init__(self, frame_source=None, gpio_backend=None, cascade_path=CASCADE_PATH,
+                 model_path=MODEL_BUNDLE, status_file=STATUS_FILE, status_socket=STATUS_SOCKET,
+                 metrics_file=METRICS_FILE, record_path=None, workers=RECOGNITION_WORKERS,
+                 trace_allocations=False):
         self.current_person = None
         self.current_distance = 999
         self.is_active = False
         self.last_detection_time = None
         self.shutdown_timer = None
+        self.last_burst_frames = 0
+        self.last_prewarm = None
+        self.candidates = []  # every face in the last recognized frame, subject first
+        self.engine = None  # capture/recognition/status stages, started by run()
+        self.workers = workers
+        self.cascade_path = cascade_path
+        self.model_path = model_path
+        self.running = False
         
-        # Initialize GPIO for ultrasonic sensor (matching your working code)
+        # Per-stage latency percentiles and event counters, exported as a Prometheus text file
+        self.metrics = Metrics()
+        self.metrics_writer = MetricsWriter(self.metrics, metrics_file)
+        # tracemalloc report of the frame loop's allocations, printed on exit (costly; off by default)
+        self.allocations = AllocationTracker() if trace_allocations else None
+        
+        # Status changes are pushed over a Unix socket; the file stays as a fallback.
+        # Writes are coalesced and unchanged states are only re-sent as a heartbeat.
+        self.status_server = StatusServer(status_socket)
+        try:
+            self.status_server.start()
+        except Exception as e:
+            print(f"⚠️  Status socket warning: {e}")
+            print("   Continuing with the status file only...")
+            self.status_server = None
+        self.status_file = status_file
+        self.publisher = StatusPublisher(status_file, server=self.status_server, metrics=self.metrics)
+        
+        # Optionally record every echo and frame the pipeline sees, for replay off-device
+        self.recorder = SessionRecorder(record_path) if record_path else None
+        
+        # Ultrasonic ranging samples on its own thread, independent of recognition
+        self.ranger = None
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(TRIG_PIN, GPIO.OUT)
-            GPIO.setup(ECHO_PIN, GPIO.IN)
+            if gpio_backend is None:
+                gpio_backend = GpiodBackend(TRIG_PIN, ECHO_PIN)
         except Exception as e:
             print(f"⚠️  GPIO setup warning: {e}")
             print("   Continuing without ultrasonic sensor...")
             self.gpio_available = False
         else:
+            if self.recorder is not None:
+                gpio_backend = RecordingGPIOBackend(gpio_backend, self.recorder)
+            self.ranger = UltrasonicRanger(gpio_backend)
+            self.ranger.start()
             self.gpio_available = True
         
-        # Load face recognition components (matching your working code)
-        self.face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-        self.recognizer = cv2.face.LBPHFaceRecognizer_create()
+        # One warm camera session shared by every recognition attempt
+        if self.recorder is not None:
+            frame_source = RecordingFrameSource(frame_source or PiCameraSource(), self.recorder)
+        self.camera = CameraManager(frame_source, metrics=self.metrics)
         
-        # Try to load trainer.yml from multiple locations
-        trainer_paths = [TRAINER_PATH, "python_code/trainer.yml"]
-        trainer_loaded = False
-        
-        for trainer_path in trainer_paths:
-            if os.path.exists(trainer_path):
-                try:
-                    self.recognizer.read(trainer_path)
-                    print(f"✅ Loaded trainer from: {trainer_path}")
-                    trainer_loaded = True
-                    break
-                except Exception as e:
-                    print(f"⚠️  Could not load trainer from {trainer_path}: {e}")
-                    continue
+        # Load face recognition components (matching your working code)
+        self.face_cascade = cv2.CascadeClassifier(cascade_path) if cascade_path else None
+        if self.face_cascade is None:
+            print("⚠️  No face cascade given - faces will not be detected")
+        # Cascade on a region around the last face, or at the face size the distance predicts
+        self.tracker = FaceTracker(self.face_cascade, size_model=FaceSizeModel().load())
+        # Gray frame and face crops reused by predict_frame/verify_frame (recognition stage only)
+        self.buffers = FrameBuffers(layout=self.camera.layout)
         
-        if not trainer_loaded:
-            raise Exception("Could not load trainer.yml from any location")
+        # Model bundle (labels stored with the histograms), or an old trainer.yml.
+        # Recognizer and labels live in one object so a reload swaps both at once.
+        self.model = LoadedModel(*load_model(model_path))
+        self.prepare_model(self.model)
+        self.model_watcher = ModelWatcher(model_path, prepare=self.prepare_model)
         
-        # Load label mapping (matching your working code)
-        if os.path.exists(IMAGE_BASE):
-            self.label_names = os.listdir(IMAGE_BASE)
-        else:
-            self.label_names = []
-        self.label_map = {i: name for i, name in enumerate(self.label_names)}
+        # Once someone is recognized, re-check only against their own histograms
+        self.verifier = SessionVerifier(self.recognizer)
+        self.last_verify_time = None
         
         print("Face Recognition System initialized")
-        print(f"Loaded {len(self.label_names)} known faces: {self.label_names}")
+        print(f"Loaded {len(self.model.label_map)} known faces: {list(self.model.label_map.values())}")
+
+    @property
+    def recognizer(self):
+        return self.model.recognizer
+
+    @property
+    def label_names(self):
+        return self.model.label_names
+
+    @property
+    def label_map(self):
+        return self.model.label_map
+
+    def prepare_model(self, model):
+        """Configure a freshly loaded model and build its search index up front"""
+        model.recognizer.prune_people = PRUNE_PEOPLE or None
+        model.recognizer.index  # built here rather than on the first predict after a swap
+
+    def apply_pending_model(self):
+        """Swap in a reloaded model; called between recognition attempts only"""
+        model = self.model_watcher.take()
+        if model is None:
+            return False
+        self.model = model
+        self.verifier.model = model.recognizer
+        self.metrics.inc("model_reloads")
+        if self.verifier.active:
+            name = self.verifier.name
+            if name in model.label_names:
+                self.verifier.start(name, model.label_names.index(name))
+            else:
+                print(f"⚠️  {name} is not in the new model - verification paused")
+                self.verifier.stop()
+        print(f"🔄 Now recognizing {len(model.label_map)} known faces: {list(model.label_map.values())}")
+        return True
 
     def get_distance(self):
-        """Get distance from ultrasonic sensor in cm (matching your working code)"""
+        """Get the median-filtered distance from the ultrasonic sensor in cm"""
         if not self.gpio_available:
-            return 999  # Return far distance if GPIO not available
-            
-        try:
-            GPIO.output(TRIG_PIN, False)
-            time.sleep(0.1)
-
-            GPIO.output(TRIG_PIN, True)
-            time.sleep(0.00001)
-            GPIO.output(TRIG_PIN, False)
-
-            while GPIO.input(ECHO_PIN) == 0:
-                pulse_start = time.time()
-            while GPIO.input(ECHO_PIN) == 1:
-                pulse_end = time.time()
-
-            pulse_duration = pulse_end - pulse_start
-            distance = pulse_duration * 17150
-            distance = round(distance, 2)
-            return distance
-            
-        except Exception as e:
-            print(f"Error reading distance: {e}")
-            return 999
+            return FAR_DISTANCE  # Return far distance if GPIO not available
+        return self.ranger.distance()
 
-    def recognize_face_with_camera(self):
-        """Recognize faces using Picamera2 (matching your working code)"""
-        try:
-            print(f"[INFO] Object detected at {self.current_distance}cm. Opening camera...")
-            
-            # Update status to show "detecting" state
-            self.update_status_file()
-            
-            picam2 = Picamera2()
-            config = picam2.create_preview_configuration(main={"size": (320, 240)})
-            picam2.configure(config)
-            picam2.start()
-            time.sleep(1)  # small delay to let camera initialize
-
-            frame = picam2.capture_array()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-
-            recognized_person = None
-            if len(faces) > 0:
-                for (x, y, w, h) in faces:
-                    face_img = gray[y:y+h, x:x+w]
-                    label, confidence = self.recognizer.predict(face_img)
-                    name = self.label_map.get(label, "Unknown")
-                    print(f"[INFO] Recognized: {name} (Confidence: {confidence:.2f})")
-                    
-                    # Only return known persons, not "Unknown"
-                    if name != "Unknown":
-                        recognized_person = name
-                        break
-                    else:
-                        print(f"[INFO] Face detected but not recognized (confidence: {confidence:.2f})")
-            else:
-                print("[INFO] No face detected in frame!")
+    def prewarm_camera(self):
+        """Open the camera early when someone is closing in on PROXIMITY_THRESHOLD"""
+        if self.ranger is None or self.camera.is_open:
+            return False
+        if self.last_prewarm is not None and time.monotonic() - self.last_prewarm < CAMERA_PREWARM_RETRY:
+            return False  # still opening from the last request
+        eta = self.ranger.eta(PROXIMITY_THRESHOLD)
+        if eta is None or eta > CAMERA_PREWARM_LEAD:
+            return False
+        print(f"Approach at {-self.ranger.velocity():.0f}cm/s ({self.current_distance}cm) "
+              f"- warming camera {eta:.1f}s ahead")
+        self.engine.prewarm()
+        self.last_prewarm = time.monotonic()
+        self.metrics.inc("camera_prewarms")
+        return True
 
-            picam2.close()
-            
-            # Don't update current_person here, let the main loop handle it
-            return recognized_person
-            
-        except Exception as e:
-            print(f"Error in face recognition: {e}")
-            self.current_person = None
-            self.update_status_file()
+    def wait_for_next_check(self):
+        """Sleep until the next proximity check; long while the scene is idle, woken when it is not"""
+        if self.is_active or self.ranger is None or not self.ranger.idle:
+            time.sleep(CONTROL_INTERVAL)
+        else:
+            self.ranger.active.wait(CONTROL_IDLE_INTERVAL)
+
+    def predict_frame(self, frame):
+        """Detect faces in one frame and return (name, confidence) for each; name is None if unknown
+
+        The face nearest the sensor (largest, most central) comes first. Every crop is
+        resized to the training size and all of them are scored in one batch. With a
+        dual-stream camera, faces are found on the lores image and cropped from the main one.
+        """
+        with self.metrics.time("cvtColor"):
+            detect_gray, gray = self.buffers.planes(frame)
+        with self.metrics.time("detect"):
+            faces = self.tracker.detect(detect_gray, self.current_distance)
+        if not faces:
+            self.candidates = []
+            return []
+        faces = scale_boxes(faces, detect_gray, gray)
+
+        model = self.model  # one model for the whole frame, even if a reload lands meanwhile
+        with self.metrics.time("predict"):
+            predictions, self.candidates = recognize_faces(gray, faces, model, self.buffers)
+        return predictions
+
+    def verify_frame(self, frame):
+        """Check the largest face in one frame against the recognized person
+
+        Returns True while it is still them, False once identity changed, None if no face.
+        """
+        with self.metrics.time("cvtColor"):
+            detect_gray, gray = self.buffers.planes(frame)
+        with self.metrics.time("detect"):
+            faces = self.tracker.detect(detect_gray, self.current_distance)
+        if not faces:
             return None
+        faces = scale_boxes(faces, detect_gray, gray)
+        subject = faces[subject_order(faces, gray.shape)[0]]
+        with self.metrics.time("verify"):
+            verdict = self.verifier.check(self.buffers.faces(gray, [subject])[0], self.buffers.scratch)
+        self.metrics.inc("verifications")
+        return verdict
+
+    def start_session(self, person):
+        """Remember who was recognized and start periodic 1:1 verification"""
+        self.current_person = person
+        if person in self.label_names:
+            self.verifier.start(person, self.label_names.index(person))
+        self.last_verify_time = time.time()
 
-    def update_status_file(self):
-        """Update the status file for MagicMirror²"""
+    def end_session(self):
+        self.current_person = None
+        self.verifier.stop()
+        self.last_verify_time = None
+
+    def update_status_file(self, force=False):
+        """Publish the current status for MagicMirror² if it changed"""
         # Determine current status
         if not self.is_active:
             status_type = "waiting"
@@ -169,26 +249,35 @@ class FaceRecognitionSystem:
             "person": self.current_person,
             "active": self.is_active,
             "status": status_type,
+            "candidates": self.candidates if self.is_active else [],
             "timestamp": datetime.now().isoformat()
         }
-        
-        try:
-            # Write to temporary file first, then rename to avoid corruption
-            temp_file = STATUS_FILE + ".tmp"
-            with open(temp_file, 'w') as f:
-                json.dump(status, f, indent=2)
-            # Atomic rename to avoid partial reads
-            os.rename(temp_file, STATUS_FILE)
-        except Exception as e:
-            print(f"Error writing status file: {e}")
+        if self.engine is not None:
+            self.engine.submit_status(status, force)
+        else:
+            self.publisher.publish(status, force)
 
     def run(self):
-        """Main loop (based on your working combined.py logic)"""
+        """Main control loop; capture, recognition and publishing run on their own stages"""
         print("Starting face recognition system...")
         print("Press Ctrl+C to stop")
         
+        self.engine = RecognitionEngine(self, self.workers)
+        if self.allocations is not None:
+            self.allocations.start()
+        self.engine.start()
+        
+        # Pick up retrained models without a restart; `kill -HUP <pid>` checks immediately
+        self.model_watcher.start()
+        self.metrics_writer.start()
+        if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.model_watcher.check_now())
+        
+        self.running = True
         try:
-            while True:
+            while self.running:
+                loop_start = time.perf_counter()
+                
                 # Get distance from ultrasonic sensor
                 distance = self.get_distance()
                 self.current_distance = distance
@@ -200,53 +289,120 @@ class FaceRecognitionSystem:
                         print(f"Object detected at {distance}cm - starting face recognition")
                         self.is_active = True
                         self.last_detection_time = time.time()
-                        self.shutdown_timer = None
-                        self.current_person = None  # Reset person
+                        self.end_session()  # Reset person
                         self.update_status_file()  # Update status to show detecting
+                    self.shutdown_timer = None
                     
-                    # Keep trying face recognition until we get a known person
+                    # Keep recognizing in the background until we get a known person
                     if self.current_person is None:
-                        # Perform face recognition using your working method
-                        person = self.recognize_face_with_camera()
-                        if person and person != "Unknown":
+                        self.engine.request_recognition()
+                        person = self.engine.poll_result()
+                        if person:
                             print(f"Face recognized: {person}")
-                            self.current_person = person
-                        else:
-                            print("Face not recognized yet, continuing to try...")
-                            # Don't set to "Unknown", keep trying
-                            self.current_person = None
+                            self.start_session(person)
+                            self.engine.cancel()
+                    elif time.time() - self.last_verify_time >= VERIFY_INTERVAL:
+                        # Cheap 1:1 check that the same person is still in front of the mirror
+                        self.engine.request_verification()
+                        self.last_verify_time = time.time()
                     
-                    time.sleep(1)  # Shorter delay for continuous recognition attempts
+                    if self.current_person is not None and self.engine.poll_verdict() is False:
+                        print(f"Identity changed (distance {self.verifier.last_distance:.1f}) "
+                              f"- {self.current_person} no longer matches, recognizing again")
+                        self.metrics.inc("identity_changes")
+                        self.end_session()
+                        self.engine.cancel()
                 else:
+                    if not self.is_active:
+                        self.prewarm_camera()
                     # Object moved away
                     if self.is_active:
                         if self.shutdown_timer is None:
                             print(f"Object moved away ({distance}cm) - starting {TIMEOUT_DELAY}s shutdown timer")
                             self.shutdown_timer = time.time()
+                            self.engine.cancel()
                         elif time.time() - self.shutdown_timer >= TIMEOUT_DELAY:
                             print("Timeout reached - logging out user")
                             self.is_active = False
-                            self.current_person = None
+                            self.end_session()
                             self.shutdown_timer = None
-                            # Update status file to clear user data
-                            self.update_status_file()
+                            self.engine.reset_tracker()
                 
                 # Update status file for MagicMirror²
                 self.update_status_file()
+                self.metrics.observe("control_loop", time.perf_counter() - loop_start)
                 
-                # Small delay for sensor polling (matching your code)
-                time.sleep(0.2)
+                # Recognition no longer blocks this loop; the cadence follows the sensor's
+                self.wait_for_next_check()
                 
         except KeyboardInterrupt:
             print("\nStopping face recognition system...")
         finally:
             self.cleanup()
 
+    def stop(self):
+        """Make run() return after its current pass (for running it on another thread)"""
+        self.running = False
+
     def cleanup(self):
         """Clean up resources"""
-        GPIO.cleanup()
+        self.model_watcher.stop()
+        if self.engine is not None:
+            print(f"Stage queues: {self.engine.queue_depths()}")
+            self.engine.stop()
+            self.engine = None
+        self.camera.close()
+        print(f"Detection: {self.tracker.summary()}")
+        print(f"Verification: {self.verifier.summary()}")
+        print(f"Status writes: {self.publisher.writes}, suppressed: {self.publisher.suppressed}")
+        self.metrics_writer.stop()
+        print(f"Latency: {self.metrics.summary()}")
+        if self.allocations is not None:
+            print(self.allocations.report())
+            self.allocations.stop()
+        if self.status_server is not None:
+            self.status_server.close()
+        if self.ranger is not None:
+            self.ranger.close()
+        if self.recorder is not None:
+            self.recorder.close()
         print("Cleanup completed")
 
 if __name__ == "__main__":
-    system = FaceRecognitionSystem()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Face Recognition System for MagicMirror²")
+    parser.add_argument("--frames", help="Image folder or video file to use instead of the Pi camera")
+    parser.add_argument("--capture-mode", choices=CAPTURE_MODES, default=CAPTURE_MODE,
+                        help=f"How frames are taken from the Pi camera (default {CAPTURE_MODE})")
+    parser.add_argument("--echo-replay", help="File of recorded echo durations to use instead of GPIO")
+    parser.add_argument("--record", help="Record echoes and frames of this session into a directory")
+    parser.add_argument("--replay", help="Replay a recorded session directory in real time")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help=f"Prometheus text file for latency metrics (default {METRICS_FILE})")
+    parser.add_argument("--workers", type=int, default=RECOGNITION_WORKERS,
+                        help="Run detection and recognition in this many worker processes "
+                             "(default: on a thread in this process)")
+    parser.add_argument("--trace-alloc", action="store_true",
+                        help="Trace memory allocations per frame and print a report on exit")
+    args = parser.parse_args()
+
+    frame_source = FileFrameSource(args.frames) if args.frames else PiCameraSource(mode=args.capture_mode)
+    gpio_backend = SimulatedGPIOBackend.from_file(args.echo_replay) if args.echo_replay else None
+    replay = None
+    if args.replay:
+        recording = SessionRecording(args.replay)
+        print(f"🎞️  Replaying {args.replay}: {recording.summary()}")
+        replay = SessionReplay(recording)
+        frame_source, gpio_backend = replay.frame_source(), replay.gpio_backend()
+    system = FaceRecognitionSystem(frame_source, gpio_backend, metrics_file=args.metrics_file,
+                                   record_path=args.record, workers=args.workers,
+                                   trace_allocations=args.trace_alloc)
+    if replay is not None:
+        # End the run once the recording is used up
+        def stop_when_finished():
+            while not replay.finished:
+                time.sleep(0.5)
+            system.stop()
+        threading.Thread(target=stop_when_finished, daemon=True).start()
     system.run()
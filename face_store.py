@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Face Store for MagicMirror² Face Recognition
+Packed training set: every 100x100 grayscale face in one memory-mapped uint8 array,
+with an append-only JSON-lines index of person and source per slot
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from training_data import (load_training_faces, PhotoWriter, StageStats, CASCADE_PATH,
+                           FACE_SIZE, IMAGE_BASE)
+
+FACE_STORE = "face_dataset"
+INDEX_FILE = "index.jsonl"
+STORE_VERSION = 1
+FACE_BYTES = FACE_SIZE[0] * FACE_SIZE[1]
+
+
+class FaceStore:
+    """Packed face array plus its append log
+
+    The first index line names the face file; every later line is either a face record
+    {"slot", "person", "source", "added"} or a removal {"remove": person}. Faces are
+    written before their record, so a crash can only leave unreferenced bytes behind,
+    and a torn last line is ignored. compact() writes a new face file and swaps the
+    index over to it in one rename.
+    """
+
+    def __init__(self, path=FACE_STORE):
+        self.path = path
+        self.records = []  # face records in slot order, each with a "live" flag
+        self.faces_name = None
+        self.lock = threading.Lock()
+        self._faces = None
+        self._fd = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.path, INDEX_FILE)
+
+    @property
+    def faces_path(self):
+        return os.path.join(self.path, self.faces_name)
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    @classmethod
+    def open(cls, path=FACE_STORE, create=False):
+        """Load the store at path; with create, start an empty one if there is none"""
+        store = cls(path)
+        if store.exists():
+            store.load()
+        elif create:
+            store._write_index("faces.0.u8", [])
+            store.faces_name = "faces.0.u8"
+            open(store.faces_path, "wb").close()
+        else:
+            raise FileNotFoundError(f"No face store at {path}")
+        return store
+
+    def load(self):
+        self.records = []
+        with open(self.index_path, "r") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != STORE_VERSION:
+                raise ValueError(f"Unsupported face store version {header.get('version')} in {self.path}")
+            self.faces_name = header["faces"]
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn write at the end of the log
+                if "remove" in entry:
+                    for record in self.records:
+                        if record["person"] == entry["remove"]:
+                            record["live"] = False
+                else:
+                    self.records.append(dict(entry, live=True))
+        self._faces = None
+
+    @property
+    def faces(self):
+        """Every slot (removed ones included) as one read-only N x 100 x 100 memmap"""
+        if self._faces is None or len(self._faces) != len(self.records):
+            if self.records:
+                self._faces = np.memmap(self.faces_path, dtype=np.uint8, mode="r",
+                                        shape=(len(self.records),) + FACE_SIZE)
+            else:
+                self._faces = np.zeros((0,) + FACE_SIZE, dtype=np.uint8)
+        return self._faces
+
+    def people(self):
+        """{person: live face count}, people sorted by name"""
+        counts = {}
+        for record in self.records:
+            if record["live"]:
+                counts[record["person"]] = counts.get(record["person"], 0) + 1
+        return dict(sorted(counts.items()))
+
+    def append(self, person, face, source="camera"):
+        """Add one face for person; safe to call from several threads"""
+        face = np.ascontiguousarray(face, dtype=np.uint8)
+        if face.shape != FACE_SIZE:
+            raise ValueError(f"Face of shape {face.shape} is not {FACE_SIZE}")
+        with self.lock:
+            if self._fd is None:
+                self._fd = os.open(self.faces_path, os.O_WRONLY | os.O_CREAT)
+            slot = len(self.records)
+            # At the slot's offset, not the end: bytes from a crashed append get overwritten
+            os.pwrite(self._fd, face.tobytes(), slot * FACE_BYTES)
+            record = {"slot": slot, "person": person, "source": source,
+                      "added": datetime.now().isoformat(timespec="seconds")}
+            self._log(record)
+            self.records.append(dict(record, live=True))
+        return slot
+
+    def remove(self, person):
+        """Drop every face of person; the bytes stay until compact()"""
+        with self.lock:
+            removed = sum(1 for r in self.records if r["live"] and r["person"] == person)
+            if removed:
+                self._log({"remove": person})
+                for record in self.records:
+                    if record["person"] == person:
+                        record["live"] = False
+        return removed
+
+    def _log(self, entry):
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _write_index(self, faces_name, records):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"version": STORE_VERSION, "faces": faces_name,
+                                "face_size": list(FACE_SIZE)}) + "\n")
+            for record in records:
+                f.write(json.dumps({k: v for k, v in record.items() if k != "live"}) + "\n")
+        os.replace(tmp_path, self.index_path)
+
+    def training_set(self, people=None):
+        """Return (faces, labels, label_names) like load_training_faces, without copying
+
+        Each face is a view into the memmap. People are labelled in sorted name order.
+        """
+        label_names = [p for p in self.people() if people is None or p in people]
+        label_of = {name: i for i, name in enumerate(label_names)}
+        faces, labels = [], []
+        array = self.faces
+        for name in label_names:
+            for record in self.records:
+                if record["live"] and record["person"] == name:
+                    faces.append(array[record["slot"]])
+                    labels.append(label_of[name])
+        return faces, labels, label_names
+
+    def compact(self):
+        """Rewrite the face file without removed slots; returns how many were dropped"""
+        with self.lock:
+            live = [r for r in self.records if r["live"]]
+            dropped = len(self.records) - len(live)
+            if dropped == 0:
+                return 0
+            generation = int(self.faces_name.split(".")[1]) + 1
+            faces_name = f"faces.{generation}.u8"
+            array = self.faces
+            records = []
+            with open(os.path.join(self.path, faces_name), "wb") as f:
+                for slot, record in enumerate(live):
+                    f.write(array[record["slot"]].tobytes())
+                    records.append(dict(record, slot=slot))
+            self._write_index(faces_name, records)
+
+            old_path = self.faces_path
+            self.close()
+            self.faces_name, self.records = faces_name, records
+            self._faces = None
+            os.remove(old_path)
+        return dropped
+
+    def close(self):
+        """Close the append descriptor and drop the face memmap; safe to call twice"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self._faces = None
+
+    def summary(self):
+        people = self.people()
+        live = sum(people.values())
+        size = os.path.getsize(self.faces_path) if os.path.exists(self.faces_path) else 0
+        return (f"{live} faces of {len(people)} people, {len(self.records) - live} removed slots, "
+                f"{size / 1e6:.1f} MB")
+
+
+def import_folder(store, image_base=IMAGE_BASE, cascade_path=CASCADE_PATH, workers=None):
+    """Add every photo under image_base/<person> not already imported; returns how many were added"""
+    imported = {r["source"] for r in store.records if r["live"]}
+    stats = StageStats()
+    paths = []
+    faces, labels, label_names = load_training_faces(image_base, cascade_path, workers=workers,
+                                                     stats=stats, paths=paths)
+    added = 0
+    for face, label, path in zip(faces, labels, paths):
+        if path not in imported:
+            store.append(label_names[label], face, source=path)
+            added += 1
+    stats.report()
+    return added
+
+
+def export_folder(store, out_base, extension=".png"):
+    """Write every live face to out_base/<person>/ on a writer pool; returns how many were saved
+
+    PNG by default, since it is lossless and keeps the LBP textures intact.
+    """
+    records = [r for r in store.records if r["live"]]
+    for person in store.people():
+        os.makedirs(os.path.join(out_base, person), exist_ok=True)
+    writer = PhotoWriter(len(records), progress_every=max(len(records) // 10, 1))
+    array = store.faces
+    for record in records:
+        path = os.path.join(out_base, record["person"], f"face_{record['slot']:05d}{extension}")
+        writer.submit(path, array[record["slot"]])
+    return writer.close()
+
+
+def load_dataset(store_path=FACE_STORE, image_base=IMAGE_BASE, cascade_path=CASCADE_PATH,
+                 stats=None, people=None, workers=None):
+    """Training set from the face store if there is one, otherwise from the JPEG folders"""
+    store = FaceStore(store_path)
+    if store.exists():
+        store.load()
+        faces, labels, label_names = store.training_set(people)
+        print(f"   🗃️  {len(faces)} faces mapped from {store_path}")
+        return faces, labels, label_names
+    return load_training_faces(image_base, cascade_path, workers=workers, stats=stats, people=people)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the packed face dataset")
+    parser.add_argument("--store", default=FACE_STORE, help=f"Store directory (default {FACE_STORE})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("info", help="Show people and face counts")
+    importer = commands.add_parser("import", help="Add the photos of a JPEG folder tree")
+    importer.add_argument("folder", nargs="?", default=IMAGE_BASE)
+    importer.add_argument("--cascade", default=CASCADE_PATH,
+                          help="Haar cascade for photos that are not 100x100 face crops")
+    exporter = commands.add_parser("export", help="Write every face out as one image file each")
+    exporter.add_argument("folder")
+    exporter.add_argument("--jpeg", action="store_true", help="Write lossy JPEGs instead of PNGs")
+    remover = commands.add_parser("remove", help="Remove a person and compact the store")
+    remover.add_argument("person")
+    args = parser.parse_args()
+
+    store = FaceStore.open(args.store, create=args.command == "import")
+    if args.command == "import":
+        added = import_folder(store, args.folder, args.cascade)
+        print(f"✅ Imported {added} faces from {args.folder}")
+    elif args.command == "export":
+        saved = export_folder(store, args.folder, ".jpg" if args.jpeg else ".png")
+        print(f"✅ Exported {saved} faces to {args.folder}")
+    elif args.command == "remove":
+        removed = store.remove(args.person)
+        store.compact()
+        print(f"✅ Removed {removed} faces of {args.person}")
+    store.close()
+
+    print(f"🗃️  {args.store}: {store.summary()}")
+    for person, count in store.people().items():
+        print(f"   {person:<16} {count:>5} faces")
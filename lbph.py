@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+LBPH Features for MagicMirror² Face Recognition
+NumPy version of OpenCV's LBPH histograms and nearest-neighbour predict, so a model
+can run straight from the histograms stored in a model bundle
+"""
+
+import functools
+import math
+
+import numpy as np
+
+# Defaults of cv2.face.LBPHFaceRecognizer_create()
+LBPH_RADIUS = 1
+LBPH_NEIGHBORS = 8
+LBPH_GRID_X = 8
+LBPH_GRID_Y = 8
+FLOAT_EPSILON = np.finfo(np.float32).eps
+SEARCH_BLOCK = 512  # non-zero query bins gathered and scored at a time
+
+
+class LBPHScratch:
+    """Arrays reused by lbp_image, spatial_histogram and HistogramIndex.search call after call
+
+    Each array is allocated the first time it is asked for and again only when a
+    larger one is needed (more faces, a bigger gallery, more non-zero bins), so the
+    predict path stops churning memory once it has seen a few frames. One thread
+    only; FrameBuffers keeps one for the recognition stage.
+    """
+
+    def __init__(self):
+        self.arrays = {}
+        self.constants = {}
+        self.allocations = 0
+
+    def get(self, name, shape, dtype):
+        """A reused array of shape; its contents are whatever the last user left"""
+        size = math.prod(shape)
+        buffer = self.arrays.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            grown = size if buffer is None else max(size, buffer.size * 5 // 4)
+            buffer = self.arrays[name] = np.empty(grown, dtype=dtype)
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
+
+    def constant(self, name, key, build):
+        """build() once per key, then the same array until key changes"""
+        cached = self.constants.get(name)
+        if cached is None or cached[0] != key:
+            cached = self.constants[name] = (key, build())
+            self.allocations += 1
+        return cached[1]
+
+
+@functools.lru_cache(maxsize=None)
+def _sampling(radius, neighbors):
+    """(fy, fx, cy, cx, w1, w2, w3, w4) of every neighbour: its corner offsets and bilinear weights"""
+    points = []
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / neighbors))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / neighbors))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = x - np.float32(fx), y - np.float32(fy)
+        points.append((fy, fx, cy, cx, (1 - tx) * (1 - ty), tx * (1 - ty), (1 - tx) * ty, tx * ty))
+    return tuple(points)
+
+
+def lbp_image(gray, radius=LBPH_RADIUS, neighbors=LBPH_NEIGHBORS, scratch=None):
+    """Extended (circular) LBP codes of a grayscale image, same sampling as OpenCV
+
+    Also takes an N x H x W stack of same-sized images and codes them all at once.
+    With scratch (an LBPHScratch), every plane is one of its reused arrays and the
+    codes stay valid until it is used again.
+    """
+    scratch = scratch if scratch is not None else LBPHScratch()
+    gray = np.asarray(gray)
+    rows, cols = gray.shape[-2:]
+    # Work on the flattened stack: a neighbour at (dy, dx) is then the whole image shifted
+    # by dy*cols + dx, so every operand is one contiguous run that NumPy needs no iteration
+    # buffer for. Codes computed across a row or image edge are sliced off at the end.
+    span = max(gray.size - 2 * radius * cols - 2 * radius, 0)
+    src = scratch.get("source", gray.shape, np.float32)  # float32 so no product needs a cast
+    np.copyto(src, gray)
+    src = src.reshape(-1)
+    codes = scratch.get("codes", gray.shape, np.intp)
+    codes.fill(0)
+    flat_codes = codes.reshape(-1)[:span]
+    sample = scratch.get("sample", (span,), np.float32)
+    term = scratch.get("term", (span,), np.float32)
+    hit = scratch.get("hit", (span,), np.bool_)
+    close = scratch.get("close", (span,), np.bool_)
+    bits = scratch.get("bits", (span,), np.intp)
+
+    def shifted(dy, dx):
+        start = (radius + dy) * cols + radius + dx
+        return src[start:start + span]
+
+    center = shifted(0, 0)
+    for n, (fy, fx, cy, cx, w1, w2, w3, w4) in enumerate(_sampling(radius, neighbors)):
+        # w1*a + w2*b + w3*c + w4*d, summed in that order like the expression OpenCV uses
+        np.multiply(shifted(fy, fx), w1, out=sample)
+        for (dy, dx), weight in (((fy, cx), w2), ((cy, fx), w3), ((cy, cx), w4)):
+            np.multiply(shifted(dy, dx), weight, out=term)
+            sample += term
+        np.greater(sample, center, out=hit)
+        np.subtract(sample, center, out=term)
+        np.abs(term, out=term)
+        np.less(term, FLOAT_EPSILON, out=close)
+        hit |= close
+        np.copyto(bits, hit)
+        bits <<= n
+        flat_codes += bits
+    return codes[..., :rows - 2 * radius, :cols - 2 * radius]
+
+
+def spatial_histogram(codes, neighbors=LBPH_NEIGHBORS, grid_x=LBPH_GRID_X, grid_y=LBPH_GRID_Y,
+                      scratch=None):
+    """Concatenated, normalized per-cell histograms of an LBP code image as one float32 row
+
+    An N x H x W stack of code images gives an N-row matrix, counted in one pass.
+    With scratch, the matrix is one of its reused arrays.
+    """
+    if codes.ndim == 2:
+        return spatial_histogram(codes[None], neighbors, grid_x, grid_y, scratch)[0]
+    scratch = scratch if scratch is not None else LBPHScratch()
+    count = codes.shape[0]
+    bins = 2 ** neighbors
+    height = codes.shape[1] // grid_y
+    width = codes.shape[2] // grid_x
+    if height == 0 or width == 0:
+        raise ValueError(f"Face of {codes.shape[2]}x{codes.shape[1]} LBP codes is too small "
+                         f"for a {grid_x}x{grid_y} grid")
+
+    # Every code's bin in the N x features matrix is its value plus a fixed offset for its
+    # face and cell; trailing rows/columns are dropped like OpenCV does
+    features = grid_y * grid_x * bins
+    shape = (count, grid_y * height, grid_x * width)
+
+    def cell_offsets():
+        cells = (np.arange(shape[1]) // height)[:, None] * grid_x + np.arange(shape[2]) // width
+        return np.arange(count)[:, None, None] * features + cells[None] * bins
+
+    offsets = scratch.constant("cell_offsets", (shape, bins), cell_offsets)
+    index = scratch.get("bin_index", shape, np.intp)
+    np.copyto(index, codes[:, :shape[1], :shape[2]])
+    index += offsets
+    counts = scratch.get("bin_counts", (count, features), np.intp)
+    counts.fill(0)
+    np.add.at(counts.reshape(-1), index.reshape(-1), 1)
+    hist = scratch.get("histograms", (count, features), np.float32)
+    np.copyto(hist, counts)
+    hist /= np.float32(height * width)
+    return hist
+
+
+class HistogramIndex:
+    """Feature-major view of the stored histograms, grouped by person, for fast search
+
+    A probe gathers only its non-zero bins, which in this layout are whole contiguous
+    rows of the matrix, and scores the full gallery a block of bins at a time. A model
+    bundle is stored in this layout already, so the index reads its memory map in
+    place; other histograms are copied into it once. With prune_people set,
+    per-person centroids are scored first and only the samples of the closest
+    people are searched.
+    """
+
+    def __init__(self, histograms, labels):
+        labels = np.asarray(labels)
+        histograms = np.asarray(histograms)
+        columns = histograms.T
+        if (columns.dtype == np.float32 and columns.flags.c_contiguous
+                and np.all(labels[:-1] <= labels[1:])):
+            self.labels = labels
+            self.columns = columns
+        else:
+            order = np.argsort(labels, kind="stable")
+            self.labels = labels[order]
+            self.columns = np.ascontiguousarray(histograms.astype(np.float32, copy=False)[order].T)
+        self.totals = self.columns.sum(axis=0, dtype=np.float64)
+
+        self.people, starts = np.unique(self.labels, return_index=True)
+        ends = list(starts[1:]) + [len(self.labels)]
+        self.slices = [slice(start, end) for start, end in zip(starts, ends)]
+        self._centroids = None
+
+    @property
+    def centroids(self):
+        """Per-person mean histograms (features x people), built the first time pruning is used"""
+        if self._centroids is None:
+            if self.slices:
+                centroids = [self.columns[:, part].mean(axis=1) for part in self.slices]
+                self._centroids = np.ascontiguousarray(np.stack(centroids, axis=1), dtype=np.float32)
+            else:
+                self._centroids = np.zeros((self.columns.shape[0], 0), dtype=np.float32)
+            self.centroid_totals = self._centroids.sum(axis=0, dtype=np.float64)
+        return self._centroids
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _distances(self, matrix, totals, nonzero, q, scratch, parts=(slice(None),)):
+        """OpenCV's HISTCMP_CHISQR_ALT distance from the query to the samples in parts
+
+        Only the query's non-zero bins (nonzero, with values q) are compared. Where the
+        query bin is 0 the term 2*(a-b)^2/(a+b) reduces to 2*a, and those add up to the
+        sample total minus the bins that were compared. The bins are gathered and scored
+        SEARCH_BLOCK rows at a time in scratch arrays, so those stay small whatever the
+        query; only the distances inside parts are meaningful.
+        """
+        width = matrix.shape[1]
+        compared_sums = scratch.get("compared_sums", (width,), np.float64)
+        term_sums = scratch.get("term_sums", (width,), np.float64)
+        compared_sums.fill(0)
+        term_sums.fill(0)
+        for start in range(0, len(nonzero), SEARCH_BLOCK):
+            rows = nonzero[start:start + SEARCH_BLOCK]
+            for part in parts:
+                gathered = self._gather(matrix, rows, part, scratch)
+                # Contiguous float64 copies, so no ufunc below needs a cast or broadcast buffer
+                a = scratch.get("compared", gathered.shape, np.float64)
+                b = scratch.get("denominators", a.shape, np.float64)
+                block_sums = scratch.get("block_sums", a.shape[1:], np.float64)
+                np.copyto(a, gathered)
+                np.copyto(b, q[start:start + len(rows), None])
+                np.add.reduce(a, axis=0, out=block_sums)
+                compared_sums[part] += block_sums
+                a -= b  # a - q
+                b *= 2
+                b += a  # a + q, never 0 since q is not
+                a *= a
+                a /= b
+                np.add.reduce(a, axis=0, out=block_sums)
+                term_sums[part] += block_sums
+        distances = scratch.get("distances", (width,), np.float64)
+        np.subtract(totals, compared_sums, out=distances)
+        distances += term_sums
+        distances *= 2.0
+        return distances
+
+    @staticmethod
+    def _gather(matrix, rows, part, scratch):
+        """matrix[rows, part] in a reused array; take() on a column slice would copy the slice"""
+        width = matrix.shape[1]
+        first, last, _ = part.indices(width)
+        gathered = scratch.get("gathered", (len(rows), last - first), matrix.dtype)
+        if last - first == width:
+            np.take(matrix, rows, axis=0, out=gathered, mode="clip")  # "raise" would buffer a copy
+            return gathered
+        # Flat positions row * width + column, built without broadcasting a ufunc operand
+        positions = scratch.get("positions", gathered.shape, np.intp)
+        columns = scratch.get("position_columns", gathered.shape, np.intp)
+        starts = scratch.get("position_rows", rows.shape, np.intp)
+        np.multiply(rows, width, out=starts)
+        np.copyto(positions, starts[:, None])
+        np.copyto(columns, scratch.constant("sample_ids", width, lambda: np.arange(width))[first:last])
+        positions += columns
+        np.take(matrix.reshape(-1), positions, out=gathered, mode="clip")
+        return gathered
+
+    def search(self, query, prune_people=None, scratch=None):
+        """Return (label, distance) of the closest stored histogram
+
+        With scratch (an LBPHScratch), the gathered bins and distances go into its
+        reused arrays instead of new ones.
+        """
+        scratch = scratch if scratch is not None else LBPHScratch()
+        nonzero = np.flatnonzero(query)
+        q = scratch.get("query_bins", nonzero.shape, np.float32)
+        np.take(query, nonzero, out=q, mode="clip")
+
+        if prune_people and len(self.people) > prune_people:
+            rough = self._distances(self.centroids, self.centroid_totals, nonzero, q, scratch)
+            parts = [self.slices[person] for person in np.argsort(rough)[:prune_people]]
+            distances = self._distances(self.columns, self.totals, nonzero, q, scratch, parts)
+            best_label, best_distance = -1, float("inf")
+            for part in parts:
+                index = int(np.argmin(distances[part]))
+                if distances[part][index] < best_distance:
+                    best_label, best_distance = int(self.labels[part][index]), float(distances[part][index])
+            return best_label, best_distance
+
+        distances = self._distances(self.columns, self.totals, nonzero, q, scratch)
+        index = int(np.argmin(distances))
+        return int(self.labels[index]), float(distances[index])
+
+
+class LBPHModel:
+    """LBPH recognizer over a stored histogram matrix, with the predict() of cv2's recognizer"""
+
+    def __init__(self, histograms, labels, radius=LBPH_RADIUS, neighbors=LBPH_NEIGHBORS,
+                 grid_x=LBPH_GRID_X, grid_y=LBPH_GRID_Y, threshold=float("inf"), prune_people=None):
+        self.histograms = histograms
+        self.labels = labels
+        self.radius = radius
+        self.neighbors = neighbors
+        self.grid_x = grid_x
+        self.grid_y = grid_y
+        self.threshold = threshold
+        self.prune_people = prune_people
+        self._index = None
+
+    @property
+    def index(self):
+        """Search index, built on first use so loading a bundle stays a plain mmap"""
+        if self._index is None:
+            self._index = HistogramIndex(self.histograms, self.labels)
+        return self._index
+
+    def histogram(self, face_img, scratch=None):
+        """LBPH feature row of one grayscale face crop (in scratch's reused arrays, if given)"""
+        codes = lbp_image(face_img, self.radius, self.neighbors, scratch)
+        return spatial_histogram(codes, self.neighbors, self.grid_x, self.grid_y, scratch)
+
+    def predict(self, face_img):
+        """Return (label, distance) of the closest stored histogram; label is -1 past threshold"""
+        if len(self.labels) == 0:
+            return -1, float("inf")
+        return self._accept(*self.index.search(self.histogram(face_img), self.prune_people))
+
+    def predict_batch(self, faces, scratch=None):
+        """predict() for an N x H x W stack of same-sized faces; LBP runs once for the stack
+
+        With scratch (an LBPHScratch kept by the caller), no arrays are allocated once
+        it has grown to the face count and gallery size.
+        """
+        if len(self.labels) == 0:
+            return [(-1, float("inf"))] * len(faces)
+        scratch = scratch if scratch is not None else LBPHScratch()
+        histograms = self.histogram(faces, scratch)
+        return [self._accept(*self.index.search(h, self.prune_people, scratch)) for h in histograms]
+
+    def _accept(self, label, distance):
+        if distance >= self.threshold:
+            return -1, distance
+        return label, distance
+
+
+def _synthetic_gallery(people, samples_per_person, size=100, seed=0):
+    """Blurred-noise "faces" with per-sample jitter, enough to exercise LBP and search"""
+    rng = np.random.default_rng(seed)
+    faces, labels = [], []
+    for person in range(people):
+        base = rng.integers(0, 256, (size, size)).astype(np.float32)
+        base = (base + np.roll(base, 1, 0) + np.roll(base, 1, 1) + np.roll(base, 2, 0)) / 4
+        for _ in range(samples_per_person):
+            noisy = base + rng.normal(0, 8, base.shape)
+            faces.append(np.clip(noisy, 0, 255).astype(np.uint8))
+            labels.append(person)
+    return faces, np.array(labels, dtype=np.int32)
+
+
+def benchmark(gallery_sizes=(40, 80, 160, 320, 640), samples_per_person=40, repeats=20,
+              prune_people=2):
+    """Predict latency against gallery size for cv2's LBPH and this module
+
+    Returns one dict per gallery size; times are milliseconds per predict.
+    """
+    import time
+
+    try:
+        import cv2
+        has_cv2 = hasattr(cv2, "face")
+    except ImportError:
+        has_cv2 = False
+
+    results = []
+    for size in gallery_sizes:
+        people = max(size // samples_per_person, 1)
+        faces, labels = _synthetic_gallery(people, samples_per_person)
+        model = LBPHModel(np.vstack([spatial_histogram(lbp_image(f)) for f in faces]), labels)
+        probes = faces[::max(len(faces) // repeats, 1)][:repeats]
+
+        def per_call_ms(predict):
+            predict(probes[0])  # build indexes outside the timing
+            start = time.perf_counter()
+            for probe in probes:
+                predict(probe)
+            return (time.perf_counter() - start) / len(probes) * 1000
+
+        row = {"samples": len(faces), "people": people, "cv2_ms": None}
+        if has_cv2:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.train(faces, labels)
+            row["cv2_ms"] = per_call_ms(recognizer.predict)
+        row["numpy_ms"] = per_call_ms(model.predict)
+        model.prune_people = prune_people
+        row["pruned_ms"] = per_call_ms(model.predict)
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark LBPH predict latency against gallery size")
+    parser.add_argument("--sizes", default="40,80,160,320,640", help="Comma-separated gallery sizes")
+    parser.add_argument("--prune", type=int, default=2, help="People searched after the centroid pass")
+    args = parser.parse_args()
+
+    print(f"{'samples':>8} {'people':>7} {'cv2 ms':>8} {'numpy ms':>9} {'pruned ms':>10}")
+    for row in benchmark(tuple(int(s) for s in args.sizes.split(",")), prune_people=args.prune):
+        cv2_ms = "-" if row["cv2_ms"] is None else f"{row['cv2_ms']:.2f}"
+        print(f"{row['samples']:>8} {row['people']:>7} {cv2_ms:>8} "
+              f"{row['numpy_ms']:>9.2f} {row['pruned_ms']:>10.2f}")
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Metrics for MagicMirror² Face Recognition
+Rolling per-stage latency windows and event counters, periodically written as a
+Prometheus text file (node_exporter textfile collector format), and an optional
+tracemalloc report of what the frame hot loop allocates
+"""
+
+import math
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+METRICS_FILE = "/tmp/magicmirror_face_metrics.prom"
+METRICS_INTERVAL = 10.0  # seconds between rewrites of the metrics file
+WINDOW_SIZE = 512  # recent samples per stage the percentiles are taken over
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "magicmirror_face"
+TRACE_DEPTH = 1  # stack frames kept per traced allocation
+TRACE_TOP = 10  # allocation sites listed in the report
+
+
+class LatencyWindow:
+    """Recent samples of one stage plus lifetime count and sum"""
+
+    def __init__(self, size=WINDOW_SIZE):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        # deque.append is atomic, so stages on different threads need no lock here
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantiles(self, quantiles=QUANTILES):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: None for q in quantiles}
+        # Nearest-rank percentile
+        return {q: ordered[max(math.ceil(q * len(ordered)) - 1, 0)] for q in quantiles}
+
+
+class Metrics:
+    """Per-stage latency windows and event counters shared by every stage"""
+
+    def __init__(self, window=WINDOW_SIZE):
+        self.window = window
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def observe(self, stage, seconds):
+        latency = self.stages.get(stage)
+        if latency is None:
+            with self.lock:
+                latency = self.stages.setdefault(stage, LatencyWindow(self.window))
+        latency.add(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, event, amount=1):
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def to_prometheus(self):
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Latency of each recognition stage",
+            f"# TYPE {PREFIX}_stage_seconds summary",
+        ]
+        for stage, latency in sorted(self.stages.items()):
+            for q, value in latency.quantiles().items():
+                if value is not None:
+                    lines.append(f'{PREFIX}_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{{stage="{stage}"}} {latency.total:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{{stage="{stage}"}} {latency.count}')
+
+        lines += [
+            f"# HELP {PREFIX}_events_total Recognition attempts, outcomes and retries",
+            f"# TYPE {PREFIX}_events_total counter",
+        ]
+        for event, count in sorted(self.counters.items()):
+            lines.append(f'{PREFIX}_events_total{{event="{event}"}} {count}')
+
+        lines += [
+            f"# HELP {PREFIX}_start_time_seconds When the recognizer started",
+            f"# TYPE {PREFIX}_start_time_seconds gauge",
+            f"{PREFIX}_start_time_seconds {self.started:.0f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short text with p50/p95/p99 in ms for each stage, then the counters"""
+        parts = []
+        for stage, latency in sorted(self.stages.items()):
+            q = latency.quantiles()
+            parts.append(f"{stage} p50/p95/p99 " + "/".join(
+                "-" if q[k] is None else f"{q[k] * 1000:.1f}" for k in QUANTILES) + " ms")
+        counters = ", ".join(f"{event} {count}" for event, count in sorted(self.counters.items()))
+        return "; ".join(parts) + (f"; {counters}" if counters else "")
+
+
+class MetricsWriter:
+    """Rewrites the Prometheus text file every interval seconds on a background thread"""
+
+    def __init__(self, metrics, path=METRICS_FILE, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._write_loop, name="metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the thread and write the final numbers"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        self.write()
+
+    def write(self):
+        try:
+            temp_file = self.path + ".tmp"
+            with open(temp_file, "w") as f:
+                f.write(self.metrics.to_prometheus())
+            os.replace(temp_file, self.path)
+        except Exception as e:
+            print(f"Error writing metrics file: {e}")
+
+    def _write_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write()
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class AllocationTracker:
+    """tracemalloc view of the frame hot loop: bytes allocated per frame, growth and RSS
+
+    frame() wraps the handling of one frame (or one stage of it, by name) and records
+    how far traced memory peaked above what was live when it started (every thread
+    counts, so capture does too) and how much of that was still live at the end.
+    report() adds the RSS when tracing started and now, and the source lines whose
+    live memory grew the most.
+    """
+
+    def __init__(self, window=WINDOW_SIZE, depth=TRACE_DEPTH):
+        self.window = window
+        self.depth = depth
+        self.allocated = {}  # stage -> window of bytes (not seconds; same rolling window)
+        self.retained = {}
+        self.rss_start = None
+        self.baseline = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        tracemalloc.start(self.depth)
+        self.rss_start = rss_bytes()
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        tracemalloc.stop()
+
+    @contextmanager
+    def frame(self, stage="frame"):
+        if not tracemalloc.is_tracing():
+            yield
+            return
+        # reset_peak() is process-wide, so frames handled on two threads must not overlap
+        with self.lock:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                if stage not in self.allocated:
+                    self.allocated[stage] = LatencyWindow(self.window)
+                    self.retained[stage] = LatencyWindow(self.window)
+                self.allocated[stage].add(peak - before)
+                self.retained[stage].add(current - before)
+
+    def summary(self):
+        """Per-stage numbers in KB and RSS in MB, as a dict (for the benchmark's JSON)"""
+        stages = {}
+        for stage, allocated in self.allocated.items():
+            q = allocated.quantiles()
+            retained = self.retained[stage]
+            stages[stage] = {
+                "frames": allocated.count,
+                "allocated_p50_kb": q[0.5] / 1024,
+                "allocated_p95_kb": q[0.95] / 1024,
+                "retained_mean_kb": retained.total / retained.count / 1024,
+            }
+        rss_now = rss_bytes()
+        return {
+            "stages": stages,
+            "rss_start_mb": self.rss_start / 1e6 if self.rss_start is not None else None,
+            "rss_now_mb": rss_now / 1e6 if rss_now is not None else None,
+        }
+
+    def report(self, top=TRACE_TOP):
+        summary = self.summary()
+        lines = ["🧮 Allocations per frame (peak above what was live before, and still live after):"]
+        for stage, row in summary["stages"].items():
+            lines.append(f"   {stage:<10} p50 {row['allocated_p50_kb']:8.1f} KB  p95 {row['allocated_p95_kb']:8.1f} KB  "
+                         f"retained {row['retained_mean_kb']:6.2f} KB  ({row['frames']} frames)")
+        if summary["rss_start_mb"] is not None:
+            lines.append(f"   RSS {summary['rss_start_mb']:.1f} MB at start, {summary['rss_now_mb']:.1f} MB now")
+        if tracemalloc.is_tracing() and self.baseline is not None:
+            growth = tracemalloc.take_snapshot().compare_to(self.baseline, "lineno")
+            lines.append("   Largest growth since tracing started:")
+            for stat in growth[:top]:
+                lines.append(f"   {stat.size_diff / 1024:+9.1f} KB {stat.count_diff:+6d} blocks  "
+                             f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}")
+        return "\n".join(lines)
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Model Bundle for MagicMirror² Face Recognition
+One versioned binary file holding the LBPH histograms as a contiguous feature-major
+float32 array, their labels, the label names and training metadata, loaded through mmap
+"""
+
+import json
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from lbph import LBPHModel
+
+MODEL_BUNDLE = "face_model.bin"
+LEGACY_TRAINER_PATHS = ["trainer.yml", "python_code/trainer.yml"]
+LEGACY_LABEL_FILE = "label_names.txt"
+IMAGE_BASE = "Images"
+
+BUNDLE_MAGIC = b"MMFACE\0\0"
+BUNDLE_VERSION = 2  # one feature per row, samples grouped by label
+BUNDLE_ALIGN = 64  # bytes; the arrays start on cache-line boundaries
+PREAMBLE = struct.Struct("<8sII")  # magic, version, header length
+MODEL_POLL_INTERVAL = 2.0  # seconds between checks for a retrained bundle
+
+
+def _aligned(offset):
+    return (offset + BUNDLE_ALIGN - 1) // BUNDLE_ALIGN * BUNDLE_ALIGN
+
+
+class ModelBundle:
+    """LBPH histograms, labels and label names of one trained model
+
+    histograms is samples x features. A loaded bundle's is the transpose of the
+    feature-major memory map, which HistogramIndex searches without copying it.
+    """
+
+    def __init__(self, histograms, labels, label_names, params=None, metadata=None, path=None):
+        self.histograms = histograms
+        self.labels = labels
+        self.label_names = list(label_names)
+        self.params = dict(params or {})
+        self.metadata = dict(metadata or {})
+        self.path = path
+
+    @classmethod
+    def from_recognizer(cls, recognizer, label_names, metadata=None):
+        """Take the histograms and parameters out of a trained cv2 LBPH recognizer"""
+        histograms = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+        params = {
+            "radius": recognizer.getRadius(),
+            "neighbors": recognizer.getNeighbors(),
+            "grid_x": recognizer.getGridX(),
+            "grid_y": recognizer.getGridY(),
+            "threshold": recognizer.getThreshold(),
+        }
+        labels = recognizer.getLabels().ravel()
+        return cls(histograms, labels, label_names, params, metadata)
+
+    @property
+    def label_map(self):
+        """{id: name} of the people in the model; label_names keeps None for removed ids"""
+        return {i: name for i, name in enumerate(self.label_names) if name is not None}
+
+    def label_of(self, name):
+        """Label id of name, or None if they are not in the model"""
+        return self.label_names.index(name) if name in self.label_names else None
+
+    def add_person(self, name, histograms, replace=False):
+        """Append samples for name; returns its label id
+
+        A known name keeps its id (replace=True drops their old samples first). A new
+        name gets the next unused id, and ids of removed people are never handed out
+        again, so existing labels stay stable.
+        """
+        label = self.label_of(name)
+        if label is None:
+            label = len(self.label_names)
+            self.label_names.append(name)
+        existing = np.asarray(self.histograms)
+        labels = self.labels
+        if replace:
+            keep = labels != label
+            existing, labels = existing[keep], labels[keep]
+        histograms = np.asarray(histograms, dtype="<f4").reshape(len(histograms), -1)
+        self.histograms = np.concatenate([existing, histograms])
+        self.labels = np.concatenate([labels, np.full(len(histograms), label, dtype="<i4")])
+        self._count_samples()
+        return label
+
+    def remove_person(self, name):
+        """Drop every sample of name; returns how many were removed"""
+        label = self.label_of(name)
+        if label is None:
+            return 0
+        keep = self.labels != label
+        removed = int((~keep).sum())
+        self.histograms = np.asarray(self.histograms)[keep]
+        self.labels = self.labels[keep]
+        self.label_names[label] = None  # keep the slot so later ids do not shift
+        self._count_samples()
+        return removed
+
+    def _count_samples(self):
+        self.metadata["samples_per_person"] = {
+            name: int((self.labels == i).sum())
+            for i, name in enumerate(self.label_names) if name is not None
+        }
+        self.metadata["updated_at"] = datetime.now().isoformat()
+
+    def recognizer(self):
+        """LBPHModel that predicts straight from the (memory-mapped) histograms"""
+        return LBPHModel(self.histograms, self.labels, **self.params)
+
+    def validate(self):
+        """Raise ValueError unless histograms, labels and label names agree"""
+        if self.histograms.ndim != 2 or len(self.histograms) != len(self.labels):
+            raise ValueError(f"{len(self.labels)} labels for histograms of shape {self.histograms.shape}")
+        if len(self.labels) and (self.labels.min() < 0 or self.labels.max() >= len(self.label_names)):
+            raise ValueError(f"Label ids {self.labels.min()}..{self.labels.max()} do not match "
+                             f"{len(self.label_names)} label names")
+        removed = [i for i, name in enumerate(self.label_names) if name is None]
+        if removed and np.isin(self.labels, removed).any():
+            raise ValueError("Samples left for a removed person")
+
+    def save(self, path=MODEL_BUNDLE):
+        """Write the bundle to a temporary file and rename it over path
+
+        Samples are grouped by label and written feature-major, the layout the
+        search index uses, so loading it needs no copy.
+        """
+        self.labels = np.asarray(self.labels)
+        self.validate()
+        order = np.argsort(self.labels, kind="stable")
+        labels = np.ascontiguousarray(self.labels[order], dtype="<i4")
+        columns = np.ascontiguousarray(np.asarray(self.histograms, dtype="<f4")[order].T)
+        histograms = columns.T
+        self.histograms, self.labels = histograms, labels
+
+        header = {
+            "samples": int(histograms.shape[0]),
+            "features": int(histograms.shape[1]),
+            "label_names": self.label_names,
+            "params": self.params,
+            "metadata": self.metadata,
+        }
+        # Offsets depend on the header length, so size the header with placeholders first
+        header["histograms_offset"] = header["labels_offset"] = 0
+        header_len = len(json.dumps(header).encode("utf-8")) + 32
+        histograms_offset = _aligned(PREAMBLE.size + header_len)
+        header["histograms_offset"] = histograms_offset
+        header["labels_offset"] = _aligned(histograms_offset + columns.nbytes)
+        header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION, header_len))
+            f.write(header_bytes)
+            f.seek(histograms_offset)
+            f.write(columns.tobytes())
+            f.seek(header["labels_offset"])
+            f.write(labels.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path=MODEL_BUNDLE):
+        """Map a bundle from disk; the histograms are only paged in when used"""
+        with open(path, "rb") as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) < PREAMBLE.size:
+                raise ValueError(f"{path} is too short to be a model bundle")
+            magic, version, header_len = PREAMBLE.unpack(preamble)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"{path} is not a model bundle")
+            if version != BUNDLE_VERSION:
+                raise ValueError(f"{path} is bundle version {version}, expected {BUNDLE_VERSION}")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        samples, features = header["samples"], header["features"]
+        if samples == 0:
+            histograms = np.zeros((0, features), dtype="<f4")
+            labels = np.zeros(0, dtype="<i4")
+        else:
+            histograms = np.memmap(path, dtype="<f4", mode="r",
+                                   offset=header["histograms_offset"], shape=(features, samples)).T
+            labels = np.array(np.memmap(path, dtype="<i4", mode="r",
+                                        offset=header["labels_offset"], shape=(samples,)))
+        bundle = cls(histograms, labels, header["label_names"], header["params"],
+                     header["metadata"], path)
+        bundle.validate()
+        return bundle
+
+
+def keep_label_ids(labels, label_names, previous_names):
+    """Relabel a training set so everyone keeps their id from previous_names
+
+    A full retrain numbers people in name order; seeding from the current bundle
+    keeps ids stable across retrains as they are across add/remove. People who are
+    gone keep their slot as None and new people get the next unused ids.
+    Returns (labels, label_names).
+    """
+    names = [name if name in label_names else None for name in previous_names]
+    names += [name for name in label_names if name not in names]
+    new_id = [names.index(name) for name in label_names]
+    return [new_id[label] for label in labels], names
+
+
+def read_label_file(path=LEGACY_LABEL_FILE):
+    """Label names from the "id:name" lines train_faces.py used to write"""
+    names = {}
+    with open(path, "r") as f:
+        for line in f:
+            label, sep, name = line.strip().partition(":")
+            if sep and label.isdigit():
+                names[int(label)] = name
+    return [names.get(i, "Unknown") for i in range(max(names) + 1)] if names else []
+
+
+def load_legacy_model(trainer_paths=LEGACY_TRAINER_PATHS):
+    """Load an old trainer.yml through cv2; returns (recognizer, label_names, path)"""
+    import cv2
+
+    for trainer_path in trainer_paths:
+        if not os.path.exists(trainer_path):
+            continue
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        try:
+            recognizer.read(trainer_path)
+        except Exception as e:
+            print(f"⚠️  Could not load trainer from {trainer_path}: {e}")
+            continue
+
+        # Prefer the mapping written at training time over directory order
+        label_file = os.path.join(os.path.dirname(trainer_path), LEGACY_LABEL_FILE)
+        if os.path.exists(label_file):
+            label_names = read_label_file(label_file)
+        elif os.path.exists(IMAGE_BASE):
+            label_names = os.listdir(IMAGE_BASE)
+        else:
+            label_names = []
+        # Predict through the same NumPy path as a bundle, so callers see one model type
+        model = ModelBundle.from_recognizer(recognizer, label_names).recognizer()
+        return model, label_names, trainer_path
+    return None
+
+
+def load_model(bundle_path=MODEL_BUNDLE, trainer_paths=LEGACY_TRAINER_PATHS):
+    """Load the model bundle, or an old trainer.yml if no bundle exists yet
+
+    Returns (recognizer, label_names, path); raises if neither can be loaded.
+    """
+    if os.path.exists(bundle_path):
+        start = time.monotonic()
+        bundle = ModelBundle.load(bundle_path)
+        print(f"✅ Loaded model bundle from: {bundle_path} "
+              f"({len(bundle.labels)} samples in {(time.monotonic() - start) * 1000:.1f} ms)")
+        return bundle.recognizer(), bundle.label_names, bundle_path
+
+    legacy = load_legacy_model(trainer_paths)
+    if legacy is None:
+        raise Exception(f"Could not load {bundle_path} or trainer.yml from any location")
+    print(f"✅ Loaded trainer from: {legacy[2]} (legacy YAML; retrain to create {bundle_path})")
+    return legacy
+
+
+class LoadedModel:
+    """A recognizer with its label names, replaced as one object when the model is reloaded"""
+
+    def __init__(self, recognizer, label_names, path):
+        self.recognizer = recognizer
+        self.label_names = list(label_names)
+        self.label_map = {i: name for i, name in enumerate(self.label_names) if name is not None}
+        self.path = path
+
+
+def file_stamp(path):
+    """Identity of the file at path; changes when a new bundle is renamed over it"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class ModelWatcher:
+    """Loads a changed model bundle on a background thread, ready to be swapped in
+
+    The bundle is checked every `interval` seconds, or straight away after check_now()
+    (wired to SIGHUP). A fully loaded and prepared LoadedModel is handed over through
+    take(); nothing half-loaded is ever visible to the caller.
+    """
+
+    def __init__(self, path=MODEL_BUNDLE, interval=MODEL_POLL_INTERVAL, prepare=None):
+        self.path = path
+        self.interval = interval
+        self.prepare = prepare
+        self.stamp = file_stamp(path)
+        self.pending = None
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reloads = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._watch_loop, name="model-watcher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def check_now(self):
+        """Look for a new bundle without waiting for the next poll (safe from a signal handler)"""
+        self.wake.set()
+
+    def take(self):
+        """Return the newly loaded model once, or None if there is nothing new"""
+        with self.lock:
+            model, self.pending = self.pending, None
+        return model
+
+    def _watch_loop(self):
+        while not self.stop_event.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if self.stop_event.is_set():
+                break
+            stamp = file_stamp(self.path)
+            if stamp is None or stamp == self.stamp:
+                continue
+            # Remember the stamp even on failure so a broken file is not retried every poll
+            self.stamp = stamp
+            start = time.monotonic()
+            try:
+                bundle = ModelBundle.load(self.path)
+                model = LoadedModel(bundle.recognizer(), bundle.label_names, self.path)
+                if self.prepare is not None:
+                    self.prepare(model)
+            except Exception as e:
+                print(f"⚠️  Could not reload {self.path}: {e}")
+                continue
+            with self.lock:
+                self.pending = model
+            self.reloads += 1
+            print(f"🔄 Loaded new model from {self.path} ({len(bundle.labels)} samples in "
+                  f"{(time.monotonic() - start) * 1000:.1f} ms), swapping in before the next attempt")
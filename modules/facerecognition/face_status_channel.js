@@ -0,0 +1,212 @@
+/*
+ * Shared face status channel.
+ *
+ * Keeps a single connection to the face recognition daemon's Unix socket and
+ * fans every pushed status out to all subscribed node helpers. While the
+ * socket is unavailable the status file is watched instead, re-reading it
+ * only when its mtime changes.
+ */
+
+const fs = require("fs");
+const net = require("net");
+const Log = require("logger");
+
+const DEFAULT_SOCKET_PATH = "/tmp/magicmirror_face_status.sock";
+const DEFAULT_STATUS_FILE = "/tmp/magicmirror_face_status.json";
+const RECONNECT_DELAY = 2000;
+const FALLBACK_INTERVAL = 1000;
+const DEFAULT_STATUS = { distance: 999, person: null, active: false, status: "waiting" };
+
+const subscribers = new Set();
+let socketPath = null;
+let statusFile = null;
+let client = null;
+let connected = false;
+let buffer = "";
+let reconnectTimer = null;
+let fallbackTimer = null;
+let lastMtime = 0;
+let lastSeq = null;
+let lastStatus = null;
+
+/**
+ * Deliver a status to every subscriber, skipping repeats of the same sequence number.
+ * @param {object} status the decoded status message
+ */
+function publish (status) {
+	if (status.seq !== undefined && status.seq === lastSeq) {
+		return;
+	}
+	lastSeq = status.seq;
+	lastStatus = status;
+	for (const callback of subscribers) {
+		try {
+			callback(status);
+		} catch (error) {
+			Log.error(`Face status: subscriber failed: ${error.message}`);
+		}
+	}
+}
+
+/**
+ * Read the status file if it changed since the last read.
+ */
+function readStatusFile () {
+	let stat;
+	try {
+		stat = fs.statSync(statusFile);
+	} catch {
+		return;
+	}
+	if (stat.mtimeMs === lastMtime) {
+		return;
+	}
+	lastMtime = stat.mtimeMs;
+
+	try {
+		publish(JSON.parse(fs.readFileSync(statusFile, "utf8")));
+	} catch (error) {
+		Log.error(`Face status: error reading status file: ${error.message}`);
+	}
+}
+
+/**
+ * Watch the status file while the socket is down.
+ */
+function startFallback () {
+	if (fallbackTimer) {
+		return;
+	}
+	readStatusFile();
+	fallbackTimer = setInterval(readStatusFile, FALLBACK_INTERVAL);
+}
+
+/**
+ * Stop watching the status file.
+ */
+function stopFallback () {
+	if (fallbackTimer) {
+		clearInterval(fallbackTimer);
+		fallbackTimer = null;
+	}
+}
+
+/**
+ * Try the socket again after a short delay.
+ */
+function scheduleReconnect () {
+	if (reconnectTimer || subscribers.size === 0) {
+		return;
+	}
+	reconnectTimer = setTimeout(() => {
+		reconnectTimer = null;
+		connect();
+	}, RECONNECT_DELAY);
+}
+
+/**
+ * Connect to the daemon's socket and decode newline-delimited JSON messages.
+ */
+function connect () {
+	buffer = "";
+	client = net.createConnection(socketPath);
+	client.setEncoding("utf8");
+
+	client.on("connect", () => {
+		connected = true;
+		lastSeq = null; // the daemon may have restarted and reset its counter
+		stopFallback();
+		Log.log(`Face status: connected to ${socketPath}`);
+	});
+
+	client.on("data", (chunk) => {
+		buffer += chunk;
+		let newline = buffer.indexOf("\n");
+		while (newline >= 0) {
+			const line = buffer.slice(0, newline);
+			buffer = buffer.slice(newline + 1);
+			if (line) {
+				try {
+					publish(JSON.parse(line));
+				} catch (error) {
+					Log.error(`Face status: bad message: ${error.message}`);
+				}
+			}
+			newline = buffer.indexOf("\n");
+		}
+	});
+
+	// "close" always follows "error", so reconnecting is handled there
+	client.on("error", () => {});
+
+	client.on("close", () => {
+		client = null;
+		if (subscribers.size === 0) {
+			return;
+		}
+		if (connected) {
+			Log.log("Face status: socket closed, falling back to status file");
+		}
+		connected = false;
+		startFallback();
+		scheduleReconnect();
+	});
+}
+
+/**
+ * Latest known status, or a "waiting" status if nothing was received yet.
+ * @returns {object} the status
+ */
+function current () {
+	return lastStatus || { ...DEFAULT_STATUS, timestamp: Date.now() };
+}
+
+/**
+ * Stop delivering statuses to a callback; closes the channel when nobody is left.
+ * @param {Function} callback the callback passed to subscribe
+ */
+function unsubscribe (callback) {
+	subscribers.delete(callback);
+	if (subscribers.size > 0) {
+		return;
+	}
+	stopFallback();
+	if (reconnectTimer) {
+		clearTimeout(reconnectTimer);
+		reconnectTimer = null;
+	}
+	if (client) {
+		client.destroy();
+	}
+}
+
+/**
+ * Receive every face status pushed by the daemon. The callback is called
+ * straight away with the latest known status.
+ * @param {Function} callback called with each status object
+ * @param {object} options socketPath and statusFile; only the first subscriber's options are used
+ * @returns {Function} call to unsubscribe
+ */
+function subscribe (callback, options = {}) {
+	if (!socketPath) {
+		socketPath = options.socketPath || DEFAULT_SOCKET_PATH;
+		statusFile = options.statusFile || DEFAULT_STATUS_FILE;
+	}
+	subscribers.add(callback);
+
+	if (!client && !reconnectTimer) {
+		connect();
+	}
+
+	const hadStatus = lastStatus !== null;
+	if (!hadStatus) {
+		readStatusFile();
+	}
+	if (hadStatus || lastStatus === null) {
+		callback(current());
+	}
+
+	return () => unsubscribe(callback);
+}
+
+module.exports = { subscribe, current };
@@ -3,7 +3,7 @@
 Module.register("facerecognition", {
 	// Default module config.
 	defaults: {
-		updateInterval: 1000, // Check for updates every 1 second
+		updateInterval: 1000, // Poll interval when using the Flask API
 		proximityThreshold: 20, // 20 cm threshold
 		timeoutDelay: 10000, // 10 seconds delay before shutdown
 		greetingDuration: 5000, // Show greeting for 5 seconds
@@ -11,6 +11,7 @@ Module.register("facerecognition", {
 		apiEndpoint: "http://localhost:5000", // If using Flask API
 		useAPI: false, // Set to true if using Flask API instead of file communication
 		statusFile: "/tmp/magicmirror_face_status.json", // Status file for communication
+		statusSocket: "/tmp/magicmirror_face_status.sock", // Pushed status from the Python script
 		greetingStyle: "large bright", // CSS classes for greeting display
 		showDistance: true, // Show current distance
 		showStatus: true, // Show recognition status
@@ -51,9 +52,14 @@ Module.register("facerecognition", {
 	// Start checking for status updates from Python script
 	startStatusChecking: function() {
 		const self = this;
-		this.statusCheckTimer = setInterval(function() {
-			self.checkStatus();
-		}, this.config.updateInterval);
+		this.checkStatus();
+
+		// Status from the node helper is pushed; only the API has to be polled
+		if (this.config.useAPI) {
+			this.statusCheckTimer = setInterval(function() {
+				self.checkStatus();
+			}, this.config.updateInterval);
+		}
 	},
 
 	// Check status from Python script
@@ -78,12 +84,11 @@ Module.register("facerecognition", {
 			});
 	},
 
-	// Check status via file communication
+	// Subscribe to status pushed by the node helper
 	checkStatusViaFile: function() {
-		const self = this;
-		// This would require a node_helper to read files
 		this.sendSocketNotification("CHECK_FACE_STATUS", {
-			statusFile: this.config.statusFile
+			statusFile: this.config.statusFile,
+			statusSocket: this.config.statusSocket
 		});
 	},
 
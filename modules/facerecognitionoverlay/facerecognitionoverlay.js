@@ -3,8 +3,8 @@
 Module.register("facerecognitionoverlay", {
 	// Default module config.
 	defaults: {
-		updateInterval: 500, // Check for updates every 500ms
 		statusFile: "/tmp/magicmirror_face_status.json",
+		statusSocket: "/tmp/magicmirror_face_status.sock", // Pushed status from the Python script
 		showFaceIcon: false,
 		showRecognitionStatus: true,
 		faceIconSize: "large", // small, medium, large
@@ -33,18 +33,16 @@ Module.register("facerecognitionoverlay", {
 		this.startStatusChecking();
 	},
 
-	// Start checking for status updates
+	// Subscribe to pushed status updates
 	startStatusChecking: function() {
-		const self = this;
-		this.statusCheckTimer = setInterval(function() {
-			self.checkStatus();
-		}, this.config.updateInterval);
+		this.checkStatus();
 	},
 
 	// Check status from Python script
 	checkStatus: function() {
 		this.sendSocketNotification("CHECK_FACE_STATUS", {
-			statusFile: this.config.statusFile
+			statusFile: this.config.statusFile,
+			statusSocket: this.config.statusSocket
 		});
 	},
 
@@ -1,6 +1,6 @@
 const NodeHelper = require("node_helper");
 const Log = require("logger");
-const fs = require("fs");
+const FaceStatusChannel = require("../facerecognition/face_status_channel");
 
 module.exports = NodeHelper.create({
 	// Override socketNotificationReceived method.
@@ -14,27 +14,20 @@ module.exports = NodeHelper.create({
 		}
 	},
 
-	// Check face recognition status
+	// Subscribe once to the shared face status channel; later requests replay the latest status
 	checkFaceStatus: function(payload) {
-		const self = this;
-		const statusFile = payload.statusFile;
-		
-		try {
-			if (fs.existsSync(statusFile)) {
-				const data = JSON.parse(fs.readFileSync(statusFile, 'utf8'));
-				Log.log(`Personal API: Face status - Person: ${data.person}, Active: ${data.active}`);
-				self.sendSocketNotification("FACE_STATUS_UPDATE", data);
-			} else {
-				Log.log("Personal API: Face status file not found");
-				self.sendSocketNotification("FACE_STATUS_UPDATE", {
-					person: null,
-					active: false,
-					status: "waiting"
-				});
-			}
-		} catch (error) {
-			Log.error(`Personal API: Error reading face status: ${error.message}`);
+		if (this.unsubscribe) {
+			this.sendSocketNotification("FACE_STATUS_UPDATE", FaceStatusChannel.current());
+			return;
 		}
+
+		this.unsubscribe = FaceStatusChannel.subscribe((data) => {
+			Log.log(`Personal API: Face status - Person: ${data.person}, Active: ${data.active}`);
+			this.sendSocketNotification("FACE_STATUS_UPDATE", data);
+		}, {
+			socketPath: payload.statusSocket,
+			statusFile: payload.statusFile
+		});
 	},
 
 	// Fetch data from personal API
@@ -58,5 +51,13 @@ module.exports = NodeHelper.create({
 				Log.error(`Personal API: Error fetching data: ${error.message}`);
 				self.sendSocketNotification("PERSONAL_API_ERROR", error.message);
 			});
+	},
+
+	// Clean up on stop
+	stop: function() {
+		if (this.unsubscribe) {
+			this.unsubscribe();
+			this.unsubscribe = null;
+		}
 	}
 });
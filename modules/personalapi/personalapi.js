@@ -7,6 +7,7 @@ Module.register("personalapi", {
 		updateInterval: 5 * 60 * 1000, // 5 minutes
 		animationSpeed: 2000,
 		statusFile: "/tmp/magicmirror_face_status.json",
+		statusSocket: "/tmp/magicmirror_face_status.sock",
 		maxEvents: 5,
 		maxLists: 3,
 		showCompleted: false,
@@ -38,18 +39,16 @@ Module.register("personalapi", {
 		this.scheduleUpdate();
 	},
 
-	// Start checking for face recognition status
+	// Subscribe to pushed face recognition status via node helper
 	startStatusCheck: function() {
-		const self = this;
-		this.statusCheckTimer = setInterval(function() {
-			self.checkFaceStatus();
-		}, 1000); // Check every second
+		this.checkFaceStatus();
 	},
 
 	// Check face recognition status via node helper
 	checkFaceStatus: function() {
 		this.sendSocketNotification("CHECK_FACE_STATUS", {
-			statusFile: this.config.statusFile
+			statusFile: this.config.statusFile,
+			statusSocket: this.config.statusSocket
 		});
 	},
 
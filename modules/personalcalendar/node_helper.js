@@ -1,6 +1,7 @@
 const NodeHelper = require("node_helper");
 const Log = require("logger");
 const fs = require("fs");
+const FaceStatusChannel = require("../facerecognition/face_status_channel");
 
 module.exports = NodeHelper.create({
 	// Override socketNotificationReceived method.
@@ -14,27 +15,20 @@ module.exports = NodeHelper.create({
 		}
 	},
 
-	// Check face recognition status
+	// Subscribe once to the shared face status channel; later requests replay the latest status
 	checkFaceStatus: function(payload) {
-		const self = this;
-		const statusFile = payload.statusFile;
-		
-		try {
-			if (fs.existsSync(statusFile)) {
-				const data = JSON.parse(fs.readFileSync(statusFile, 'utf8'));
-				Log.log(`Personal Calendar: Face status - Person: ${data.person}, Active: ${data.active}`);
-				self.sendSocketNotification("FACE_STATUS_UPDATE", data);
-			} else {
-				Log.log("Personal Calendar: Face status file not found");
-				self.sendSocketNotification("FACE_STATUS_UPDATE", {
-					person: null,
-					active: false,
-					status: "waiting"
-				});
-			}
-		} catch (error) {
-			Log.error(`Personal Calendar: Error reading face status: ${error.message}`);
+		if (this.unsubscribe) {
+			this.sendSocketNotification("FACE_STATUS_UPDATE", FaceStatusChannel.current());
+			return;
 		}
+
+		this.unsubscribe = FaceStatusChannel.subscribe((data) => {
+			Log.log(`Personal Calendar: Face status - Person: ${data.person}, Active: ${data.active}`);
+			this.sendSocketNotification("FACE_STATUS_UPDATE", data);
+		}, {
+			socketPath: payload.statusSocket,
+			statusFile: payload.statusFile
+		});
 	},
 
 	// Load user profiles
@@ -55,5 +49,13 @@ module.exports = NodeHelper.create({
 			Log.error(`Personal Calendar: Error loading user profiles: ${error.message}`);
 			self.sendSocketNotification("USER_PROFILES_LOADED", { users: {}, default: {} });
 		}
+	},
+
+	// Clean up on stop
+	stop: function() {
+		if (this.unsubscribe) {
+			this.unsubscribe();
+			this.unsubscribe = null;
+		}
 	}
-});
\ No newline at end of file
+});
@@ -1,8 +1,8 @@
 Module.register("personalcalendar", {
 	// Default module config.
 	defaults: {
-		updateInterval: 1000, // Check for updates every 1 second
 		statusFile: "/tmp/magicmirror_face_status.json",
+		statusSocket: "/tmp/magicmirror_face_status.sock",
 		profilesFile: "user_profiles.json",
 		animationSpeed: 2000,
 		maximumEntries: 5,
@@ -40,18 +40,16 @@ Module.register("personalcalendar", {
 		});
 	},
 
-	// Start checking for face recognition status
+	// Subscribe to pushed face recognition status via node helper
 	startStatusCheck: function() {
-		const self = this;
-		this.statusCheckTimer = setInterval(function() {
-			self.checkFaceStatus();
-		}, this.config.updateInterval);
+		this.checkFaceStatus();
 	},
 
 	// Check face recognition status via node helper
 	checkFaceStatus: function() {
 		this.sendSocketNotification("CHECK_FACE_STATUS", {
-			statusFile: this.config.statusFile
+			statusFile: this.config.statusFile,
+			statusSocket: this.config.statusSocket
 		});
 	},
 
@@ -1,18 +1,18 @@
-import RPi.GPIO as GPIO
 import time
 import cv2
 from picamera2 import Picamera2
 import os
+import sys
 import numpy as np
 
-# Ultrasonic pins
-TRIG = 23  # GPIO pin for TRIG
-ECHO = 24  # GPIO pin for ECHO
+# The shared modules live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from face_pipeline import subject_order
+from ultrasonic import GpiodBackend, UltrasonicRanger
 
-# Setup GPIO
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(TRIG, GPIO.OUT)
-GPIO.setup(ECHO, GPIO.IN)
+# Ultrasonic sensor, timed from kernel edge timestamps and sampled on its own thread
+ranger = UltrasonicRanger(GpiodBackend())
+ranger.start()
 
 # Load Haarcascade and trained recognizer
 cascade_path = "/home/andii/haarcascades/haarcascade_frontalface_default.xml"
@@ -26,22 +26,8 @@ label_names = os.listdir(image_base)
 label_map = {i: name for i, name in enumerate(label_names)}
 
 def get_distance():
-    GPIO.output(TRIG, False)
-    time.sleep(0.1)
-
-    GPIO.output(TRIG, True)
-    time.sleep(0.00001)
-    GPIO.output(TRIG, False)
-
-    while GPIO.input(ECHO) == 0:
-        pulse_start = time.time()
-    while GPIO.input(ECHO) == 1:
-        pulse_end = time.time()
-
-    pulse_duration = pulse_end - pulse_start
-    distance = pulse_duration * 17150
-    distance = round(distance, 2)
-    return distance
+    """Median of the latest readings; FAR_DISTANCE when the echo was missed"""
+    return ranger.distance()
 
 try:
     while True:
@@ -58,16 +44,14 @@ try:
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             faces = face_cascade.detectMultiScale(gray, 1.3, 5)
 
-            recognized = False
-            for (x, y, w, h) in faces:
+            if len(faces) > 0:
+                # The largest, most central face is the person at the sensor
+                (x, y, w, h) = faces[subject_order(faces, gray.shape)[0]]
                 face_img = gray[y:y+h, x:x+w]
                 label, confidence = recognizer.predict(face_img)
                 name = label_map.get(label, "Unknown")
                 print(f"[INFO] Recognized: {name} (Confidence: {confidence:.2f})")
-                recognized = True
-                break
-
-            if not recognized:
+            else:
                 print("[INFO] No recognized face detected!")
 
             picam2.close()
@@ -77,4 +61,4 @@ try:
 
 except KeyboardInterrupt:
     print("[INFO] Exiting...")
-    GPIO.cleanup()
+    ranger.close()
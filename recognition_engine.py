@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Recognition Engine for MagicMirror² Face Recognition
+Runs frame capture, recognition and status publishing as separate stages so the
+control loop keeps a steady sensor cadence however slow recognition is; detection and
+recognition can run in worker processes off the main interpreter's GIL
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from camera_manager import FramePool
+from face_pipeline import BurstVote, BURST_FRAMES
+from recognition_worker import RecognitionWorkerPool
+
+# Stage settings
+FRAME_QUEUE_SIZE = 2  # frames waiting for recognition; older ones are dropped
+STATUS_QUEUE_SIZE = 1  # only the newest status matters
+CAPTURE_RETRY_DELAY = 1.0  # seconds to back off after a camera error
+STAGE_POLL_INTERVAL = 0.1  # seconds a stage waits before re-checking for shutdown
+
+
+class DropOldestQueue:
+    """Bounded queue that drops its oldest item instead of blocking the producer
+
+    on_drop, if given, is called with every item that is dropped or cleared.
+    """
+
+    def __init__(self, maxsize, on_drop=None):
+        self.items = deque()
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.high_water = 0
+
+    def put(self, item):
+        with self.condition:
+            if len(self.items) >= self.maxsize:
+                dropped = self.items.popleft()
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop(dropped)
+            self.items.append(item)
+            self.high_water = max(self.high_water, len(self.items))
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout"""
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()
+
+    def clear(self):
+        with self.condition:
+            if self.on_drop is not None:
+                for item in self.items:
+                    self.on_drop(item)
+            self.items.clear()
+
+    def depth(self):
+        with self.condition:
+            return len(self.items)
+
+
+class RecognitionEngine:
+    """Capture, recognition and status stages for a FaceRecognitionSystem
+
+    With workers, captured frames go into a shared-memory ring instead of the frame
+    queue, detection and prediction run in that many processes, and the recognition
+    stage only collects their results and votes on them.
+    """
+
+    def __init__(self, system, workers=0):
+        self.system = system
+        # Frames are captured into reused buffers: one being captured, one being
+        # recognized and the ones waiting in the queue
+        self.frame_pool = FramePool(FRAME_QUEUE_SIZE + 2)
+        self.pool = None
+        if workers:
+            self.pool = RecognitionWorkerPool(workers, system.cascade_path, system.model_path,
+                                              prune_people=system.recognizer.prune_people,
+                                              layout=system.camera.layout)
+        self.frames = DropOldestQueue(FRAME_QUEUE_SIZE, on_drop=lambda item: self.frame_pool.release(item[1]))
+        self.statuses = DropOldestQueue(STATUS_QUEUE_SIZE)
+        self.results = DropOldestQueue(1)
+        self.verdicts = DropOldestQueue(1)
+
+        self.wanted = threading.Event()  # set while someone is waiting to be recognized
+        self.warm = threading.Event()  # set to open the camera ahead of a recognition
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.generation = 0  # bumped on cancel so stale frames are not voted on
+        self.verifying = False  # next frame is a 1:1 identity check rather than a burst
+        self.submitted = 0  # frames handed to the worker pool
+        self.tracked = 0  # newest of them whose detection the tracker has been moved to
+
+    def start(self):
+        """Start the stage threads (and the worker processes, if any)"""
+        if self.pool is not None:
+            self.pool.start()
+        recognize = self._recognize_loop if self.pool is None else self._collect_loop
+        for name, target in (("capture", self._capture_loop),
+                             ("recognize", recognize),
+                             ("status", self._status_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        """Stop every stage and wait for them to finish"""
+        self.stop_event.set()
+        self.wanted.set()  # wake the capture stage
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+        if self.pool is not None:
+            self.pool.stop()
+
+    def request_recognition(self):
+        """Start capturing and recognizing until a person is found or cancel() is called"""
+        self.verifying = False
+        self.wanted.set()
+
+    def prewarm(self):
+        """Open the camera on the capture stage without capturing, so the first frame is ready sooner"""
+        self.warm.set()
+
+    def request_verification(self):
+        """Capture one frame and check it against the person already recognized"""
+        self.verifying = True
+        self.wanted.set()
+
+    def cancel(self):
+        """Stop recognizing and forget any frames, results and verdicts still queued"""
+        self.wanted.clear()
+        self.verifying = False
+        self.generation += 1
+        self.frames.clear()
+        self.results.clear()
+        self.verdicts.clear()
+
+    def reset_tracker(self):
+        """Forget the tracked face; detections of frames already with the workers are ignored"""
+        self.system.tracker.reset()
+        self.tracked = self.submitted
+
+    def poll_result(self):
+        """Return a recognized name if the recognition stage found one, otherwise None"""
+        return self._current(self.results)
+
+    def poll_verdict(self):
+        """Return True/False from the last verification, or None if none has finished"""
+        return self._current(self.verdicts)
+
+    def _current(self, queue):
+        """Value of the next (generation, value) item, None if it was queued before cancel()
+
+        The recognition stage can finish a burst while cancel() runs, after the
+        queue was cleared; its generation tells the control loop to drop it.
+        """
+        item = queue.get(timeout=0)
+        if item is None:
+            return None
+        generation, value = item
+        return value if generation == self.generation else None
+
+    def submit_status(self, status, force=False):
+        """Hand a status to the publishing stage; only the newest one is kept"""
+        self.statuses.put((status, force))
+
+    def queue_depths(self):
+        """Current depth, high-water mark and drop count of each stage queue"""
+        depths = {
+            name: {"depth": q.depth(), "high_water": q.high_water, "dropped": q.dropped}
+            for name, q in (("frames", self.frames), ("results", self.results),
+                            ("verdicts", self.verdicts), ("status", self.statuses))
+        }
+        if self.pool is not None:
+            depths["ring"] = self.pool.ring_stats()
+        return depths
+
+    def _capture_loop(self):
+        camera = self.system.camera
+        while not self.stop_event.is_set():
+            if not self.wanted.wait(STAGE_POLL_INTERVAL):
+                if self.warm.is_set():
+                    self.warm.clear()
+                    try:
+                        camera.open()
+                    except Exception as e:
+                        print(f"Error warming camera: {e}")
+                    continue
+                # Nothing to do; the camera stays warm while the mirror is active
+                camera.release_if_idle(keep_warm=self.system.is_active)
+                continue
+            if self.stop_event.is_set():
+                break
+            if self.pool is not None and not self.pool.wait_for_slot(STAGE_POLL_INTERVAL):
+                continue  # every slot is being worked on; capture a fresh frame once one frees up
+            buffer = self.frame_pool.acquire()
+            try:
+                frame = camera.capture(buffer)
+            except Exception as e:
+                self.frame_pool.release(buffer)
+                print(f"Error capturing frame: {e}")
+                self.system.metrics.inc("retries")
+                self.stop_event.wait(CAPTURE_RETRY_DELAY)
+                continue
+            if frame is not buffer:
+                self.frame_pool.release(buffer)  # the source brought its own array
+            if self.pool is None:
+                self.frames.put((self.generation, frame))
+            else:
+                with self._traced():
+                    self._submit(frame)
+                self.frame_pool.release(frame)  # copied into the ring
+
+    def _submit(self, frame):
+        """Hand a frame to the worker pool, tagged with the verification label if checking identity"""
+        label = None
+        if self.verifying:
+            # One frame is enough for a 1:1 check; stop capturing until asked again
+            self.wanted.clear()
+            label = self.system.verifier.label
+            if label is None:
+                return
+        self.submitted += 1
+        self.pool.submit(frame, self.generation, label, self.system.current_distance,
+                         self.system.tracker.state(), self.submitted)
+
+    def _recognize_loop(self):
+        vote = BurstVote()
+        start = None
+        while not self.stop_event.is_set():
+            item = self.frames.get(timeout=STAGE_POLL_INTERVAL)
+            if item is None:
+                continue
+            generation, frame = item
+            try:
+                with self._traced():
+                    vote, start = self._recognize(generation, frame, vote, start)
+            finally:
+                self.frame_pool.release(frame)
+
+    def _traced(self):
+        """Allocation tracking around one frame when the system runs with --trace-alloc"""
+        allocations = self.system.allocations
+        return nullcontext() if allocations is None else allocations.frame()
+
+    def _recognize(self, generation, frame, vote, start):
+        """Recognize or verify one frame; returns the burst vote and its start time to carry on with"""
+        if generation != self.generation or not self.wanted.is_set():
+            return BurstVote(), None
+
+        if start is None:
+            # Not inside a burst: the safe point to swap in a reloaded model
+            self.system.apply_pending_model()
+
+        if self.verifying:
+            # One frame is enough for a 1:1 check; stop capturing until asked again
+            self.wanted.clear()
+            try:
+                verdict = self.system.verify_frame(frame)
+            except Exception as e:
+                print(f"Error in face verification: {e}")
+                self.system.metrics.inc("retries")
+                return vote, start
+            if verdict is not None:  # None: no face in the frame, try again next time
+                self.verdicts.put((generation, verdict))
+            return vote, start
+
+        if start is None:
+            start = time.monotonic()
+        try:
+            vote.add_frame(self.system.predict_frame(frame))
+        except Exception as e:
+            print(f"Error in face recognition: {e}")
+            self.system.metrics.inc("retries")
+            return vote, start
+        if not vote.is_decided() and vote.frames < BURST_FRAMES:
+            return vote, start
+
+        # Burst finished: report and start a fresh vote
+        self._report_burst(vote, start, generation)
+        return BurstVote(), None
+
+    def _collect_loop(self):
+        """Recognition stage with worker processes: vote on the results they send back"""
+        metrics = self.system.metrics
+        vote = BurstVote()
+        start = None
+        while not self.stop_event.is_set():
+            if start is None and self.system.apply_pending_model():
+                # Frames already with the workers finish on the old model
+                self.pool.reload()
+            item = self.pool.get_result(STAGE_POLL_INTERVAL)
+            if item is None:
+                continue
+            generation, label, payload = item
+            for stage, seconds in payload.get("timings", {}).items():
+                metrics.observe(stage, seconds)
+            if "error" in payload:
+                print(f"Error in face recognition worker: {payload['error']}")
+                metrics.inc("retries")
+                continue
+            self._track(payload["frame"], payload["detection"])
+
+            if label is not None:
+                if generation != self.generation or label != self.system.verifier.label:
+                    continue  # checked against a session that has since ended
+                if payload["distance"] is not None:
+                    metrics.inc("verifications")
+                    self.system.verifier.seconds += payload["timings"].get("verify", 0.0)
+                verdict = self.system.verifier.judge(payload["distance"])
+                if verdict is not None:  # None: no face in the frame, try again next time
+                    self.verdicts.put((generation, verdict))
+                continue
+
+            if generation != self.generation or not self.wanted.is_set():
+                vote, start = BurstVote(), None
+                continue
+            if start is None:
+                start = time.monotonic()
+            self.system.candidates = payload["candidates"]
+            vote.add_frame(payload["predictions"])
+            if not vote.is_decided() and vote.frames < BURST_FRAMES:
+                continue
+
+            self._report_burst(vote, start, generation)
+            vote, start = BurstVote(), None
+
+    def _track(self, number, detection):
+        """Move the tracker to a worker's detection, unless a later frame already has
+
+        Results can come back out of order across workers; an older one still counts
+        its cascade runs but does not move the track backwards.
+        """
+        latest = number > self.tracked
+        if latest:
+            self.tracked = number
+        self.system.tracker.update(detection["boxes"], detection["kind"] if latest else None,
+                                   detection["scans"], detection["distance"], detection["width"])
+
+    def _report_burst(self, vote, start, generation):
+        """Count and log a finished burst, and hand its person to the control loop
+
+        A burst that finishes after cancel() is dropped without a trace, so the
+        attempt metrics and the log only cover results the control loop receives.
+        """
+        if generation != self.generation:
+            return
+        elapsed = time.monotonic() - start
+        self.system.last_burst_frames = vote.frames
+        self.system.metrics.observe("burst", elapsed)
+        self.system.metrics.inc("attempts")
+        name, share = vote.leader()
+        person = vote.result()
+        self.system.metrics.inc("recognitions" if person else "misses")
+        if person:
+            print(f"[INFO] Recognized: {person} "
+                  f"(vote {share:.0%}, {vote.frames}/{BURST_FRAMES} frames, {elapsed:.2f}s)")
+            self.wanted.clear()  # found; no further bursts until recognition is asked for again
+            self.results.put((generation, person))
+        elif vote.faces_seen > 0:
+            print(f"[INFO] Face detected but not recognized "
+                  f"(best {name or 'Unknown'} at {share:.0%}, {vote.frames} frames, {elapsed:.2f}s)")
+        else:
+            print(f"[INFO] No face detected in {vote.frames} frames!")
+
+    def _status_loop(self):
+        publisher = self.system.publisher
+        while not self.stop_event.is_set():
+            item = self.statuses.get(timeout=STAGE_POLL_INTERVAL)
+            if item is not None:
+                status, force = item
+                publisher.publish(status, force)
+
+        # Flush whatever was submitted last so the final state is not lost
+        item = self.statuses.get(timeout=0)
+        if item is not None:
+            publisher.publish(*item)
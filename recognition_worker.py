@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Recognition Workers for MagicMirror² Face Recognition
+Runs detection and recognition in separate processes, fed from a ring of frames
+preallocated in shared memory so only slot numbers and small results are pickled
+"""
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FRAME_RING_SLOTS = 4  # frames in flight across all workers
+WORKER_RESTART_DELAY = 5.0  # seconds a worker must have run before a crash restarts it
+WORKER_STOP_TIMEOUT = 2.0  # seconds to wait for a worker to exit before terminating it
+
+
+class FrameRing:
+    """A fixed number of equally shaped frames in one shared memory block
+
+    The creating process owns the free list: put() copies a frame into a free slot and
+    returns its index, release() hands the slot back once a worker is done with it.
+    Workers attach() by spec and read their slots in place.
+    """
+
+    def __init__(self, slots, shape, dtype=np.uint8, name=None):
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = name is None
+        size = slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype, buffer=self.memory.buf)
+        self.free = deque(range(slots))
+        self.available = threading.Condition()
+        self.high_water = 0
+
+    @property
+    def spec(self):
+        """Everything a worker needs to attach to this ring"""
+        return self.memory.name, self.slots, self.shape, self.dtype.str
+
+    @classmethod
+    def attach(cls, spec):
+        name, slots, shape, dtype = spec
+        return cls(slots, shape, dtype, name=name)
+
+    def fits(self, frame):
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def in_use(self):
+        with self.available:
+            return self.slots - len(self.free)
+
+    def wait_for_slot(self, timeout=None):
+        """True once a slot is free, False if none freed up within timeout"""
+        with self.available:
+            if not self.free:
+                self.available.wait(timeout)
+            return bool(self.free)
+
+    def put(self, frame):
+        """Copy frame into a free slot and return its index, or None if every slot is taken"""
+        with self.available:
+            if not self.free:
+                return None
+            slot = self.free.popleft()
+            self.high_water = max(self.high_water, self.slots - len(self.free))
+        np.copyto(self.frames[slot], frame)
+        return slot
+
+    def release(self, slot):
+        with self.available:
+            self.free.append(slot)
+            self.available.notify()
+
+    def close(self):
+        self.frames = None  # the array holds an export of the buffer, which close() refuses
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def load_worker_model(model_path, prune_people=None):
+    """Load and prepare the model in a worker the way the recognizer daemon does"""
+    from model_bundle import LoadedModel, load_model
+
+    model = LoadedModel(*load_model(model_path))
+    model.recognizer.prune_people = prune_people
+    model.recognizer.index
+    return model
+
+
+def process_frame(frame, tracker, model, verifier, buffers, label=None, distance=None, track=None):
+    """Detect and recognize faces in one frame; the worker's whole job
+
+    Without a label the result holds the predictions and candidates of every face;
+    with one it holds the subject's verification distance to that label's references.
+    Detection searches from track, the parent tracker's state(), and the result comes
+    back as "detection" for the parent to update() its tracker with. Stage timings come
+    back too so the parent's metrics still cover them.
+    """
+    from face_pipeline import recognize_faces, scale_boxes, subject_order
+
+    timings = {}
+    start = time.perf_counter()
+    detect_gray, gray = buffers.planes(frame)
+    timings["cvtColor"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if track is not None:
+        tracker.restore(track)
+    boxes, kind = tracker.search(detect_gray, distance)
+    timings["detect"] = time.perf_counter() - start
+    detection = {"boxes": boxes, "kind": kind, "scans": tracker.scans, "distance": distance,
+                 "width": detect_gray.shape[1]}
+    faces = scale_boxes(boxes, detect_gray, gray)
+
+    if label is None:
+        if not faces:
+            return {"predictions": [], "candidates": [], "detection": detection, "timings": timings}
+        start = time.perf_counter()
+        predictions, candidates = recognize_faces(gray, faces, model, buffers)
+        timings["predict"] = time.perf_counter() - start
+        return {"predictions": predictions, "candidates": candidates, "detection": detection,
+                "timings": timings}
+
+    if not faces or label >= len(model.label_names):
+        return {"distance": None, "detection": detection, "timings": timings}
+    if verifier.label != label:
+        verifier.start(model.label_names[label], label)
+    subject = faces[subject_order(faces, gray.shape)[0]]
+    start = time.perf_counter()
+    face_distance = verifier.distance(buffers.faces(gray, [subject])[0], buffers.scratch)
+    timings["verify"] = time.perf_counter() - start
+    return {"distance": face_distance, "detection": detection, "timings": timings}
+
+
+def _worker_main(index, tasks, results, cascade_path, model_path, prune_people, layout):
+    """Worker process: attach to the ring and answer frame tasks until told to stop
+
+    Tasks are ("attach", spec), ("reload",), ("frame", slot, generation, label,
+    distance, track, number) or None to exit. Every frame task gets exactly one result
+    (index, slot, generation, label, payload) so the parent can free its slot.
+    The worker keeps no tracking state of its own; track carries it with each frame.
+    """
+    import cv2
+    from face_pipeline import FaceTracker, FrameBuffers, SessionVerifier
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is for the parent, which stops us in order
+    cv2.setNumThreads(1)  # each worker keeps to one core; the pool is the parallelism
+
+    model = load_worker_model(model_path, prune_people)
+    verifier = SessionVerifier(model.recognizer)
+    cascade = cv2.CascadeClassifier(cascade_path) if cascade_path else None
+    tracker = FaceTracker(cascade)
+    buffers = FrameBuffers(layout=layout)
+    ring = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            if task[0] == "attach":
+                if ring is not None:
+                    ring.close()
+                ring = FrameRing.attach(task[1])
+            elif task[0] == "reload":
+                try:
+                    model = load_worker_model(model_path, prune_people)
+                except Exception as e:
+                    print(f"⚠️  Recognition worker {index} could not reload {model_path}: {e}")
+                    continue
+                verifier = SessionVerifier(model.recognizer)
+            elif task[0] == "frame":
+                _, slot, generation, label, distance, track, number = task
+                try:
+                    payload = process_frame(ring.frames[slot], tracker, model, verifier, buffers,
+                                            label, distance, track)
+                except Exception as e:
+                    payload = {"error": str(e)}
+                payload["frame"] = number
+                results.put((index, slot, generation, label, payload))
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+class RecognitionWorkerPool:
+    """Recognition worker processes reading frames from one shared FrameRing
+
+    submit() copies a frame into the ring and sends its slot to the least busy worker;
+    results come back on one shared queue and free their slot as they are collected.
+    Workers are interchangeable: the face track travels with each frame, so
+    consecutive frames need not go to the same one.
+    The ring is sized from the first frame, so the camera resolution need not be known
+    up front. A worker that dies has its slots freed and is started again.
+    """
+
+    def __init__(self, workers, cascade_path, model_path, prune_people=None, slots=FRAME_RING_SLOTS,
+                 layout=None):
+        self.cascade_path = cascade_path
+        self.model_path = model_path
+        self.prune_people = prune_people
+        self.layout = layout  # camera_manager.FrameLayout of the frames, for dual-stream cameras
+        self.slots = slots
+        # Spawned, not forked: a fork would copy the camera, GPIO and every running thread
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.processes = [None] * workers
+        self.tasks = [None] * workers
+        self.started = [0.0] * workers
+        self.busy = [0] * workers  # slots each worker is holding
+        self.owners = {}  # slot -> worker
+        self.ring = None
+        self.lock = threading.Lock()
+        self.restarts = 0
+
+    def start(self):
+        for i in range(len(self.processes)):
+            self._spawn(i)
+
+    def _spawn(self, i):
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main, name=f"recognize-{i}", daemon=True,
+            args=(i, tasks, self.results, self.cascade_path, self.model_path, self.prune_people,
+                  self.layout))
+        process.start()
+        self.tasks[i], self.processes[i], self.started[i] = tasks, process, time.monotonic()
+        if self.ring is not None:
+            tasks.put(("attach", self.ring.spec))
+
+    def wait_for_slot(self, timeout):
+        """True when a frame submitted now would get a slot"""
+        ring = self.ring
+        return ring is None or ring.wait_for_slot(timeout)
+
+    def submit(self, frame, generation, label=None, distance=None, track=None, number=None):
+        """Queue frame for the least busy worker; returns its slot, or None if the ring is full
+
+        track is the FaceTracker.state() to detect from; number comes back in the result
+        as "frame" so results can be put in submission order.
+        """
+        with self.lock:
+            if self.ring is None or not self.ring.fits(frame):
+                if self.ring is not None and self.ring.in_use():
+                    return None  # frame size changed with frames still in flight
+                self._new_ring(frame)
+            slot = self.ring.put(frame)
+            if slot is None:
+                return None
+            worker = min(range(len(self.busy)), key=self.busy.__getitem__)
+            self.busy[worker] += 1
+            self.owners[slot] = worker
+            self.tasks[worker].put(("frame", slot, generation, label, distance, track, number))
+        return slot
+
+    def _new_ring(self, frame):
+        if self.ring is not None:
+            self.ring.close()
+        self.ring = FrameRing(self.slots, frame.shape, frame.dtype)
+        for tasks in self.tasks:
+            tasks.put(("attach", self.ring.spec))
+        print(f"🧵 Frame ring: {self.slots} x {frame.shape} in shared memory for "
+              f"{len(self.processes)} recognition workers")
+
+    def get_result(self, timeout):
+        """Return (generation, label, payload) of the next finished frame, or None after timeout"""
+        try:
+            worker, slot, generation, label, payload = self.results.get(timeout=timeout)
+        except queue.Empty:
+            self._reap()
+            return None
+        with self.lock:
+            self._release(slot)
+        return generation, label, payload
+
+    def _release(self, slot):
+        worker = self.owners.pop(slot, None)
+        if worker is not None:
+            self.busy[worker] -= 1
+            self.ring.release(slot)
+
+    def _reap(self):
+        """Free the slots of a worker that died and start it again"""
+        with self.lock:
+            for i, process in enumerate(self.processes):
+                if process is None or process.is_alive():
+                    continue
+                if time.monotonic() - self.started[i] < WORKER_RESTART_DELAY:
+                    continue  # crashing on start; do not restart it in a tight loop
+                print(f"⚠️  Recognition worker {i} exited with code {process.exitcode} - restarting")
+                for slot in [s for s, worker in self.owners.items() if worker == i]:
+                    self._release(slot)
+                self._spawn(i)
+                self.restarts += 1
+
+    def reload(self):
+        """Have every worker load the model again; frames already queued finish on the old one"""
+        for tasks in self.tasks:
+            tasks.put(("reload",))
+
+    def ring_stats(self):
+        ring = self.ring
+        if ring is None:
+            return {"depth": 0, "high_water": 0, "dropped": 0}
+        return {"depth": ring.in_use(), "high_water": ring.high_water, "dropped": 0}
+
+    def stop(self):
+        for tasks in self.tasks:
+            if tasks is not None:
+                tasks.put(None)
+        for i, process in enumerate(self.processes):
+            if process is None:
+                continue
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join(WORKER_STOP_TIMEOUT)
+            self.tasks[i].close()
+            self.processes[i] = None
+        self.results.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
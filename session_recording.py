@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Session Recording for MagicMirror² Face Recognition
+Records the echo timings and camera frames a session saw, with timestamps, and
+replays them through the unchanged pipeline in real time or as fast as possible
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from camera_manager import FrameLayout
+from ultrasonic import ECHO_TIMEOUT
+
+FRAMES_FILE = "frames.raw"  # frames back to back, memory-mapped on replay
+INDEX_FILE = "index.npz"  # timestamps, echo durations and frame shape
+SESSION_VERSION = 1
+
+
+class SessionRecorder:
+    """Appends frames and echo durations to a session directory as they are captured
+
+    Frames go straight to one raw file; the timestamps are kept in memory and written
+    to the index when the recorder is closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.frames_file = open(os.path.join(path, FRAMES_FILE), "wb")
+        self.frame_shape = None
+        self.frame_dtype = None
+        self.layout = FrameLayout()  # set by RecordingFrameSource; dual frames replay as dual
+        self.frame_times = []
+        self.echo_times = []
+        self.echo_durations = []
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.started_at = datetime.now().isoformat()
+        self.failed = False
+
+    def add_frame(self, frame):
+        if self.failed or frame is None:
+            return
+        with self.lock:
+            try:
+                if self.frame_shape is None:
+                    self.frame_shape, self.frame_dtype = frame.shape, frame.dtype
+                elif frame.shape != self.frame_shape or frame.dtype != self.frame_dtype:
+                    raise ValueError(f"frame {frame.shape} {frame.dtype} does not match "
+                                     f"{self.frame_shape} {self.frame_dtype}")
+                self.frames_file.write(np.ascontiguousarray(frame).tobytes())
+                self.frame_times.append(time.monotonic() - self.started)
+            except Exception as e:
+                # Recording is a debugging aid; never let it take the camera down
+                print(f"⚠️  Session recording stopped: {e}")
+                self.failed = True
+
+    def add_echo(self, duration):
+        with self.lock:
+            self.echo_times.append(time.monotonic() - self.started)
+            self.echo_durations.append(np.nan if duration is None else duration)
+
+    def close(self):
+        """Write the index; the session can be replayed from here on"""
+        with self.lock:
+            if self.frames_file.closed:
+                return
+            self.frames_file.close()
+            meta = {
+                "version": SESSION_VERSION,
+                "started": self.started_at,
+                "frame_shape": list(self.frame_shape or ()),
+                "frame_dtype": str(self.frame_dtype or np.uint8),
+                "lores_size": list(self.layout.lores_size or ()),
+            }
+            tmp_path = os.path.join(self.path, "index.tmp.npz")
+            np.savez(tmp_path, meta=np.array(json.dumps(meta)),
+                     frame_times=np.array(self.frame_times, dtype=np.float64),
+                     echo_times=np.array(self.echo_times, dtype=np.float64),
+                     echo_durations=np.array(self.echo_durations, dtype=np.float64))
+            os.replace(tmp_path, os.path.join(self.path, INDEX_FILE))
+        print(f"🎞️  Recorded {len(self.frame_times)} frames and {len(self.echo_times)} echoes "
+              f"to {self.path}")
+
+
+class RecordingFrameSource:
+    """Wraps a frame source and records every frame it delivers"""
+
+    def __init__(self, source, recorder):
+        self.source = source
+        self.recorder = recorder
+        self.layout = source.layout
+        recorder.layout = source.layout
+
+    def open(self):
+        self.source.open()
+
+    def read(self, out=None):
+        frame = self.source.read(out)
+        self.recorder.add_frame(frame)
+        return frame
+
+    def close(self):
+        self.source.close()
+
+
+class RecordingGPIOBackend:
+    """Wraps a ranging backend and records every echo duration it returns"""
+
+    def __init__(self, backend, recorder):
+        self.backend = backend
+        self.recorder = recorder
+
+    def ping(self, timeout=ECHO_TIMEOUT):
+        duration = self.backend.ping(timeout)
+        self.recorder.add_echo(duration)
+        return duration
+
+    def cleanup(self):
+        self.backend.cleanup()
+
+
+class SessionRecording:
+    """A recorded session: memory-mapped frames plus the timestamp index"""
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(os.path.join(path, INDEX_FILE)) as index:
+            meta = json.loads(str(index["meta"]))
+            if meta.get("version") != SESSION_VERSION:
+                raise ValueError(f"Unsupported session version {meta.get('version')} in {path}")
+            self.frame_times = index["frame_times"]
+            self.echo_times = index["echo_times"]
+            self.echo_durations = index["echo_durations"]
+        self.started = meta["started"]
+        self.layout = FrameLayout(meta.get("lores_size"))
+
+        if len(self.frame_times):
+            self.frames = np.memmap(os.path.join(path, FRAMES_FILE), dtype=meta["frame_dtype"],
+                                    mode="r", shape=(len(self.frame_times),) + tuple(meta["frame_shape"]))
+        else:
+            self.frames = np.zeros((0,), dtype=np.uint8)
+
+    @property
+    def duration(self):
+        ends = [times[-1] for times in (self.frame_times, self.echo_times) if len(times)]
+        return max(ends) if ends else 0.0
+
+    def echo(self, i):
+        """Echo duration in seconds, or None for a missed echo"""
+        duration = self.echo_durations[i]
+        return None if np.isnan(duration) else float(duration)
+
+    def summary(self):
+        missed = int(np.isnan(self.echo_durations).sum())
+        return (f"{len(self.frame_times)} frames {tuple(self.frames.shape[1:])}, "
+                f"{len(self.echo_times)} echoes ({missed} missed) over {self.duration:.1f}s, "
+                f"recorded {self.started}")
+
+
+class SessionReplay:
+    """Plays a recording back on the clock it was recorded on
+
+    The frame source and ranging backend share one clock that starts on first use.
+    Like a live camera, a read returns the newest frame due by now (waiting for the
+    next one if needed); a ping returns the newest echo due by now.
+    """
+
+    def __init__(self, recording):
+        self.recording = recording
+        self.origin = None
+        self.lock = threading.Lock()
+
+    def now(self):
+        with self.lock:
+            if self.origin is None:
+                self.origin = time.monotonic()
+            return time.monotonic() - self.origin
+
+    @property
+    def finished(self):
+        return self.origin is not None and self.now() > self.recording.duration
+
+    def frame_source(self):
+        return ReplayFrameSource(self)
+
+    def gpio_backend(self):
+        return ReplayGPIOBackend(self)
+
+
+class ReplayFrameSource:
+    """Frame source serving a recording's frames at their recorded times"""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.layout = replay.recording.layout
+        self.index = 0
+
+    def open(self):
+        self.replay.now()  # start the clock if the sensor has not already
+
+    def read(self, out=None):
+        times = self.replay.recording.frame_times
+        if self.index >= len(times):
+            return None  # session over
+        delay = times[self.index] - self.replay.now()
+        if delay > 0:
+            time.sleep(delay)
+        # Frames nobody read while they were current are dropped, as on the camera
+        newest = int(np.searchsorted(times, self.replay.now(), side="right")) - 1
+        self.index = max(self.index, newest) + 1
+        frame = self.replay.recording.frames[self.index - 1]
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            return out
+        return np.array(frame)
+
+    def close(self):
+        pass
+
+
+class ReplayGPIOBackend:
+    """Ranging backend returning a recording's echo durations at their recorded times"""
+
+    def __init__(self, replay):
+        self.replay = replay
+
+    def ping(self, timeout=ECHO_TIMEOUT):
+        recording = self.replay.recording
+        i = int(np.searchsorted(recording.echo_times, self.replay.now(), side="right")) - 1
+        duration = recording.echo(i) if i >= 0 else None
+
+        # Sleep for as long as the real sensor would make us wait
+        if duration is None or duration > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(duration)
+        return duration
+
+    def cleanup(self):
+        pass
+
+
+def replay_fast(system, recording):
+    """Feed every recorded frame through system.predict_frame back to back
+
+    Frames are voted on in bursts like the recognition stage does. Returns a dict with
+    per-frame predictions and burst results, for diffing runs of different models,
+    detectors or thresholds.
+    """
+    from face_pipeline import BurstVote, BURST_FRAMES
+
+    frames, bursts = [], []
+    vote = BurstVote()
+    start = time.perf_counter()
+    for t, frame in zip(recording.frame_times, recording.frames):
+        predictions = system.predict_frame(np.asarray(frame))
+        frames.append({"t": round(float(t), 3),
+                       "faces": [[name, round(float(distance), 2)] for name, distance in predictions]})
+        vote.add_frame(predictions)
+        if vote.is_decided() or vote.frames >= BURST_FRAMES:
+            bursts.append({"t": round(float(t), 3), "person": vote.result(), "frames": vote.frames})
+            vote = BurstVote()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "frames": len(frames),
+        "seconds": elapsed,
+        "fps": len(frames) / elapsed if elapsed > 0 else None,
+        "recognized": sum(1 for b in bursts if b["person"]),
+        "bursts": bursts,
+        "predictions": frames,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or replay a recorded face recognition session")
+    parser.add_argument("session", help="Session directory written with face_recognition_system.py --record")
+    parser.add_argument("--fast", action="store_true",
+                        help="Run every frame through the recognizer back to back instead of the full system")
+    parser.add_argument("--model", help="Model bundle to replay against (default face_model.bin)")
+    parser.add_argument("--cascade", help="Haar cascade XML to replay against")
+    parser.add_argument("--output", help="Write the --fast results as JSON here")
+    args = parser.parse_args()
+
+    recording = SessionRecording(args.session)
+    print(f"🎞️  {args.session}: {recording.summary()}")
+    if not args.fast:
+        parser.exit(message="Use face_recognition_system.py --replay for a real-time replay, "
+                            "or --fast here\n")
+
+    import face_recognition_system as frs
+
+    options = {"status_file": os.path.join(args.session, "replay_status.json"),
+               "status_socket": os.path.join(args.session, "replay_status.sock"),
+               "metrics_file": os.path.join(args.session, "replay_metrics.prom")}
+    if args.model:
+        options["model_path"] = args.model
+    if args.cascade:
+        options["cascade_path"] = args.cascade
+    system = frs.FaceRecognitionSystem(SessionReplay(recording).frame_source(),
+                                       SessionReplay(recording).gpio_backend(), **options)
+    try:
+        results = replay_fast(system, recording)
+    finally:
+        system.cleanup()
+
+    print(f"   {results['frames']} frames in {results['seconds']:.2f}s ({results['fps'] or 0:.0f} fps), "
+          f"{results['recognized']}/{len(results['bursts'])} bursts recognized")
+    for burst in results["bursts"]:
+        print(f"   {burst['t']:8.2f}s  {burst['person'] or '-':<12} ({burst['frames']} frames)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"   Results written to {args.output}")
@@ -13,7 +13,7 @@ fi
 
 # Install required Python packages (matching your working code)
 echo "📦 Installing Python packages..."
-pip3 install opencv-python RPi.GPIO picamera2 numpy
+pip3 install opencv-python RPi.GPIO gpiod picamera2 numpy
 
 # Create Images directory (matching your working code structure)
 echo "📁 Creating Images directory..."
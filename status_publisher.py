@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Status Publisher for MagicMirror² Face Recognition
+Writes the status file only when the state changes or a slow heartbeat is due,
+and pushes the same updates to MagicMirror² over a Unix-domain socket
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+STATUS_FILE = "/tmp/magicmirror_face_status.json"
+STATUS_SOCKET = "/tmp/magicmirror_face_status.sock"
+SEND_TIMEOUT = 0.2  # seconds a slow subscriber may hold up a broadcast before it is dropped
+HEARTBEAT_INTERVAL = 5.0  # seconds between writes when nothing changes
+DISTANCE_STEP = 2.0  # cm the distance must move before it counts as a change
+
+# Fields that are bookkeeping rather than state; candidate scores change every frame,
+# so they ride along with the next real change or heartbeat instead of forcing writes
+VOLATILE_FIELDS = ("timestamp", "seq", "distance", "candidates")
+
+
+class StatusServer:
+    """Pushes each published status as one line of JSON to every connected subscriber"""
+
+    def __init__(self, path=STATUS_SOCKET):
+        self.path = path
+        self.clients = []
+        self.lock = threading.Lock()
+        self.last_message = None
+        self.server = None
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Listen on the socket and accept subscribers in the background"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from a previous run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen(8)
+        server.settimeout(1.0)  # lets the accept loop notice close()
+        self.server = server
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, name="status-server", daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            client.settimeout(SEND_TIMEOUT)
+            with self.lock:
+                # New subscribers get the current state straight away
+                if self.last_message is None or self._send(client, self.last_message):
+                    self.clients.append(client)
+
+    def _send(self, client, message):
+        try:
+            client.sendall(message)
+            return True
+        except OSError:
+            client.close()
+            return False
+
+    def broadcast(self, payload):
+        """Send payload to every subscriber, dropping any that have gone away"""
+        message = (json.dumps(payload, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.lock:
+            self.last_message = message
+            self.clients = [c for c in self.clients if self._send(c, message)]
+
+    def close(self):
+        """Stop accepting, disconnect subscribers and remove the socket file"""
+        self.running = False
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            self.thread = None
+        with self.lock:
+            for client in self.clients:
+                client.close()
+            self.clients = []
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class StatusPublisher:
+    """Coalesces status updates and writes compact JSON with a sequence number"""
+
+    def __init__(self, path=STATUS_FILE, heartbeat=HEARTBEAT_INTERVAL, distance_step=DISTANCE_STEP,
+                 server=None, metrics=None):
+        self.path = path
+        self.server = server
+        self.metrics = metrics
+        self.heartbeat = heartbeat
+        self.distance_step = distance_step
+        self.seq = 0
+        self.last_state = None
+        self.last_distance = None
+        self.last_write = None
+
+        # Counters so the savings can be checked
+        self.writes = 0
+        self.suppressed = 0
+
+    def has_changed(self, status):
+        """True if status differs from the last published one in a way readers care about"""
+        if self.last_state is None:
+            return True
+        state = {k: v for k, v in status.items() if k not in VOLATILE_FIELDS}
+        if state != self.last_state:
+            return True
+        distance = status.get("distance")
+        if distance is None or self.last_distance is None:
+            return distance != self.last_distance
+        return abs(distance - self.last_distance) >= self.distance_step
+
+    def publish(self, status, force=False):
+        """Write status if it changed, the heartbeat is due or force is set; return True if written"""
+        now = time.monotonic()
+        heartbeat_due = self.last_write is None or now - self.last_write >= self.heartbeat
+        if not (force or heartbeat_due or self.has_changed(status)):
+            self.suppressed += 1
+            return False
+
+        start = time.perf_counter()
+        self.seq += 1
+        payload = dict(status, seq=self.seq)
+        if self.server is not None:
+            self.server.broadcast(payload)
+        try:
+            # Write to temporary file first, then rename to avoid partial reads
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump(payload, f, separators=(',', ':'))
+            os.replace(temp_file, self.path)
+        except Exception as e:
+            print(f"Error writing status file: {e}")
+            return False
+
+        self.last_state = {k: v for k, v in status.items() if k not in VOLATILE_FIELDS}
+        self.last_distance = status.get("distance")
+        self.last_write = now
+        self.writes += 1
+        if self.metrics is not None:
+            self.metrics.observe("status_write", time.perf_counter() - start)
+        return True
@@ -8,24 +8,25 @@ import json
 import time
 import os
 from face_recognition_system import FaceRecognitionSystem
+from model_bundle import MODEL_BUNDLE, LEGACY_TRAINER_PATHS
 
 def test_face_recognition():
     """Test the face recognition system"""
     print("🧪 Testing Face Recognition System")
     print("==================================")
     
-    # Check if trainer.yml exists (try both locations)
-    trainer_paths = ["trainer.yml", "python_code/trainer.yml"]
-    trainer_found = False
+    # Check for the model bundle, or an old trainer.yml (try both locations)
+    model_paths = [MODEL_BUNDLE] + LEGACY_TRAINER_PATHS
+    model_found = False
     
-    for trainer_path in trainer_paths:
-        if os.path.exists(trainer_path):
-            print(f"✅ Found trainer.yml at: {trainer_path}")
-            trainer_found = True
+    for model_path in model_paths:
+        if os.path.exists(model_path):
+            print(f"✅ Found trained model at: {model_path}")
+            model_found = True
             break
     
-    if not trainer_found:
-        print("❌ trainer.yml not found!")
+    if not model_found:
+        print(f"❌ {MODEL_BUNDLE} not found!")
         print("📋 You need to train the face recognition system first:")
         print("   1. Run: python3 train_faces.py")
         print("   2. Choose option 1 to add a person")
@@ -37,7 +38,7 @@ def test_face_recognition():
         system = FaceRecognitionSystem()
         
         print("✅ System initialized successfully")
-        print(f"📁 Known faces: {system.label_names}")
+        print(f"📁 Known faces: {list(system.label_map.values())}")
         print(f"📄 Status file: {system.status_file}")
         
         # Test distance reading
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Face Store Test
+Hardware-free checks of appending, removing and compacting faces in the packed store
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+from face_store import FACE_SIZE, FaceStore
+
+
+def face(value):
+    return np.full(FACE_SIZE, value, dtype=np.uint8)
+
+
+def test_append_reload_and_compact():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "faces")
+        store = FaceStore.open(path, create=True)
+        for i in range(3):
+            store.append("bob", face(10 + i))
+        for i in range(2):
+            store.append("alice", face(20 + i))
+        store.close()
+
+        # A second process sees the same faces, labelled in name order
+        store = FaceStore.open(path)
+        faces, labels, label_names = store.training_set()
+        assert label_names == ["alice", "bob"]
+        assert labels == [0, 0, 1, 1, 1]
+        assert [int(f[0, 0]) for f in faces] == [20, 21, 10, 11, 12]
+
+        # Removal is logged, then compact() rewrites only the live faces
+        assert store.remove("bob") == 3
+        old_file = store.faces_path
+        assert store.compact() == 3
+        assert not os.path.exists(old_file)
+        store.append("carol", face(30))
+        store.close()
+
+        store = FaceStore.open(path)
+        faces, labels, label_names = store.training_set()
+        assert label_names == ["alice", "carol"]
+        assert [int(f[0, 0]) for f in faces] == [20, 21, 30]
+        assert os.path.getsize(store.faces_path) == 3 * face(0).nbytes
+        print(f"   🗃️  {store.summary()}")
+        store.close()
+
+
+if __name__ == "__main__":
+    print("🧪 Testing Face Store")
+    print("=====================")
+    test_append_reload_and_compact()
+    print("🎉 All face store tests passed!")
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+LBPH Test
+Hardware-free check that the NumPy LBPH histograms and predict match cv2's recognizer
+"""
+
+import cv2
+import numpy as np
+
+from lbph import LBPHModel, LBPHScratch, _synthetic_gallery, lbp_image, spatial_histogram
+
+HISTOGRAM_TOLERANCE = 1e-6  # float32 rounding between the two normalisations
+DISTANCE_TOLERANCE = 1e-6  # relative
+
+
+def trained_pair(people=4, samples_per_person=12):
+    """cv2's recognizer and an LBPHModel trained on the same synthetic faces"""
+    faces, labels = _synthetic_gallery(people, samples_per_person)
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train(faces, labels)
+    histograms = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+    return faces, labels, recognizer, LBPHModel(histograms, labels)
+
+
+def test_histograms_match_cv2():
+    faces, _, recognizer, _ = trained_pair()
+    ours = np.vstack([spatial_histogram(lbp_image(face)) for face in faces])
+    theirs = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+    difference = float(np.abs(ours - theirs).max())
+    print(f"   📏 Max histogram difference {difference:.2e}")
+    assert difference < HISTOGRAM_TOLERANCE
+
+
+def test_stacked_faces_match_single_faces():
+    faces, _, _, _ = trained_pair(people=2, samples_per_person=3)
+    scratch = LBPHScratch()
+    stacked = spatial_histogram(lbp_image(np.stack(faces), scratch=scratch), scratch=scratch)
+    single = np.vstack([spatial_histogram(lbp_image(face)) for face in faces])
+    assert np.array_equal(stacked, single)
+
+
+def test_predict_matches_cv2():
+    faces, _, recognizer, model = trained_pair()
+    rng = np.random.default_rng(1)
+    probes = [np.clip(face + rng.normal(0, 6, face.shape), 0, 255).astype(np.uint8)
+              for face in faces[::5]]
+    batch = model.predict_batch(np.stack(probes), LBPHScratch())
+    for probe, (label, distance) in zip(probes, batch):
+        expected_label, expected_distance = recognizer.predict(probe)
+        assert label == expected_label
+        assert abs(distance - expected_distance) <= DISTANCE_TOLERANCE * expected_distance
+        assert model.predict(probe) == (label, distance)
+    print(f"   ✅ {len(probes)} probes, same labels and distances as cv2")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing NumPy LBPH against cv2")
+    print("=================================")
+    test_histograms_match_cv2()
+    test_stacked_faces_match_single_faces()
+    test_predict_matches_cv2()
+    print("🎉 All LBPH tests passed!")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Model Bundle Test
+Hardware-free checks of the model bundle: save/load round trip, stable label ids and
+verification with a bundle trained on cv2's default LBPH settings
+"""
+
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from face_pipeline import SessionVerifier
+from lbph import _synthetic_gallery
+from model_bundle import BUNDLE_MAGIC, BUNDLE_VERSION, PREAMBLE, ModelBundle, keep_label_ids
+
+PEOPLE = ["alice", "bob", "carol"]
+TRAIN_SAMPLES = 10  # per person; the rest are held-out probes
+
+
+def default_bundle(path):
+    """Train cv2's recognizer on synthetic faces with no threshold set, save and reload it
+
+    Returns (bundle, probes, probe_labels).
+    """
+    faces, labels = _synthetic_gallery(len(PEOPLE), TRAIN_SAMPLES + 2)
+    train = np.arange(len(faces)) % (TRAIN_SAMPLES + 2) < TRAIN_SAMPLES
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.train([f for f, t in zip(faces, train) if t], labels[train])
+    ModelBundle.from_recognizer(recognizer, PEOPLE).save(path)
+    probes = [f for f, t in zip(faces, train) if not t]
+    return ModelBundle.load(path), probes, labels[~train]
+
+
+def test_round_trip():
+    """A saved bundle loads with the same histograms, labels, names and predictions"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "face_model.bin")
+        faces, labels = _synthetic_gallery(len(PEOPLE), 4)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(faces, labels)
+        # Shuffled samples come back grouped by label, each with its own histogram
+        order = np.random.default_rng(0).permutation(len(labels))
+        saved = ModelBundle.from_recognizer(recognizer, PEOPLE, {"note": "round trip"})
+        histograms, shuffled = saved.histograms[order], saved.labels[order]
+        saved.histograms, saved.labels = histograms, shuffled
+        saved.save(path)
+
+        loaded = ModelBundle.load(path)
+        assert loaded.label_names == PEOPLE
+        assert loaded.metadata == {"note": "round trip"}
+        assert loaded.params == saved.params
+        assert list(loaded.labels) == sorted(labels)
+        for label, row in zip(shuffled, histograms):
+            matches = np.all(np.asarray(loaded.histograms) == row, axis=1)
+            assert matches.any() and loaded.labels[np.argmax(matches)] == label
+        model = loaded.recognizer()
+        assert [model.predict(f)[0] for f in faces] == [recognizer.predict(f)[0] for f in faces]
+
+        # Anything but the current layout is refused rather than misread
+        with open(path, "r+b") as f:
+            f.write(PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_VERSION + 1, 0))
+        try:
+            ModelBundle.load(path)
+        except ValueError as e:
+            assert "bundle version" in str(e)
+        else:
+            raise AssertionError("a bundle of another version was loaded")
+
+
+def test_label_ids_survive_retrain():
+    """A full retrain keeps ids; removed people keep their slot, new people go at the end"""
+    labels, label_names = keep_label_ids([0, 0, 1, 2], ["amy", "bob", "zed"], ["bob", None, "carl", "amy"])
+    assert label_names == ["bob", None, None, "amy", "zed"]
+    assert labels == [3, 3, 0, 4]
+
+
+def test_verifier_rejects_other_person():
+    """A default-trained bundle keeps DBL_MAX as its threshold; verification must not inherit it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle, probes, probe_labels = default_bundle(os.path.join(tmp, "face_model.bin"))
+        verifier = SessionVerifier(bundle.recognizer())
+        verifier.start("alice", 0)
+        own = [verifier.distance(p) for p, l in zip(probes, probe_labels) if l == 0]
+        other = [verifier.distance(p) for p, l in zip(probes, probe_labels) if l == 1]
+        print(f"   📏 Verify limit {verifier.max_distance:.1f}, own {np.round(own, 1)}, "
+              f"other {np.round(other, 1)}")
+        assert [verifier.judge(d) for d in own] == [True, True]
+        # One miss is tolerated, the second ends the session
+        assert [verifier.judge(d) for d in other] == [True, False]
+
+
+if __name__ == "__main__":
+    print("🧪 Testing Model Bundle")
+    print("======================")
+    test_round_trip()
+    print("✅ Bundle round trip")
+    test_label_ids_survive_retrain()
+    print("✅ Label ids survive a full retrain")
+    test_verifier_rejects_other_person()
+    print("✅ Another person's face fails verification")
@@ -50,15 +50,14 @@ def test_camera():
     """Test camera functionality"""
     print("📷 Testing camera...")
     try:
-        from picamera2 import Picamera2
-        picam2 = Picamera2()
-        config = picam2.create_preview_configuration(main={"size": (320, 240)})
-        picam2.configure(config)
-        picam2.start()
-        time.sleep(1)
-        frame = picam2.capture_array()
-        picam2.close()
-        print("   ✅ Camera test passed")
+        from camera_manager import PiCameraSource
+        camera = PiCameraSource()
+        camera.open()
+        try:
+            frame = camera.read()
+        finally:
+            camera.close()
+        print(f"   ✅ Camera test passed ({camera.mode} frame {frame.shape})")
         return True
     except Exception as e:
         print(f"   ❌ Camera test failed: {e}")
@@ -68,18 +67,18 @@ def test_face_recognition():
     """Test face recognition files"""
     print("🧠 Testing face recognition...")
     
-    # Check trainer.yml
-    trainer_paths = ["trainer.yml", "python_code/trainer.yml"]
-    trainer_found = False
+    # Check the model bundle, or an old trainer.yml
+    model_paths = ["face_model.bin", "trainer.yml", "python_code/trainer.yml"]
+    model_found = False
     
-    for path in trainer_paths:
+    for path in model_paths:
         if os.path.exists(path):
-            print(f"   ✅ Found trainer.yml at: {path}")
-            trainer_found = True
+            print(f"   ✅ Found trained model at: {path}")
+            model_found = True
             break
     
-    if not trainer_found:
-        print("   ❌ trainer.yml not found")
+    if not model_found:
+        print("   ❌ face_model.bin not found")
         return False
     
     # Check cascade file
@@ -6,30 +6,56 @@ This script takes photos and trains the face recognition system
 
 import cv2
 import os
+import shutil
 import numpy as np
 import time
-from picamera2 import Picamera2
+from datetime import datetime
+
+from camera_manager import PiCameraSource, CAMERA_SIZE, CAPTURE_MODE
+from face_pipeline import FrameBuffers, scale_boxes
+from face_store import FaceStore, FACE_STORE, import_folder, load_dataset
+from model_bundle import ModelBundle, MODEL_BUNDLE, keep_label_ids
+from training_data import PhotoWriter, StageStats
 
 # Paths
 IMAGE_BASE = "Images"
-TRAINER_FILE = "trainer.yml"
 CASCADE_PATH = "/home/andii/haarcascades/haarcascade_frontalface_default.xml"
 
+# Enrolment capture settings
+SAMPLE_GAP = 0.1  # minimum seconds between accepted photos, so they are not near-duplicates
+CAPTURE_TIMEOUT = 60  # seconds to keep looking for faces before giving up
+MISS_REPORT_INTERVAL = 1.0  # seconds between "no face" messages
+TRAINING_CAMERA_SIZE = (640, 480)  # faces are cropped at this size (and detected, unless in dual mode)
+
+def open_face_store():
+    """Open the packed face store, importing the JPEG folders the first time it is created"""
+    store = FaceStore(FACE_STORE)
+    if store.exists():
+        store.load()
+        return store
+    store = FaceStore.open(FACE_STORE, create=True)
+    if os.path.isdir(IMAGE_BASE) and os.listdir(IMAGE_BASE):
+        print(f"🗃️  Importing existing photos from {IMAGE_BASE} into {FACE_STORE}...")
+        added = import_folder(store, IMAGE_BASE, CASCADE_PATH)
+        print(f"✅ Imported {added} faces")
+    return store
+
 def capture_photos(person_name, num_photos=40):
     """Capture photos for a person using camera"""
     print(f"📸 Capturing {num_photos} photos for {person_name}...")
     
-    # Create person directory
-    person_path = os.path.join(IMAGE_BASE, person_name)
-    os.makedirs(person_path, exist_ok=True)
+    # Faces are appended to the packed store rather than saved as separate JPEGs
+    store = open_face_store()
+    camera = None
+    writer = None
+    preview_window = None
     
     # Initialize camera
     try:
-        picam2 = Picamera2()
-        config = picam2.create_preview_configuration(main={"size": (640, 480)})
-        picam2.configure(config)
-        picam2.start()
-        time.sleep(2)  # Let camera initialize
+        # Same capture mode as the recognizer; in dual mode faces are found on the small stream
+        detect_size = CAMERA_SIZE if CAPTURE_MODE == "dual" else TRAINING_CAMERA_SIZE
+        camera = PiCameraSource(size=detect_size, warmup=2, crop_size=TRAINING_CAMERA_SIZE)
+        camera.open()
         
         # Load face cascade
         face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
@@ -54,176 +80,133 @@ def capture_photos(person_name, num_photos=40):
         print("   Press Enter to start capturing photos")
         print("   Press 'q' to quit")
         
-        # Show preview until user presses Enter
+        # Show preview until user presses Enter. The frame, display and gray images are
+        # captured and converted into the same arrays every time round.
+        buffers = FrameBuffers(layout=camera.layout)
+        frame = None
+        display = None
         while True:
             # Capture frame
-            frame = picam2.capture_array()
-            
-            # Convert to RGB for display
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame = camera.read(frame)
             
-            # Detect faces and draw rectangle
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Detect faces
+            gray, _ = buffers.planes(frame)
             faces = face_cascade.detectMultiScale(gray, 1.3, 5)
             
+            # A BGR frame is shown as is (it is captured again next time round);
+            # a grayscale one is expanded to colour so the rectangles stand out
+            if frame.ndim == 3:
+                display = frame
+            else:
+                display = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR, dst=display)
+            
             # Draw face rectangles
             for (x, y, w, h) in faces:
-                cv2.rectangle(rgb_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                cv2.putText(rgb_frame, "Face Detected", (x, y-10), 
+                cv2.rectangle(display, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                cv2.putText(display, "Face Detected", (x, y-10), 
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
             # Add instructions on frame
-            cv2.putText(rgb_frame, "Press ENTER to start capturing", (10, 30), 
+            cv2.putText(display, "Press ENTER to start capturing", (10, 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            cv2.putText(rgb_frame, "Press 'q' to quit", (10, 60), 
+            cv2.putText(display, "Press 'q' to quit", (10, 60), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
             
             # Show frame
-            cv2.imshow(preview_window, rgb_frame)
+            cv2.imshow(preview_window, display)
             
             # Check for key press
             key = cv2.waitKey(1) & 0xFF
             if key == ord('\r') or key == ord('\n'):  # Enter key
                 break
             elif key == ord('q'):
-                cv2.destroyAllWindows()
-                picam2.close()
                 print("❌ Photo capture cancelled")
                 return False
         
         # Close preview window
         cv2.destroyAllWindows()
+        preview_window = None
         print("✅ Starting photo capture...")
         
+        # The loop only captures and detects; encoding and disk writes happen on the
+        # writer pool, so capture runs at camera speed instead of sleeping between photos
+        writer = PhotoWriter(num_photos, threads=1,
+                             write=lambda source, face: store.append(person_name, face, source))
         captured_count = 0
-        attempt = 0
-        max_attempts = num_photos * 3  # Allow more attempts in case no face detected
+        misses = 0
+        start = time.monotonic()
+        last_sample = None
+        last_miss_report = start
         
-        while captured_count < num_photos and attempt < max_attempts:
-            attempt += 1
-            
-            # Capture frame
-            frame = picam2.capture_array()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        while captured_count < num_photos and time.monotonic() - start < CAPTURE_TIMEOUT:
+            # Capture frame (blocks until the camera has the next one)
+            frame = camera.read(frame)
+            now = time.monotonic()
+            if last_sample is not None and now - last_sample < SAMPLE_GAP:
+                continue  # too soon after the last photo to be a different sample
+            gray, crop = buffers.planes(frame)
             
             # Detect faces
             faces = face_cascade.detectMultiScale(gray, 1.3, 5)
             
             if len(faces) > 0:
-                # Use the first face found
-                (x, y, w, h) = faces[0]
-                face_img = gray[y:y+h, x:x+w]
+                # Use the first face found, cut from the full-size image
+                (x, y, w, h) = scale_boxes(faces[:1], gray, crop)[0]
+                face_img = crop[y:y+h, x:x+w]
                 
-                # Resize face to standard size
+                # Resize face to standard size (a new array: the writer keeps it until stored)
                 face_img = cv2.resize(face_img, (100, 100))
                 
-                # Save the face image
-                photo_path = os.path.join(person_path, f"photo_{captured_count + 1:03d}.jpg")
-                cv2.imwrite(photo_path, face_img)
-                
+                # Queue the face for the store (raw pixels, no lossy encoding)
+                writer.submit("camera", face_img)
                 captured_count += 1
-                progress = (captured_count / num_photos) * 100
-                print(f"   ✅ Captured photo {captured_count}/{num_photos} ({progress:.1f}%)")
-                
-                # Small delay between captures
-                time.sleep(0.5)
+                last_sample = now
             else:
-                print(f"   ⚠️  No face detected (attempt {attempt})")
-                time.sleep(0.2)
+                misses += 1
+                if now - last_miss_report >= MISS_REPORT_INTERVAL:
+                    print(f"   ⚠️  No face detected ({misses} frames so far)")
+                    last_miss_report = now
         
-        picam2.close()
+        camera.close()
+        elapsed = time.monotonic() - start
+        saved = writer.close()  # every queued face is in the store before success is reported
         
-        if captured_count >= num_photos:
-            print(f"✅ Successfully captured {captured_count} photos for {person_name}")
+        if saved >= num_photos:
+            print(f"✅ Successfully captured {saved} photos for {person_name} in {elapsed:.1f}s")
             return True
         else:
-            print(f"⚠️  Only captured {captured_count} photos (target was {num_photos})")
-            return captured_count > 0
+            print(f"⚠️  Only captured {saved} photos in {elapsed:.1f}s (target was {num_photos})")
+            return saved > 0
             
     except Exception as e:
-        print(f"❌ Error capturing photos: {e}")
+        saved = writer.close() if writer is not None else 0
+        print(f"❌ Error capturing photos: {e} ({saved} photos were kept)")
         return False
+    finally:
+        # Runs on every return and error: the camera, writer threads and store files are released
+        if preview_window is not None:
+            cv2.destroyAllWindows()
+        if camera is not None:
+            camera.close()
+        if writer is not None:
+            writer.close()
+        store.close()
 
-def get_images_and_labels():
-    """Get images and labels from the Images directory"""
-    image_paths = []
-    labels = []
-    label_names = []
-    
-    # Get all subdirectories in Images folder
-    if not os.path.exists(IMAGE_BASE):
-        print(f"❌ Error: {IMAGE_BASE} directory not found!")
+def get_images_and_labels(stats=None):
+    """Get images and labels from the face store, or the Images directory if there is none"""
+    if not FaceStore(FACE_STORE).exists() and not os.path.exists(IMAGE_BASE):
+        print(f"❌ Error: neither {FACE_STORE} nor {IMAGE_BASE} found!")
         return [], [], []
     
-    # Get list of person directories
-    person_dirs = [d for d in os.listdir(IMAGE_BASE) 
-                   if os.path.isdir(os.path.join(IMAGE_BASE, d))]
+    # The store is one mmap; JPEG folders are decoded across a process pool with a cache
+    images, labels, label_names = load_dataset(FACE_STORE, IMAGE_BASE, CASCADE_PATH, stats=stats)
     
-    if not person_dirs:
-        print(f"❌ Error: No person directories found in {IMAGE_BASE}")
+    if not label_names:
+        print(f"❌ Error: No usable photos found in {FACE_STORE} or {IMAGE_BASE}")
         return [], [], []
     
-    print(f"📁 Found {len(person_dirs)} person directories: {person_dirs}")
-    
-    # Load face cascade
-    face_cascade = cv2.CascadeClassifier(CASCADE_PATH)
-    if face_cascade.empty():
-        print(f"❌ Error: Could not load face cascade from {CASCADE_PATH}")
-        return [], [], []
-    
-    # Process each person directory
-    for person_name in person_dirs:
-        person_path = os.path.join(IMAGE_BASE, person_name)
-        print(f"👤 Processing {person_name}...")
-        
-        # Get all image files in the person's directory
-        image_files = [f for f in os.listdir(person_path) 
-                      if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp'))]
-        
-        if not image_files:
-            print(f"   ⚠️  No images found in {person_name} folder")
-            continue
-        
-        print(f"   📸 Found {len(image_files)} images")
-        
-        # Process each image
-        for image_file in image_files:
-            image_path = os.path.join(person_path, image_file)
-            
-            try:
-                # Read image
-                image = cv2.imread(image_path)
-                if image is None:
-                    continue
-                
-                # Convert to grayscale
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                
-                # Detect faces
-                faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-                
-                if len(faces) == 0:
-                    continue
-                
-                # Use the first face found
-                (x, y, w, h) = faces[0]
-                face_img = gray[y:y+h, x:x+w]
-                
-                # Resize face to standard size
-                face_img = cv2.resize(face_img, (100, 100))
-                
-                # Add to training data
-                image_paths.append(face_img)
-                labels.append(len(label_names))  # Use index as label
-                
-            except Exception as e:
-                continue
-        
-        # Add person name to label names
-        if any(label == len(label_names) for label in labels):
-            label_names.append(person_name)
-    
-    return image_paths, labels, label_names
+    print(f"📁 Found {len(label_names)} people: {label_names}")
+    return images, labels, label_names
 
 def train_recognizer():
     """Train the face recognizer"""
@@ -231,7 +214,8 @@ def train_recognizer():
     print("===================================")
     
     # Get training data
-    images, labels, label_names = get_images_and_labels()
+    stats = StageStats()
+    images, labels, label_names = get_images_and_labels(stats)
     
     if not images:
         print("❌ No training data found!")
@@ -244,19 +228,30 @@ def train_recognizer():
     recognizer = cv2.face.LBPHFaceRecognizer_create()
     
     try:
+        # Keep everyone's label id and the rejection threshold (evaluate.py --apply) of the current model
+        previous = ModelBundle.load(MODEL_BUNDLE) if os.path.exists(MODEL_BUNDLE) else None
+        if previous is not None:
+            labels, label_names = keep_label_ids(labels, label_names, previous.label_names)
+        
         # Train the recognizer
         print("🔄 Training recognizer...")
+        start = time.monotonic()
         recognizer.train(images, np.array(labels))
+        stats.add("train", len(images), time.monotonic() - start)
+        stats.report()
         
-        # Save the trained model
-        recognizer.write(TRAINER_FILE)
-        print(f"✅ Training completed! Model saved to {TRAINER_FILE}")
-        
-        # Save label mapping
-        with open("label_names.txt", "w") as f:
-            for i, name in enumerate(label_names):
-                f.write(f"{i}:{name}\n")
-        print("✅ Label mapping saved to label_names.txt")
+        # Save histograms, labels and label names together in one bundle
+        metadata = {
+            "trained_at": datetime.now().isoformat(),
+            "training_seconds": round(time.monotonic() - start, 3),
+            "samples_per_person": {name: labels.count(i) for i, name in enumerate(label_names)
+                                   if name is not None},
+        }
+        if previous is not None and previous.params.get("threshold") is not None:
+            recognizer.setThreshold(previous.params["threshold"])
+        bundle = ModelBundle.from_recognizer(recognizer, label_names, metadata)
+        bundle.save(MODEL_BUNDLE)
+        print(f"✅ Training completed! Model saved to {MODEL_BUNDLE}")
         
         return True
         
@@ -264,31 +259,91 @@ def train_recognizer():
         print(f"❌ Training failed: {e}")
         return False
 
+def enroll_person(person_name):
+    """Add one person's photos to the existing model without retraining everyone"""
+    if not os.path.exists(MODEL_BUNDLE):
+        print(f"ℹ️  {MODEL_BUNDLE} not found - training from scratch instead")
+        return train_recognizer()
+    
+    print(f"🎓 Enrolling {person_name}")
+    stats = StageStats()
+    images, _, label_names = load_dataset(FACE_STORE, IMAGE_BASE, CASCADE_PATH, stats=stats,
+                                          people={person_name})
+    if not images:
+        print(f"❌ No usable photos found for {person_name}")
+        return False
+    
+    try:
+        bundle = ModelBundle.load(MODEL_BUNDLE)
+        model = bundle.recognizer()
+        
+        # Same LBPH histograms cv2 would compute, appended under a stable label id
+        start = time.monotonic()
+        histograms = np.vstack([model.histogram(image) for image in images])
+        label = bundle.add_person(person_name, histograms, replace=True)
+        stats.add("enroll", len(images), time.monotonic() - start)
+        stats.report()
+        
+        # Written to a temporary file and renamed, so readers see the old or new model
+        bundle.save(MODEL_BUNDLE)
+        print(f"✅ {person_name} enrolled as label {label} with {len(images)} photos "
+              f"(model now has {len(bundle.labels)} samples)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Enrolment failed: {e}")
+        return False
+
+def remove_person(person_name, delete_photos=False):
+    """Remove one person from the model without retraining everyone"""
+    if not os.path.exists(MODEL_BUNDLE):
+        print(f"❌ {MODEL_BUNDLE} not found!")
+        return False
+    
+    try:
+        bundle = ModelBundle.load(MODEL_BUNDLE)
+        removed = bundle.remove_person(person_name)
+        if removed == 0:
+            print(f"❌ {person_name} is not in the model")
+            return False
+        bundle.save(MODEL_BUNDLE)
+        print(f"✅ Removed {person_name} ({removed} samples) from {MODEL_BUNDLE}")
+        
+        store = FaceStore(FACE_STORE)
+        person_path = os.path.join(IMAGE_BASE, person_name)
+        if delete_photos:
+            if store.exists():
+                store.load()
+                deleted = store.remove(person_name)
+                store.compact()
+                store.close()
+                print(f"🗑️  Deleted {deleted} faces from {FACE_STORE}")
+            if os.path.isdir(person_path):
+                shutil.rmtree(person_path)
+                print(f"🗑️  Deleted {person_path}")
+        else:
+            print("ℹ️  Photos kept; a full retrain (option 2) would add them back")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Removal failed: {e}")
+        return False
+
 def test_training():
     """Test the trained model"""
     print("\n🧪 Testing Trained Model")
     print("========================")
     
-    if not os.path.exists(TRAINER_FILE):
-        print(f"❌ {TRAINER_FILE} not found!")
+    if not os.path.exists(MODEL_BUNDLE):
+        print(f"❌ {MODEL_BUNDLE} not found!")
         return False
     
     try:
-        # Load recognizer
-        recognizer = cv2.face.LBPHFaceRecognizer_create()
-        recognizer.read(TRAINER_FILE)
-        
-        # Load label names
-        label_names = []
-        if os.path.exists("label_names.txt"):
-            with open("label_names.txt", "r") as f:
-                for line in f:
-                    parts = line.strip().split(":")
-                    if len(parts) == 2:
-                        label_names.append(parts[1])
-        
+        # Load the bundle and check its labels line up with the histograms
+        bundle = ModelBundle.load(MODEL_BUNDLE)
         print(f"✅ Model loaded successfully!")
-        print(f"👥 Recognized people: {label_names}")
+        print(f"👥 Recognized people: {list(bundle.label_map.values())}")
+        print(f"📊 {len(bundle.labels)} samples, trained {bundle.metadata.get('trained_at', 'unknown')}")
         
         return True
         
@@ -300,20 +355,15 @@ if __name__ == "__main__":
     print("🚀 Interactive Face Recognition Training System")
     print("===============================================")
     
-    # Create Images directory if it doesn't exist
-    if not os.path.exists(IMAGE_BASE):
-        print(f"📁 Creating {IMAGE_BASE} directory...")
-        os.makedirs(IMAGE_BASE)
-        print(f"✅ Created {IMAGE_BASE} directory")
-    
     while True:
         print("\n📋 What would you like to do?")
         print("1. Add a new person (capture photos)")
         print("2. Train the system with existing photos")
         print("3. Test the trained system")
-        print("4. Exit")
+        print("4. Remove a person")
+        print("5. Exit")
         
-        choice = input("\nEnter your choice (1-4): ").strip()
+        choice = input("\nEnter your choice (1-5): ").strip()
         
         if choice == "1":
             # Add new person
@@ -322,6 +372,9 @@ if __name__ == "__main__":
                 print(f"\n👤 Adding {person_name} to the system...")
                 if capture_photos(person_name, 40):
                     print(f"✅ Successfully captured photos for {person_name}")
+                    # Only the new person's photos are processed; everyone else stays as trained
+                    if enroll_person(person_name):
+                        test_training()
                 else:
                     print(f"❌ Failed to capture photos for {person_name}")
             else:
@@ -344,8 +397,17 @@ if __name__ == "__main__":
             test_training()
         
         elif choice == "4":
+            # Remove a person from the model
+            person_name = input("Enter the name to remove: ").strip()
+            if person_name:
+                delete = input(f"Also delete {person_name}'s photos? (y/N): ")
+                remove_person(person_name, delete.strip().lower() == "y")
+            else:
+                print("❌ Please enter a valid name")
+        
+        elif choice == "5":
             print("👋 Goodbye!")
             break
         
         else:
-            print("❌ Invalid choice. Please enter 1, 2, 3, or 4.")
+            print("❌ Invalid choice. Please enter 1, 2, 3, 4, or 5.")
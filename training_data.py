@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Training Data Pipeline for MagicMirror² Face Recognition
+Decodes and preprocesses training photos across a process pool and caches the
+100x100 face arrays on disk, so unchanged photos are never processed twice
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+IMAGE_BASE = "Images"
+CASCADE_PATH = "/home/andii/haarcascades/haarcascade_frontalface_default.xml"
+CACHE_FILE = "training_cache.npz"
+CACHE_VERSION = 1
+FACE_SIZE = (100, 100)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+WRITER_THREADS = 2  # cv2.imwrite releases the GIL, so a couple of threads keep up with the camera
+
+# Set in each pool worker by _init_worker
+_worker_cascade = None
+
+
+class StageStats:
+    """Images handled and seconds spent per pipeline stage"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, images, seconds):
+        count, total = self.stages.get(stage, (0, 0.0))
+        self.stages[stage] = (count + images, total + seconds)
+
+    def report(self):
+        for stage, (images, seconds) in self.stages.items():
+            rate = images / seconds if seconds > 0 else float("inf")
+            print(f"   ⏱️  {stage:<10} {images:>5} images in {seconds:6.2f}s ({rate:,.0f} images/s)")
+
+
+class PhotoWriter:
+    """Encodes and saves enrolment photos on a thread pool, off the capture loop
+
+    write(path, image) does the saving (cv2.imwrite by default) and returns False on
+    failure. Progress is printed as writes finish rather than when they are queued.
+    """
+
+    def __init__(self, total, threads=WRITER_THREADS, write=cv2.imwrite, progress_every=1):
+        self.total = total
+        self.write = write
+        self.progress_every = progress_every
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="photo-writer")
+        self.lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+
+    def submit(self, path, image):
+        future = self.pool.submit(self.write, path, image)
+        future.add_done_callback(lambda f: self._done(path, f))
+
+    def _done(self, path, future):
+        with self.lock:
+            if future.exception() is None and future.result() is not False:
+                self.written += 1
+                if self.written % self.progress_every == 0 or self.written == self.total:
+                    progress = self.written / self.total * 100
+                    print(f"   ✅ Saved photo {self.written}/{self.total} ({progress:.1f}%)")
+            else:
+                self.failed += 1
+                print(f"   ❌ Could not write {path}: {future.exception() or 'imwrite failed'}")
+
+    def close(self):
+        """Wait for every queued write; returns how many were saved"""
+        self.pool.shutdown(wait=True)
+        return self.written
+
+
+def content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def scan_images(image_base=IMAGE_BASE, people=None):
+    """Return [(person, path)] for every photo, people and files in sorted order"""
+    photos = []
+    for person in sorted(os.listdir(image_base)):
+        if people is not None and person not in people:
+            continue
+        person_path = os.path.join(image_base, person)
+        if not os.path.isdir(person_path):
+            continue
+        for name in sorted(os.listdir(person_path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                photos.append((person, os.path.join(person_path, name)))
+    return photos
+
+
+def _init_worker(cascade_path):
+    global _worker_cascade
+    # Only photos that are not face crops need the cascade, so it is optional
+    _worker_cascade = cv2.CascadeClassifier(cascade_path) if cascade_path else None
+    cv2.setNumThreads(1)  # the pool already uses every core
+
+
+def preprocess_image(path):
+    """Decode one photo into a 100x100 grayscale face; returns (hash, face or None)
+
+    Photos saved by capture_photos are already 100x100 face crops and are used as is.
+    Anything else goes through the Haar cascade and keeps its first face.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return digest, None
+    if gray.shape == FACE_SIZE:
+        return digest, gray
+
+    if _worker_cascade is None or _worker_cascade.empty():
+        raise RuntimeError(f"{path} is not a 100x100 face crop and no face cascade is loaded")
+    faces = _worker_cascade.detectMultiScale(gray, 1.3, 5)
+    if len(faces) == 0:
+        return digest, None
+    x, y, w, h = faces[0]
+    return digest, cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE)
+
+
+class PreprocessCache:
+    """Preprocessed faces keyed by file path, mtime and content hash
+
+    Photos whose path, size and mtime are unchanged are hits without reading them.
+    If only the mtime moved (a copy or touch), the content hash decides.
+    Photos with no usable face are cached too, so they are not retried every run.
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        self.path = path
+        self.entries = {}  # path -> {"mtime", "size", "hash", "slot"}
+        self.faces = []
+        self.dirty = False
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                index = json.loads(str(data["index"]))
+                if index.get("version") != CACHE_VERSION:
+                    return
+                faces = data["faces"]
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable training cache {self.path}: {e}")
+            return
+        self.entries = index["entries"]
+        self.faces = list(faces)
+
+    def lookup(self, path):
+        """Return (True, face or None) on a hit, (False, None) if path must be processed"""
+        entry = self.entries.get(path)
+        if entry is None:
+            return False, None
+        stat = os.stat(path)
+        if entry["size"] != stat.st_size:
+            return False, None
+        if entry["mtime"] != stat.st_mtime_ns:
+            if entry["hash"] != content_hash(path):
+                return False, None
+            entry["mtime"] = stat.st_mtime_ns
+            self.dirty = True
+        return True, self.face(entry)
+
+    def face(self, entry):
+        return None if entry["slot"] < 0 else self.faces[entry["slot"]]
+
+    def store(self, path, digest, face):
+        stat = os.stat(path)
+        slot = -1
+        if face is not None:
+            slot = len(self.faces)
+            self.faces.append(face)
+        self.entries[path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size,
+                              "hash": digest, "slot": slot}
+        self.dirty = True
+
+    def save(self, keep_paths):
+        """Write only the entries for keep_paths, compacted, and rename over the old cache"""
+        entries, faces = {}, []
+        for path in keep_paths:
+            entry = self.entries.get(path)
+            if entry is None:
+                continue
+            face = self.face(entry)
+            slot = -1
+            if face is not None:
+                slot = len(faces)
+                faces.append(face)
+            entries[path] = dict(entry, slot=slot)
+
+        array = np.stack(faces) if faces else np.zeros((0,) + FACE_SIZE, dtype=np.uint8)
+        index = json.dumps({"version": CACHE_VERSION, "entries": entries})
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, faces=array, index=np.array(index))
+        os.replace(tmp_path, self.path)
+
+
+def load_training_faces(image_base=IMAGE_BASE, cascade_path=CASCADE_PATH,
+                        cache_path=CACHE_FILE, workers=None, stats=None, people=None, paths=None):
+    """Return (faces, labels, label_names) for every person with at least one usable photo
+
+    With people set, only those people's photos are loaded (for incremental enrolment).
+    If paths is a list, the source file of every returned face is appended to it.
+    """
+    stats = stats if stats is not None else StageStats()
+
+    start = time.monotonic()
+    photos = scan_images(image_base, people)
+    stats.add("scan", len(photos), time.monotonic() - start)
+
+    start = time.monotonic()
+    cache = PreprocessCache(cache_path)
+    cache.load()
+    results = {}
+    pending = []
+    for _, path in photos:
+        hit, face = cache.lookup(path)
+        if hit:
+            results[path] = face
+        else:
+            pending.append(path)
+    stats.add("cache", len(photos) - len(pending), time.monotonic() - start)
+
+    if pending:
+        start = time.monotonic()
+        workers = workers or os.cpu_count() or 1
+        chunksize = max(len(pending) // (workers * 4), 1)
+        try:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(cascade_path,)) as pool:
+                for path, (digest, face) in zip(pending, pool.map(preprocess_image, pending,
+                                                                   chunksize=chunksize)):
+                    cache.store(path, digest, face)
+                    results[path] = face
+        except RuntimeError as e:
+            # Only raised for photos that need the cascade when it could not be loaded
+            print(f"❌ Error: {e} (cascade path {cascade_path})")
+            return [], [], []
+        stats.add("preprocess", len(pending), time.monotonic() - start)
+    keep = [path for _, path in photos]
+    if people is not None:
+        # Other people's photos were not scanned; keep their entries while the files exist
+        scanned = set(keep)
+        keep += [path for path in cache.entries if path not in scanned and os.path.exists(path)]
+    if cache.dirty or len(cache.entries) != len(keep):
+        cache.save(keep)
+    print(f"   🗃️  Cache: {len(photos) - len(pending)} reused, {len(pending)} processed")
+
+    faces, labels, label_names = [], [], []
+    skipped = {}
+    for person, path in photos:
+        face = results[path]
+        if face is None:
+            skipped[person] = skipped.get(person, 0) + 1
+            continue
+        if not label_names or label_names[-1] != person:
+            label_names.append(person)
+        faces.append(face)
+        labels.append(len(label_names) - 1)
+        if paths is not None:
+            paths.append(path)
+    for person, count in skipped.items():
+        print(f"   ⚠️  {person}: {count} photos skipped (unreadable or no face found)")
+    return faces, labels, label_names
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Ultrasonic Ranging for MagicMirror² Face Recognition
+Edge-timed HC-SR04 readings sampled on their own thread, slowly while nobody is near and
+quickly while someone approaches, with a simulated backend for testing
+"""
+
+import statistics
+import threading
+import time
+from collections import deque
+
+# GPIO pins for ultrasonic sensor (matching your working code)
+TRIG_PIN = 23  # GPIO pin for TRIG
+ECHO_PIN = 24  # GPIO pin for ECHO
+GPIO_CHIP = "/dev/gpiochip0"  # the header pins' GPIO controller (gpiochip4 on a Pi 5 with an older kernel)
+
+# Ranging settings
+SOUND_SPEED_FACTOR = 17150  # cm per second of echo (speed of sound / 2)
+ECHO_TIMEOUT = 0.03  # seconds; HC-SR04 echoes top out around 25 ms (~4 m)
+SAMPLE_INTERVAL = 0.06  # seconds between pings (the sensor needs ~60 ms between cycles)
+MEDIAN_WINDOW = 5  # readings in the median filter
+FAR_DISTANCE = 999  # reported for missed echoes or when no sensor is available
+
+# Adaptive polling settings
+IDLE_SAMPLE_INTERVAL = 0.5  # seconds between pings while the scene is idle
+ACTIVE_RANGE = 80  # cm; anything closer keeps the sensor on the fast interval
+APPROACH_SPEED = 15.0  # cm/s of closing speed that counts as someone approaching
+VELOCITY_WINDOW = 1.5  # seconds of readings the approach velocity is fitted over
+IDLE_AFTER = 5.0  # seconds with nobody near or approaching before slowing down
+
+
+class GpiodBackend:
+    """HC-SR04 on libgpiod, timed from the kernel's edge event timestamps
+
+    The kernel stamps each echo edge when its interrupt fires and queues the edges
+    in order. A late Python thread (waiting for the GIL behind capture and
+    recognition) therefore reads the events late, but their timestamps are still
+    right, and two close edges still arrive as two events.
+    """
+
+    def __init__(self, trig_pin=TRIG_PIN, echo_pin=ECHO_PIN, chip=GPIO_CHIP):
+        import gpiod
+        from gpiod.line import Direction, Edge, Value
+
+        self.gpiod = gpiod
+        self.Value = Value
+        self.trig_pin = trig_pin
+        self.echo_pin = echo_pin
+        self.request = gpiod.request_lines(chip, consumer="magicmirror-ultrasonic", config={
+            trig_pin: gpiod.LineSettings(direction=Direction.OUTPUT, output_value=Value.INACTIVE),
+            echo_pin: gpiod.LineSettings(direction=Direction.INPUT, edge_detection=Edge.BOTH),
+        })
+
+    def _drain(self):
+        """Drop edges left over from an earlier ping (e.g. an echo that arrived after its timeout)"""
+        while self.request.wait_edge_events(0):
+            self.request.read_edge_events()
+
+    def ping(self, timeout=ECHO_TIMEOUT):
+        """Send one trigger pulse; return the echo duration in seconds, or None if it was missed"""
+        self._drain()
+        self.request.set_value(self.trig_pin, self.Value.ACTIVE)
+        time.sleep(0.00001)
+        self.request.set_value(self.trig_pin, self.Value.INACTIVE)
+
+        rising = self.gpiod.EdgeEvent.Type.RISING_EDGE
+        rise_ns = None
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.request.wait_edge_events(remaining):
+                return None
+            for event in self.request.read_edge_events():
+                if event.line_offset != self.echo_pin:
+                    continue
+                if event.event_type == rising:
+                    rise_ns = event.timestamp_ns
+                elif rise_ns is not None:
+                    return (event.timestamp_ns - rise_ns) / 1e9
+
+    def cleanup(self):
+        self.request.release()
+
+
+class SimulatedGPIOBackend:
+    """Replays recorded echo durations so ranging can be benchmarked without a Pi"""
+
+    def __init__(self, echo_timings, loop=True):
+        self.echo_timings = list(echo_timings)
+        self.loop = loop
+        self.index = 0
+
+    @classmethod
+    def from_file(cls, path, loop=True):
+        """Load one echo duration in seconds per line; 'miss' marks a lost echo"""
+        timings = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                timings.append(None if line == "miss" else float(line))
+        return cls(timings, loop)
+
+    @classmethod
+    def from_distances(cls, distances, loop=True):
+        """Build echo durations from distances in cm; None marks a lost echo"""
+        return cls([None if d is None else d / SOUND_SPEED_FACTOR for d in distances], loop)
+
+    def ping(self, timeout=ECHO_TIMEOUT):
+        if self.index >= len(self.echo_timings):
+            if not self.loop or not self.echo_timings:
+                time.sleep(timeout)
+                return None
+            self.index = 0
+        duration = self.echo_timings[self.index]
+        self.index += 1
+
+        # Sleep for as long as the real sensor would make us wait
+        if duration is None or duration > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(duration)
+        return duration
+
+    def cleanup(self):
+        pass
+
+
+class UltrasonicRanger:
+    """Samples the sensor on its own thread and serves median-filtered distances"""
+
+    def __init__(self, backend, sample_interval=SAMPLE_INTERVAL, window=MEDIAN_WINDOW,
+                 timeout=ECHO_TIMEOUT, idle_interval=IDLE_SAMPLE_INTERVAL):
+        self.backend = backend
+        self.sample_interval = sample_interval
+        self.idle_interval = idle_interval or sample_interval
+        self.timeout = timeout
+        self.readings = deque(maxlen=window)
+        self.history = deque()  # (time, reading) of hits in the last VELOCITY_WINDOW seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Set while sampling fast; waiters can block on it instead of polling
+        self.active = threading.Event()
+        self.active.set()
+        self.last_activity = time.monotonic()
+
+        # Statistics for benchmarking
+        self.samples = 0
+        self.idle_samples = 0
+        self.misses = 0
+        self.worst_latency = 0.0
+
+    def sample_once(self):
+        """Take one reading, add it to the filter window and return it"""
+        start = time.monotonic()
+        try:
+            duration = self.backend.ping(self.timeout)
+        except Exception as e:
+            print(f"Error reading distance: {e}")
+            duration = None
+        latency = time.monotonic() - start
+
+        if duration is None:
+            reading = FAR_DISTANCE
+        else:
+            reading = round(duration * SOUND_SPEED_FACTOR, 2)
+
+        now = time.monotonic()
+        with self.lock:
+            self.readings.append(reading)
+            self.samples += 1
+            if not self.active.is_set():
+                self.idle_samples += 1
+            if duration is None:
+                self.misses += 1
+            else:
+                self.history.append((now, reading))
+            while self.history and now - self.history[0][0] > VELOCITY_WINDOW:
+                self.history.popleft()
+            self.worst_latency = max(self.worst_latency, latency)
+
+        velocity = self.velocity()
+        if reading < ACTIVE_RANGE or (velocity is not None and velocity <= -APPROACH_SPEED):
+            self.last_activity = now
+            self.active.set()
+        elif now - self.last_activity >= IDLE_AFTER:
+            self.active.clear()
+        return reading
+
+    @property
+    def idle(self):
+        return not self.active.is_set()
+
+    def velocity(self):
+        """Least-squares slope of recent readings in cm/s (negative: approaching), or None"""
+        with self.lock:
+            if len(self.history) < 3:
+                return None
+            times, readings = zip(*self.history)
+        mean_t = sum(times) / len(times)
+        mean_d = sum(readings) / len(readings)
+        spread = sum((t - mean_t) ** 2 for t in times)
+        if spread == 0:
+            return None
+        return sum((t - mean_t) * (d - mean_d) for t, d in zip(times, readings)) / spread
+
+    def eta(self, threshold):
+        """Seconds until the distance reaches threshold at the current approach speed, or None"""
+        distance = self.distance()
+        if distance <= threshold:
+            return 0.0
+        velocity = self.velocity()
+        if velocity is None or velocity > -APPROACH_SPEED:
+            return None
+        return (distance - threshold) / -velocity
+
+    def distance(self):
+        """Median of the most recent readings in cm"""
+        with self.lock:
+            if not self.readings:
+                return FAR_DISTANCE
+            return round(statistics.median(self.readings), 2)
+
+    def start(self):
+        """Start sampling at a fixed rate in the background"""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._loop, name="ultrasonic", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        next_time = time.monotonic()
+        while not self.stop_event.is_set():
+            self.sample_once()
+            next_time += self.sample_interval if self.active.is_set() else self.idle_interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                next_time = time.monotonic()  # fell behind; don't try to catch up in a burst
+
+    def stop(self):
+        """Stop the sampling thread"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def close(self):
+        """Stop sampling and release the GPIO backend"""
+        self.stop()
+        self.backend.cleanup()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark ultrasonic ranging")
+    parser.add_argument("--replay", help="File of recorded echo durations (seconds per line, 'miss' for lost echoes)")
+    parser.add_argument("--seconds", type=float, default=10, help="How long to sample")
+    args = parser.parse_args()
+
+    if args.replay:
+        backend = SimulatedGPIOBackend.from_file(args.replay)
+    else:
+        backend = GpiodBackend()
+    ranger = UltrasonicRanger(backend)
+
+    print(f"📏 Sampling for {args.seconds}s...")
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    ranger.start()
+    try:
+        time.sleep(args.seconds)
+    finally:
+        ranger.close()
+    wall = time.monotonic() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    print(f"   Samples: {ranger.samples} ({ranger.samples / wall:.1f}/s), misses: {ranger.misses}, "
+          f"idle: {ranger.idle_samples}")
+    print(f"   Worst ping latency: {ranger.worst_latency * 1000:.1f} ms")
+    print(f"   CPU use: {cpu / wall:.1%} of one core")
+    print(f"   Last filtered distance: {ranger.distance()}cm")